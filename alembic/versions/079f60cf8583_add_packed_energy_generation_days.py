@@ -0,0 +1,40 @@
+"""add packed energy generation days
+
+Revision ID: 079f60cf8583
+Revises: 428c603aeb1e
+Create Date: 2026-10-19 13:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '079f60cf8583'
+down_revision: Union[str, Sequence[str], None] = '428c603aeb1e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('energy_generation_days',
+    sa.Column('day_id', sa.Integer(), nullable=False),
+    sa.Column('panel_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('reading_count', sa.Integer(), nullable=False),
+    sa.Column('readings', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['panel_id'], ['solar_panels.panel_id'], ),
+    sa.PrimaryKeyConstraint('day_id')
+    )
+    # New, empty table: no need to build the index concurrently
+    op.create_index('ix_energy_generation_days_panel_day', 'energy_generation_days', ['panel_id', 'day'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_energy_generation_days_panel_day', table_name='energy_generation_days')
+    op.drop_table('energy_generation_days')
@@ -0,0 +1,37 @@
+"""add transactions customer date index
+
+Revision ID: 184292c36189
+Revises: b53ae4479697
+Create Date: 2026-10-19 16:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '184292c36189'
+down_revision: Union[str, Sequence[str], None] = 'b53ae4479697'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # See 317c371c9bcb: concurrent builds must run outside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_transactions_customer_date', 'transactions', ['customer_id', 'transaction_date'], unique=False,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_transactions_customer_date', table_name='transactions',
+            postgresql_concurrently=True, if_exists=True,
+        )
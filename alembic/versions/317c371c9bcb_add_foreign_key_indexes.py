@@ -0,0 +1,51 @@
+"""add foreign key indexes
+
+Revision ID: 317c371c9bcb
+Revises: 52d3366fe580
+Create Date: 2026-10-19 10:12:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '317c371c9bcb'
+down_revision: Union[str, Sequence[str], None] = '52d3366fe580'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column) pairs filtered or joined on by the routers without an index
+FOREIGN_KEY_INDEXES = [
+    ('panel_ownership', 'customer_id'),
+    ('panel_ownership', 'panel_id'),
+    ('transactions', 'customer_id'),
+    ('notifications', 'customer_id'),
+    ('maintenance_records', 'farm_id'),
+    ('solar_panels', 'farm_id'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY does not lock out writes but cannot run
+    # inside a transaction block. If a build fails it leaves an INVALID
+    # index behind; drop it and rerun the upgrade.
+    with op.get_context().autocommit_block():
+        for table, column in FOREIGN_KEY_INDEXES:
+            op.create_index(
+                op.f(f'ix_{table}_{column}'), table, [column], unique=False,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table, column in reversed(FOREIGN_KEY_INDEXES):
+            op.drop_index(
+                op.f(f'ix_{table}_{column}'), table_name=table,
+                postgresql_concurrently=True, if_exists=True,
+            )
@@ -0,0 +1,77 @@
+"""add packed day id ranges
+
+Revision ID: 37622cc6a0ce
+Revises: bc9fcfd22fa4
+Create Date: 2026-10-19 19:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.core.codecs import decode_deltas
+
+
+# revision identifiers, used by Alembic.
+revision: str = '37622cc6a0ce'
+down_revision: Union[str, Sequence[str], None] = 'bc9fcfd22fa4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 1000
+
+days = sa.table(
+    'energy_generation_days',
+    sa.column('day_id', sa.Integer()),
+    sa.column('reading_count', sa.Integer()),
+    sa.column('readings', sa.LargeBinary()),
+    sa.column('first_generation_id', sa.BigInteger()),
+    sa.column('last_generation_id', sa.BigInteger()),
+)
+
+
+def _backfill() -> None:
+    # The ids are delta-encoded in `readings`, so the range is decoded here
+    # rather than in SQL; days left NULL are still found, just not by index
+    connection = op.get_bind()
+    last_day_id = 0
+    while True:
+        batch = connection.execute(
+            sa.select(days.c.day_id, days.c.reading_count, days.c.readings)
+            .where(days.c.day_id > last_day_id)
+            .order_by(days.c.day_id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not batch:
+            break
+        for day_id, reading_count, readings in batch:
+            ids, _ = decode_deltas(memoryview(readings), 0, reading_count)
+            connection.execute(
+                days.update()
+                .where(days.c.day_id == day_id)
+                .values(first_generation_id=int(ids.min()), last_generation_id=int(ids.max()))
+            )
+        last_day_id = batch[-1].day_id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('energy_generation_days', sa.Column('first_generation_id', sa.BigInteger(), nullable=True))
+    op.add_column('energy_generation_days', sa.Column('last_generation_id', sa.BigInteger(), nullable=True))
+    if not context.is_offline_mode():
+        _backfill()
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_energy_generation_days_id_range "
+            "ON energy_generation_days USING gist (int8range(first_generation_id, last_generation_id, '[]'))"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_energy_generation_days_id_range")
+    op.drop_column('energy_generation_days', 'last_generation_id')
+    op.drop_column('energy_generation_days', 'first_generation_id')
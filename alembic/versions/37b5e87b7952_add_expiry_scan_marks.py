@@ -0,0 +1,47 @@
+"""add expiry scan marks
+
+Revision ID: 37b5e87b7952
+Revises: 9eef6c562c0e
+Create Date: 2026-10-19 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '37b5e87b7952'
+down_revision: Union[str, Sequence[str], None] = '9eef6c562c0e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('expiry_scan_marks',
+    sa.Column('scan', sa.String(length=50), nullable=False),
+    sa.Column('horizon', sa.Date(), nullable=False),
+    sa.Column('scanned_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('scan')
+    )
+
+    # See 317c371c9bcb: concurrent builds must run outside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_panel_ownership_lease_end', 'panel_ownership', ['lease_end_date'], unique=False,
+            postgresql_where=sa.text('lease_end_date IS NOT NULL'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_panel_ownership_lease_end', table_name='panel_ownership',
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+    op.drop_table('expiry_scan_marks')
@@ -0,0 +1,38 @@
+"""add unread notifications index
+
+Revision ID: 428c603aeb1e
+Revises: 4dacf6cb38fd
+Create Date: 2026-10-19 12:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '428c603aeb1e'
+down_revision: Union[str, Sequence[str], None] = '4dacf6cb38fd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # See 317c371c9bcb: concurrent builds must run outside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_notifications_customer_unread', 'notifications', ['customer_id'], unique=False,
+            postgresql_where=sa.text('is_read = false'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_notifications_customer_unread', table_name='notifications',
+            postgresql_concurrently=True, if_exists=True,
+        )
@@ -0,0 +1,55 @@
+"""add full text search
+
+Revision ID: 4dacf6cb38fd
+Revises: f9f8d804c234
+Create Date: 2026-10-19 11:48:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4dacf6cb38fd'
+down_revision: Union[str, Sequence[str], None] = 'f9f8d804c234'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, source text column); the text search configuration must match
+# TEXT_SEARCH_CONFIG in app/core/fulltext.py
+SEARCHABLE_COLUMNS = [
+    ('maintenance_records', 'description'),
+    ('notifications', 'message'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Adding a stored generated column rewrites the table under an exclusive
+    # lock; run this upgrade in a maintenance window on large tables.
+    for table, column in SEARCHABLE_COLUMNS:
+        op.add_column(table, sa.Column(
+            'search_vector', postgresql.TSVECTOR(),
+            sa.Computed(f"to_tsvector('english', coalesce({column}, ''))", persisted=True),
+            nullable=True,
+        ))
+
+    with op.get_context().autocommit_block():
+        for table, column in SEARCHABLE_COLUMNS:
+            op.create_index(
+                f'ix_{table}_search_vector', table, ['search_vector'], unique=False,
+                postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table, column in reversed(SEARCHABLE_COLUMNS):
+            op.drop_index(f'ix_{table}_search_vector', table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    for table, column in reversed(SEARCHABLE_COLUMNS):
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,46 @@
+"""shard table versions
+
+Revision ID: 99c186669df1
+Revises: 37622cc6a0ce
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '99c186669df1'
+down_revision: Union[str, Sequence[str], None] = '37622cc6a0ce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing counters become slot 0, so versions carry on from their current value
+    op.add_column('table_versions', sa.Column('slot', sa.Integer(), server_default='0', nullable=False))
+    op.alter_column('table_versions', 'slot', server_default=None)
+    op.drop_constraint('table_versions_pkey', 'table_versions', type_='primary')
+    op.create_primary_key('table_versions_pkey', 'table_versions', ['table_name', 'slot'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Fold the slots of each table into its lowest one; versions must never go back
+    op.execute(
+        "UPDATE table_versions t SET version = s.version, updated_at = s.updated_at FROM ("
+        "SELECT table_name, min(slot) AS slot, sum(version) AS version, max(updated_at) AS updated_at "
+        "FROM table_versions GROUP BY table_name) s "
+        "WHERE t.table_name = s.table_name AND t.slot = s.slot"
+    )
+    op.execute(
+        "DELETE FROM table_versions t USING ("
+        "SELECT table_name, min(slot) AS slot FROM table_versions GROUP BY table_name) s "
+        "WHERE t.table_name = s.table_name AND t.slot <> s.slot"
+    )
+    op.drop_constraint('table_versions_pkey', 'table_versions', type_='primary')
+    op.drop_column('table_versions', 'slot')
+    op.create_primary_key('table_versions_pkey', 'table_versions', ['table_name'])
@@ -0,0 +1,54 @@
+"""add maintenance calendar indexes
+
+Revision ID: 9eef6c562c0e
+Revises: 079f60cf8583
+Create Date: 2026-10-19 13:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9eef6c562c0e'
+down_revision: Union[str, Sequence[str], None] = '079f60cf8583'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, columns, partial index predicate) on maintenance_records
+CALENDAR_INDEXES = [
+    ('ix_maintenance_records_farm_scheduled', ['farm_id', 'scheduled_date'], None),
+    ('ix_maintenance_records_panel_scheduled', ['panel_id', 'scheduled_date'], None),
+    ('ix_maintenance_records_scheduled_date', ['scheduled_date'], 'scheduled_date IS NOT NULL'),
+    ('ix_maintenance_records_pending', ['scheduled_date'], 'completed_date IS NULL'),
+    ('ix_maintenance_records_completed_date', ['completed_date'], 'completed_date IS NOT NULL'),
+]
+# Created by 317c371c9bcb; ix_maintenance_records_farm_scheduled serves every
+# farm_id lookup it did, so keeping it only slows down writes
+FARM_INDEX = 'ix_maintenance_records_farm_id'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # See 317c371c9bcb: concurrent builds must run outside a transaction
+    with op.get_context().autocommit_block():
+        for name, columns, where in CALENDAR_INDEXES:
+            op.create_index(
+                name, 'maintenance_records', columns, unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+        op.drop_index(FARM_INDEX, table_name='maintenance_records', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            FARM_INDEX, 'maintenance_records', ['farm_id'], unique=False,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        for name, columns, where in reversed(CALENDAR_INDEXES):
+            op.drop_index(name, table_name='maintenance_records', postgresql_concurrently=True, if_exists=True)
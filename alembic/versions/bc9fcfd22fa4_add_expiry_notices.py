@@ -0,0 +1,50 @@
+"""add expiry notices
+
+Revision ID: bc9fcfd22fa4
+Revises: 9e95cf694f55
+Create Date: 2026-10-19 18:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bc9fcfd22fa4'
+down_revision: Union[str, Sequence[str], None] = '9e95cf694f55'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Scan name, table, primary key and expiry date column of each expiry scan
+EXPIRY_SCANS = (
+    ('panel_warranty', 'solar_panels', 'panel_id', 'warranty_expiry_date'),
+    ('ownership_lease', 'panel_ownership', 'ownership_id', 'lease_end_date'),
+    ('farm_lease', 'solar_farms', 'farm_id', 'land_lease_end_date'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('expiry_notices',
+    sa.Column('scan', sa.String(length=50), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('expiry_date', sa.Date(), nullable=False),
+    sa.Column('notified_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('scan', 'row_id', 'expiry_date')
+    )
+
+    # Expiries up to the horizon of the previous scans were already notified
+    for scan, table, row_id, expiry_date in EXPIRY_SCANS:
+        op.execute(
+            f"INSERT INTO expiry_notices (scan, row_id, expiry_date) "
+            f"SELECT '{scan}', t.{row_id}, t.{expiry_date} FROM {table} t "
+            f"JOIN expiry_scan_marks m ON m.scan = '{scan}' "
+            f"WHERE t.{expiry_date} >= CURRENT_DATE AND t.{expiry_date} <= m.horizon"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('expiry_notices')
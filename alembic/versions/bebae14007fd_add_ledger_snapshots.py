@@ -0,0 +1,58 @@
+"""add ledger snapshots
+
+Revision ID: bebae14007fd
+Revises: 37b5e87b7952
+Create Date: 2026-10-19 15:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bebae14007fd'
+down_revision: Union[str, Sequence[str], None] = '37b5e87b7952'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ledger_snapshots',
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+    sa.Column('last_credit_id', sa.Integer(), nullable=False),
+    sa.Column('transactions_total', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('credits_total', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('taken_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['customer_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('customer_id')
+    )
+
+    # See 317c371c9bcb: concurrent builds must run outside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_transactions_customer_transaction', 'transactions', ['customer_id', 'transaction_id'], unique=False,
+            postgresql_include=['amount'], postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_energy_credits_customer_credit', 'energy_credits', ['customer_id', 'credit_id'], unique=False,
+            postgresql_include=['net_amount'], postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_energy_credits_customer_credit', table_name='energy_credits',
+            postgresql_concurrently=True, if_exists=True,
+        )
+        op.drop_index(
+            'ix_transactions_customer_transaction', table_name='transactions',
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+    op.drop_table('ledger_snapshots')
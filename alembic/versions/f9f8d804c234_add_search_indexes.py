@@ -0,0 +1,52 @@
+"""add search indexes
+
+Revision ID: f9f8d804c234
+Revises: 317c371c9bcb
+Create Date: 2026-10-19 11:02:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f9f8d804c234'
+down_revision: Union[str, Sequence[str], None] = '317c371c9bcb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns, partial index predicate)
+SEARCH_INDEXES = [
+    ('ix_solar_panels_status_panel_id', 'solar_panels', ['panel_status', 'panel_id'], None),
+    ('ix_solar_panels_manufacturer_model_panel_id', 'solar_panels', ['manufacturer', 'model', 'panel_id'], None),
+    ('ix_solar_panels_manufacturer_warranty', 'solar_panels', ['manufacturer', 'warranty_expiry_date'],
+     'warranty_expiry_date IS NOT NULL'),
+    ('ix_solar_panels_warranty_expiry', 'solar_panels', ['warranty_expiry_date'],
+     'warranty_expiry_date IS NOT NULL'),
+    ('ix_solar_panels_installation_date', 'solar_panels', ['installation_date'],
+     'installation_date IS NOT NULL'),
+    ('ix_solar_farms_status_lease_end', 'solar_farms', ['operational_status', 'land_lease_end_date'], None),
+    ('ix_solar_farms_lease_end', 'solar_farms', ['land_lease_end_date'],
+     'land_lease_end_date IS NOT NULL'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # See 317c371c9bcb: concurrent builds must run outside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in SEARCH_INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in reversed(SEARCH_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -10,6 +10,7 @@ from typing import Optional
 from app.db.base import get_db
 from app.models.models import User
 from app.core.security import verify_token
+from app.core.timing import timed
 
 security = HTTPBearer(auto_error=False)
 
@@ -42,7 +43,8 @@ async def get_current_user(
     
     # 2. Check for JWT Bearer Token
     elif credentials:
-        payload = verify_token(credentials.credentials)
+        with timed("auth"):
+            payload = verify_token(credentials.credentials)
         if payload:
             user_id = payload.get("sub")
 
@@ -54,7 +56,8 @@ async def get_current_user(
         )
 
     # Fetch user from database
-    user = db.query(User).filter(User.id == user_id).first()
+    with timed("auth"):
+        user = db.query(User).filter(User.id == user_id).first()
 
     if not user:
         raise HTTPException(
@@ -120,7 +123,8 @@ async def get_current_user_optional(
     
     # 2. Check for JWT Bearer Token
     elif credentials:
-        payload = verify_token(credentials.credentials)
+        with timed("auth"):
+            payload = verify_token(credentials.credentials)
         if payload:
             user_id = payload.get("sub")
 
@@ -128,7 +132,8 @@ async def get_current_user_optional(
         return None
 
     # Fetch user from database
-    user = db.query(User).filter(User.id == user_id).first()
+    with timed("auth"):
+        user = db.query(User).filter(User.id == user_id).first()
     
     if user and user.is_active:
         return user
@@ -0,0 +1,250 @@
+"""
+Response cache for read-mostly catalog endpoints.
+
+Entries are JSON bodies together with their validators, stored under a key
+built from the route, the query parameters and the caller's auth scope.
+Every entry carries tags; write handlers invalidate exactly the tags their
+change affects.
+
+Backends:
+- "memory": in-process LRU, private to each worker (default). Invalidation
+  is per worker only: a write clears the entries of the worker that served
+  it, while the other workers keep serving their copy until its TTL expires.
+  Run a single worker, keep TTLs short, or use "redis" when that matters.
+- "redis": shared across workers; any Redis protocol server works, including
+  a local stand-in such as a dev container or a fakeredis client
+- "none": caching disabled
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import orjson
+from dotenv import load_dotenv
+from fastapi import Request, Response
+
+from app.core.conditional import set_validators
+
+load_dotenv()
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+@dataclass
+class CachedResponse:
+    """A cached JSON response body, its validators and its total count."""
+    body: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    total_count: Optional[int] = None
+
+    def to_bytes(self) -> bytes:
+        header = orjson.dumps({
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "total_count": self.total_count,
+        })
+        return header + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "CachedResponse":
+        header, body = raw.split(b"\n", 1)
+        meta = orjson.loads(header)
+        last_modified = meta["last_modified"]
+        return cls(
+            body=body,
+            etag=meta["etag"],
+            last_modified=datetime.fromisoformat(last_modified) if last_modified else None,
+            total_count=meta.get("total_count"),
+        )
+
+    def to_response(self) -> Response:
+        response = Response(content=self.body, media_type="application/json")
+        response.headers["X-Cache"] = "HIT"
+        if self.etag is not None:
+            set_validators(response, self.etag, self.last_modified)
+        if self.total_count is not None:
+            response.headers["X-Total-Count"] = str(self.total_count)
+        return response
+
+
+class CacheBackend:
+    """Interface of a tag-aware byte cache."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, tags: Iterable[str], ttl: int) -> None:
+        raise NotImplementedError
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        raise NotImplementedError
+
+
+class NullCacheBackend(CacheBackend):
+    """Backend that stores nothing."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, tags: Iterable[str], ttl: int) -> None:
+        pass
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        pass
+
+
+class LRUCacheBackend(CacheBackend):
+    """
+    In-process LRU cache with per-entry TTL.
+
+    Invalidation only reaches the worker it runs in; with several workers,
+    other workers keep serving their copy until its TTL expires.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, tags: Iterable[str], ttl: int) -> None:
+        tags = tuple(tags)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared cache on a Redis protocol server.
+
+    Each tag is a set of the keys carrying it, so invalidation is one
+    SMEMBERS plus one DEL per tag and reaches every worker at once.
+    """
+
+    def __init__(self, client, prefix: str = "response-cache:"):
+        """
+        Initialize the backend.
+
+        Args:
+            client: A redis.Redis compatible client, e.g. fakeredis.FakeRedis() for local use
+            prefix: Namespace for all keys written by this backend
+        """
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheBackend":
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from exc
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, tags: Iterable[str], ttl: int) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value, ex=ttl)
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            pipe.sadd(tag_key, self.prefix + key)
+            # Tag sets only need to outlive the entries they point to
+            pipe.expire(tag_key, ttl)
+        pipe.execute()
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+
+
+def build_cache_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    """Create the backend selected by the CACHE_BACKEND setting."""
+    if name == "memory":
+        return LRUCacheBackend(max_entries=CACHE_MAX_ENTRIES)
+    if name == "redis":
+        return RedisCacheBackend.from_url(CACHE_REDIS_URL)
+    if name == "none":
+        return NullCacheBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND: {name}")
+
+
+response_cache = build_cache_backend()
+
+
+def cache_key(route_name: str, request: Request, scope: str) -> str:
+    """
+    Build the cache key of a request.
+
+    Args:
+        route_name: Name of the route serving the request
+        request: The incoming request; its path and query parameters are part of the key
+        scope: Auth scope of the caller, e.g. "user" or "admin"
+
+    Returns:
+        Opaque cache key
+    """
+    params = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    raw = f"{route_name}|{request.url.path}|{params}|{scope}"
+    return route_name + ":" + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def get_cached(key: str) -> Optional[CachedResponse]:
+    """Look up a cached response."""
+    raw = response_cache.get(key)
+    return CachedResponse.from_bytes(raw) if raw is not None else None
+
+
+def store_cached(key: str, entry: CachedResponse, tags: Iterable[str], ttl: int = CACHE_TTL_SECONDS) -> None:
+    """Store a response under `key` with the given invalidation tags."""
+    response_cache.set(key, entry.to_bytes(), tags, ttl)
+
+
+def invalidate(tags: Iterable[str]) -> None:
+    """Drop every cached response carrying one of `tags`."""
+    response_cache.invalidate_tags(set(tags))
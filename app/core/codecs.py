@@ -0,0 +1,102 @@
+"""
+NumPy column codecs for packed telemetry.
+
+A packed block holds the columns of `count` readings back to back; the
+count itself is stored outside the block. Each column is written as:
+
+- delta columns (ids, timestamps): the first value as int64, then the
+  differences between neighbours in the narrowest signed integer type
+  that holds them
+- scaled columns (numerics): a null bitmap when any value is missing, then
+  the values times 10**places in the narrowest signed integer type
+
+Every column starts with a one-byte type code, so a decoder walks the
+block without any per-column length.
+"""
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_NARROW_TYPES = (np.dtype("<i1"), np.dtype("<i2"), np.dtype("<i4"), np.dtype("<i8"))
+_CODES = {dtype: index for index, dtype in enumerate(_NARROW_TYPES)}
+_HAS_NULLS = 0x80
+
+_EPOCH = np.datetime64(0, "us")
+
+
+def _narrowest(values: np.ndarray) -> np.dtype:
+    if values.size == 0:
+        return _NARROW_TYPES[0]
+    low, high = int(values.min()), int(values.max())
+    for dtype in _NARROW_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    raise OverflowError("value does not fit in int64")
+
+
+def _write_ints(values: np.ndarray, flags: int = 0) -> bytes:
+    dtype = _narrowest(values)
+    return bytes([_CODES[dtype] | flags]) + values.astype(dtype).tobytes()
+
+
+def _read_ints(data: memoryview, offset: int, count: int, dtype: np.dtype) -> Tuple[np.ndarray, int]:
+    end = offset + count * dtype.itemsize
+    return np.frombuffer(data[offset:end], dtype=dtype).astype(np.int64), end
+
+
+def encode_deltas(values: Sequence[int]) -> bytes:
+    """Encode integers as a base value plus narrow differences."""
+    array = np.asarray(values, dtype=np.int64)
+    first = array[:1] if array.size else np.zeros(1, dtype=np.int64)
+    return first.astype("<i8").tobytes() + _write_ints(np.diff(array))
+
+
+def decode_deltas(data: memoryview, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    """Decode a column written by `encode_deltas`; returns the values and the offset after it."""
+    first = np.frombuffer(data[offset:offset + 8], dtype="<i8").astype(np.int64)
+    dtype = _NARROW_TYPES[data[offset + 8] & ~_HAS_NULLS]
+    deltas, end = _read_ints(data, offset + 9, max(count - 1, 0), dtype)
+    return np.cumsum(np.concatenate((first, deltas)))[:count], end
+
+
+def encode_scaled(values: Sequence[Optional[Decimal]], places: int) -> bytes:
+    """Encode decimals with `places` decimal places as narrow scaled integers."""
+    nulls = np.array([value is None for value in values], dtype=bool)
+    scaled = np.array(
+        [0 if value is None else int(Decimal(value).scaleb(places).to_integral_value()) for value in values],
+        dtype=np.int64,
+    )
+    if not nulls.any():
+        return _write_ints(scaled)
+    encoded = _write_ints(scaled, _HAS_NULLS)
+    return encoded[:1] + np.packbits(nulls).tobytes() + encoded[1:]
+
+
+def decode_scaled(data: memoryview, offset: int, count: int, places: int) -> Tuple[List[Optional[Decimal]], int]:
+    """Decode a column written by `encode_scaled`; returns the values and the offset after it."""
+    code = data[offset]
+    offset += 1
+    nulls = None
+    if code & _HAS_NULLS:
+        mask_size = (count + 7) // 8
+        nulls = np.unpackbits(np.frombuffer(data[offset:offset + mask_size], dtype=np.uint8), count=count).astype(bool)
+        offset += mask_size
+    scaled, end = _read_ints(data, offset, count, _NARROW_TYPES[code & ~_HAS_NULLS])
+    values = [Decimal(value).scaleb(-places) for value in scaled.tolist()]
+    if nulls is not None:
+        values = [None if null else value for value, null in zip(values, nulls.tolist())]
+    return values, end
+
+
+def datetimes_to_micros(values: Sequence[datetime]) -> np.ndarray:
+    """Microseconds since the epoch; naive datetimes are taken as UTC."""
+    naive = [value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value for value in values]
+    return np.array(naive, dtype="datetime64[us]").astype(np.int64)
+
+
+def micros_to_datetimes(values: np.ndarray) -> List[datetime]:
+    """Timezone-aware UTC datetimes from microseconds since the epoch."""
+    return [value.replace(tzinfo=timezone.utc) for value in (_EPOCH + values.astype("timedelta64[us]")).tolist()]
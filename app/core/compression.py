@@ -0,0 +1,139 @@
+"""
+Content-coding support for response compression.
+
+gzip is always available. zstd and brotli are used when the optional
+`zstandard` and `brotli` packages are installed.
+"""
+import os
+import zlib
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVELS = {
+    "gzip": int(os.getenv("COMPRESSION_LEVEL_GZIP", "6")),
+    "zstd": int(os.getenv("COMPRESSION_LEVEL_ZSTD", "3")),
+    "br": int(os.getenv("COMPRESSION_LEVEL_BROTLI", "4")),
+}
+
+# Media types worth compressing. Server-sent events are left alone because
+# intermediaries commonly buffer compressed event streams.
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/javascript",
+    "text/csv",
+    "text/html",
+    "text/plain",
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Compressor:
+    """Incremental compressor for one response body."""
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress `data` and flush it so the client can decode it right away."""
+        raise NotImplementedError
+
+    def finish(self, data: bytes = b"") -> bytes:
+        """Compress the final chunk and terminate the stream."""
+        raise NotImplementedError
+
+
+class GzipCompressor(Compressor):
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class ZstdCompressor(Compressor):
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+class BrotliCompressor(Compressor):
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+COMPRESSORS = {"gzip": GzipCompressor}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = ZstdCompressor
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+
+# Server preference when the client accepts several codings equally
+PREFERRED_ENCODINGS: List[str] = [name for name in ("zstd", "br", "gzip") if name in COMPRESSORS]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the content coding for a response.
+
+    Args:
+        accept_encoding: Value of the request's Accept-Encoding header
+
+    Returns:
+        The chosen coding, or None to send the body uncompressed
+    """
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    wildcard = weights.get("*", 0.0)
+    best = max(PREFERRED_ENCODINGS, key=lambda name: weights.get(name, wildcard), default=None)
+    if best is None or weights.get(best, wildcard) <= 0:
+        return None
+    return best
+
+
+def create_compressor(encoding: str, level: Optional[int] = None) -> Compressor:
+    """Create a compressor for `encoding` at the configured or given level."""
+    return COMPRESSORS[encoding](COMPRESSION_LEVELS[encoding] if level is None else level)
+
+
+def is_compressible(content_type: str) -> bool:
+    """Return True if responses of `content_type` should be compressed."""
+    return content_type.split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
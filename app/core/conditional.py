@@ -0,0 +1,87 @@
+"""
+Conditional GET support: strong ETags, Last-Modified and 304 responses.
+
+Validators of a row are derived from its `updated_at` column, those of a
+list from its table's write counter (see app.db.versions), so a client
+holding a current copy can be answered without loading or serializing any
+rows.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag from the values that determine a representation.
+
+    Args:
+        parts: Values identifying the resource and its version
+
+    Returns:
+        Quoted entity tag
+    """
+    raw = "|".join(part.isoformat() if isinstance(part, datetime) else str(part) for part in parts)
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest() + '"'
+
+
+def is_conditional(request: Request) -> bool:
+    """Return True if the request carries a conditional GET header."""
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive values come from drivers that drop the offset; the app stores UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since against the current validators.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted when
+    no entity tags were sent (RFC 9110, section 13.2.2).
+
+    Args:
+        request: The incoming request
+        etag: Current entity tag of the representation
+        last_modified: Current modification time, if known
+
+    Returns:
+        True if the client's copy is current and a 304 should be sent
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses the weak comparison function
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one second resolution
+    return int(_as_utc(last_modified).timestamp()) <= int(_as_utc(since).timestamp())
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> Response:
+    """Attach ETag and Last-Modified headers to `response`."""
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return response
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Response:
+    """Build an empty 304 response carrying the current validators."""
+    return set_validators(Response(status_code=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
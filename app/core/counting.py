@@ -0,0 +1,99 @@
+"""
+Total counts for paginated lists, returned in the X-Total-Count header.
+
+Clients opt in with `count=`:
+- "estimate": planner statistics, constant time whatever the table size.
+  Unfiltered lists read `pg_class.reltuples`; filtered lists use the row
+  estimate of `EXPLAIN` for the list query.
+- "exact": `COUNT(*)` over the filtered query. Results are kept in the
+  response cache under the list's invalidation tags, so a count is computed
+  at most once per write or per COUNT_CACHE_TTL_SECONDS.
+"""
+import hashlib
+import os
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+from fastapi import Query, Response
+from sqlalchemy import text
+from sqlalchemy.orm import Query as OrmQuery, Session
+
+from app.core.cache import response_cache
+
+load_dotenv()
+
+COUNT_CACHE_TTL_SECONDS = int(os.getenv("COUNT_CACHE_TTL_SECONDS", "60"))
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+COUNT_QUERY = Query(
+    None,
+    pattern="^(estimate|exact)$",
+    description="Return the number of matching rows in the X-Total-Count header: "
+                "`estimate` (planner statistics) or `exact` (COUNT(*), cached)",
+)
+
+
+def count_rows(
+    db: Session,
+    query: OrmQuery,
+    mode: str,
+    tags: Iterable[str] = (),
+    ttl: int = COUNT_CACHE_TTL_SECONDS,
+) -> int:
+    """
+    Count the rows matched by a list query, ignoring pagination.
+
+    Args:
+        db: Database session
+        query: Filtered list query without offset/limit
+        mode: "estimate" or "exact"
+        tags: Invalidation tags for the cached exact count
+        ttl: Lifetime of the cached exact count in seconds
+
+    Returns:
+        Number of matching rows
+    """
+    if mode == "estimate" and db.get_bind().dialect.name == "postgresql":
+        return estimate_count(db, query)
+    return exact_count(db, query, tags, ttl)
+
+
+def estimate_count(db: Session, query: OrmQuery) -> int:
+    """Estimate the rows matched by `query` from PostgreSQL planner statistics."""
+    statement = query.order_by(None).statement
+    froms = statement.get_final_froms()
+    if statement.whereclause is None and len(froms) == 1 and hasattr(froms[0], "name"):
+        reltuples = db.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"),
+            {"name": froms[0].name},
+        ).scalar()
+        # -1 (PostgreSQL 14+) or 0 means the table has not been analyzed yet
+        if reltuples is not None and reltuples > 0:
+            return int(reltuples)
+
+    # Expand IN lists and other post-compile parameters, which the driver cannot bind
+    compiled = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def exact_count(db: Session, query: OrmQuery, tags: Iterable[str] = (), ttl: int = COUNT_CACHE_TTL_SECONDS) -> int:
+    """Count the rows matched by `query`, serving repeated counts from the cache."""
+    query = query.order_by(None)
+    compiled = query.statement.compile(dialect=db.get_bind().dialect)
+    raw = f"{compiled}|{sorted(compiled.params.items())}"
+    key = "count:" + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    cached = response_cache.get(key)
+    if cached is not None:
+        return int(cached)
+    total = query.count()
+    response_cache.set(key, str(total).encode(), tags, ttl)
+    return total
+
+
+def set_total_count(response: Response, total: Optional[int]) -> Response:
+    """Attach the X-Total-Count header to `response` if a count was requested."""
+    if total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+    return response
@@ -8,6 +8,7 @@ from typing import Optional
 from app.db.base import get_db
 from app.models.models import User
 from app.core.security import verify_token
+from app.core.timing import timed
 
 security = HTTPBearer()
 
@@ -36,7 +37,8 @@ async def get_current_user(
     )
     
     # Verify token
-    payload = verify_token(credentials.credentials)
+    with timed("auth"):
+        payload = verify_token(credentials.credentials)
     if payload is None:
         raise credentials_exception
     
@@ -46,7 +48,8 @@ async def get_current_user(
         raise credentials_exception
     
     # Get user from database
-    user = db.query(User).filter(User.id == user_id).first()
+    with timed("auth"):
+        user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise credentials_exception
     
@@ -87,7 +90,8 @@ async def get_current_user_optional(
     if user_id is None:
         return None
     
-    user = db.query(User).filter(User.id == user_id).first()
+    with timed("auth"):
+        user = db.query(User).filter(User.id == user_id).first()
     if user and user.is_active:
         return user
     
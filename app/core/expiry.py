@@ -0,0 +1,206 @@
+"""
+Scanner for upcoming warranty and lease expiries.
+
+Each scan notifies about the rows whose expiry date falls in the notice
+window, today through today + EXPIRY_NOTICE_DAYS. Every notified
+(row, expiry date) pair is recorded in `expiry_notices`, and a run only
+notifies the rows of the window without a record. That covers rows
+created, or given a new expiry date, inside the window since the last
+run, while a date is never notified twice. A run is an index range scan
+over the window, whatever the table size, and records of expiries already
+past are pruned.
+
+The notifications and their records are written by one statement, so
+both see the same candidate rows, and committed together. Each run holds
+a transaction-level advisory lock on the scan's name, so concurrent runs
+wait for each other, the first run of a scan included.
+"""
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import Select, String, and_, cast, delete, exists, func, insert, literal, select, true
+from sqlalchemy.orm import Session
+
+from app.core.notifications import insert_notifications, notifications_changed
+from app.models.models import ExpiryNotice, ExpiryScanMark, PanelOwnership, SolarFarm, SolarPanel, User
+
+load_dotenv()
+
+EXPIRY_NOTICE_DAYS = int(os.getenv("EXPIRY_NOTICE_DAYS", "30"))
+
+# Labels of the columns identifying the expiry behind each notification
+NOTICE_COLUMNS = ("expiring_id", "expiry_date")
+
+
+@dataclass
+class ExpiryScan:
+    """A kind of expiry: the expiring rows and the notifications for them."""
+    name: str
+    # Primary key and expiry date columns of the expiring rows
+    row_id: Any
+    expiry_date: Any
+    # Builds the notification rows, plus NOTICE_COLUMNS, for the rows matching the criteria
+    notifications: Callable[[list], Select]
+
+
+@dataclass
+class ExpiryScanResult:
+    """Dates a scan examined, `start` through `through` inclusive, and its notifications."""
+    scan: str
+    start: date
+    through: date
+    notified: int
+    dry_run: bool = False
+
+
+def _notification_columns(notification_type: str, title: str, message) -> list:
+    return [
+        literal(notification_type).label("notification_type"),
+        literal(title).label("title"),
+        message.label("message"),
+        literal("high").label("priority"),
+        literal(False).label("is_read"),
+    ]
+
+
+def _as_text(column):
+    return cast(column, String)
+
+
+def panel_warranty_notifications(criteria: list) -> Select:
+    """One notification per owner of each panel whose warranty matches `criteria`."""
+    # Uses ix_solar_panels_warranty_expiry
+    return (
+        select(
+            PanelOwnership.customer_id.label("customer_id"),
+            *_notification_columns(
+                "warranty_expiry",
+                "Panel warranty expiring",
+                literal("The warranty of panel ") + _as_text(SolarPanel.panel_id)
+                + " expires on " + _as_text(SolarPanel.warranty_expiry_date) + ".",
+            ),
+            SolarPanel.panel_id.label("expiring_id"),
+            SolarPanel.warranty_expiry_date.label("expiry_date"),
+        )
+        .join(PanelOwnership, PanelOwnership.panel_id == SolarPanel.panel_id)
+        .where(*criteria, PanelOwnership.customer_id.isnot(None))
+        .distinct()
+    )
+
+
+def ownership_lease_notifications(criteria: list) -> Select:
+    """One notification per panel lease matching `criteria`, to its customer."""
+    # Uses ix_panel_ownership_lease_end
+    return select(
+        PanelOwnership.customer_id.label("customer_id"),
+        *_notification_columns(
+            "lease_expiry",
+            "Panel lease ending",
+            literal("Your lease of panel ") + _as_text(PanelOwnership.panel_id)
+            + " ends on " + _as_text(PanelOwnership.lease_end_date) + ".",
+        ),
+        PanelOwnership.ownership_id.label("expiring_id"),
+        PanelOwnership.lease_end_date.label("expiry_date"),
+    ).where(*criteria, PanelOwnership.customer_id.isnot(None))
+
+
+def farm_lease_notifications(criteria: list) -> Select:
+    """One notification per farm land lease matching `criteria`, to every active admin."""
+    # Uses ix_solar_farms_lease_end
+    return (
+        select(
+            User.id.label("customer_id"),
+            *_notification_columns(
+                "land_lease_expiry",
+                "Farm land lease ending",
+                literal("The land lease of farm ") + SolarFarm.farm_name
+                + " ends on " + _as_text(SolarFarm.land_lease_end_date) + ".",
+            ),
+            SolarFarm.farm_id.label("expiring_id"),
+            SolarFarm.land_lease_end_date.label("expiry_date"),
+        )
+        .join(User, true())
+        .where(*criteria, User.is_admin.is_(True), User.is_active.is_(True))
+    )
+
+
+EXPIRY_SCANS = {
+    scan.name: scan
+    for scan in (
+        ExpiryScan(
+            "panel_warranty", SolarPanel.panel_id, SolarPanel.warranty_expiry_date,
+            panel_warranty_notifications,
+        ),
+        ExpiryScan(
+            "ownership_lease", PanelOwnership.ownership_id, PanelOwnership.lease_end_date,
+            ownership_lease_notifications,
+        ),
+        ExpiryScan(
+            "farm_lease", SolarFarm.farm_id, SolarFarm.land_lease_end_date,
+            farm_lease_notifications,
+        ),
+    )
+}
+
+
+def scan_expiries(
+    db: Session,
+    scan: ExpiryScan,
+    today: Optional[date] = None,
+    dry_run: bool = False,
+) -> ExpiryScanResult:
+    """
+    Notify about the expiries in the notice window that were not notified yet.
+
+    Expiries already past are not notified, so the first run skips them.
+
+    Args:
+        db: Database session; committed unless `dry_run`
+        scan: Expiry scan to run
+        today: Date to compute the window from; defaults to the current date
+        dry_run: Only count the notifications; nothing is written
+
+    Returns:
+        The dates examined and the number of notifications
+    """
+    today = today or date.today()
+    through = today + timedelta(days=EXPIRY_NOTICE_DAYS)
+    # Serializes concurrent runs of the same scan, even before its mark row exists
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"expiry_scan:{scan.name}"))))
+    mark = db.query(ExpiryScanMark).filter(ExpiryScanMark.scan == scan.name).first()
+
+    notified_before = exists().where(
+        ExpiryNotice.scan == scan.name,
+        ExpiryNotice.row_id == scan.row_id,
+        ExpiryNotice.expiry_date == scan.expiry_date,
+    )
+    pending = [and_(scan.expiry_date >= today, scan.expiry_date <= through), ~notified_before]
+    candidates = scan.notifications(pending).cte("candidates")
+    notifications = select(*(column for column in candidates.c if column.key not in NOTICE_COLUMNS))
+
+    if dry_run:
+        notified = db.execute(select(func.count()).select_from(notifications.subquery())).scalar()
+        db.rollback()
+        return ExpiryScanResult(scan.name, today, through, notified, dry_run)
+
+    notices = insert(ExpiryNotice).from_select(
+        ["scan", "row_id", "expiry_date"],
+        select(literal(scan.name), candidates.c.expiring_id, candidates.c.expiry_date).distinct(),
+    ).cte("notices")
+    notified = insert_notifications(db, notifications, also=[notices])
+    # Past expiries are never notified again, so their records can go
+    db.execute(delete(ExpiryNotice).where(ExpiryNotice.scan == scan.name, ExpiryNotice.expiry_date < today))
+
+    if mark is None:
+        mark = ExpiryScanMark(scan=scan.name)
+        db.add(mark)
+    mark.horizon = through
+    mark.scanned_at = func.now()
+    db.commit()
+    if notified:
+        notifications_changed()
+    return ExpiryScanResult(scan.name, today, through, notified, dry_run)
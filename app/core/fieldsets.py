@@ -0,0 +1,83 @@
+"""
+Sparse fieldset support for list endpoints.
+
+A `fields=a,b,c` query parameter narrows both the columns selected from the
+database and the fields serialized into the response.
+"""
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Query, status
+from fastapi.responses import Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+
+from app.core.timing import timed
+
+FIELDS_QUERY = Query(
+    None,
+    description="Comma-separated list of fields to return, e.g. `fields=panel_id,panel_status`",
+)
+
+
+def parse_fields(raw: Optional[str], schema: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """
+    Validate a `fields` query parameter against a response schema.
+
+    Args:
+        raw: Raw comma-separated parameter value
+        schema: Response schema the fields must belong to
+
+    Returns:
+        Requested field names in schema order, or None if no narrowing was requested
+
+    Raises:
+        HTTPException: If a requested field is not part of the schema
+    """
+    if not raw:
+        return None
+
+    requested = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = requested - schema.model_fields.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return tuple(name for name in schema.model_fields if name in requested) or None
+
+
+@lru_cache(maxsize=None)
+def _rows_adapter(schema: Type[BaseModel], fields: Tuple[str, ...]) -> TypeAdapter:
+    partial = create_model(
+        f"{schema.__name__}Partial",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (schema.model_fields[name].annotation, ...) for name in fields},
+    )
+    return TypeAdapter(List[partial])
+
+
+def select_columns(model: Any, fields: Sequence[str]) -> list:
+    """Return the mapped columns of `model` named by `fields`."""
+    return [getattr(model, name) for name in fields]
+
+
+def sparse_response(schema: Type[BaseModel], fields: Tuple[str, ...], rows: Sequence[Any]) -> Response:
+    """
+    Serialize column rows into a JSON response containing only `fields`.
+
+    Field types and JSON encoding are taken from `schema`, so a narrowed
+    response matches the corresponding slice of the full response.
+
+    Args:
+        schema: Full response schema
+        fields: Field names selected by `parse_fields`
+        rows: Result rows of a query over exactly those columns
+
+    Returns:
+        JSON response with one object per row
+    """
+    adapter = _rows_adapter(schema, fields)
+    with timed("serialize"):
+        items = adapter.validate_python(rows, from_attributes=True)
+        content = adapter.dump_json(items)
+    return Response(content=content, media_type="application/json")
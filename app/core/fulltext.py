@@ -0,0 +1,88 @@
+"""
+Full-text search over generated tsvector columns.
+
+Searchable tables keep a stored `search_vector` column generated from their
+text column and indexed with GIN, so a search is an index lookup followed by
+ranking of the matches. Highlight snippets are only computed for the rows of
+the requested page, because `ts_headline` re-parses the original text.
+
+Snippets are HTML: the text is escaped before `ts_headline` adds its <mark>
+tags, so markup stored in a row is shown as text rather than rendered.
+"""
+from typing import Any, List, Sequence, Tuple, Type
+
+from fastapi import Query
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+
+from app.db.base import Base
+from app.db.writes import primary_key_column
+
+# Must match the configuration of the generated columns (see the migration)
+TEXT_SEARCH_CONFIG = "english"
+
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MinWords=10, MaxWords=30, MaxFragments=2"
+
+# Escaped in this order so the ampersands of the entities are not escaped again
+HTML_ESCAPES = (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#39;"))
+
+SEARCH_QUERY = Query(
+    ...,
+    min_length=1,
+    max_length=200,
+    description='Search terms. Supports "quoted phrases", OR and -excluded words',
+)
+
+
+def html_escape(text: Any) -> Any:
+    """SQL expression HTML-escaping `text`: the characters Python's html.escape replaces."""
+    for character, entity in HTML_ESCAPES:
+        text = func.replace(text, character, entity)
+    return text
+
+
+def search_documents(
+    db: Session,
+    model: Type[Base],
+    vector_column: Any,
+    text_column: Any,
+    terms: str,
+    filters: Sequence[Any] = (),
+    skip: int = 0,
+    limit: int = 20,
+) -> List[Tuple[Any, float, str]]:
+    """
+    Run a ranked full-text search.
+
+    Args:
+        db: Database session
+        model: Mapped class to search
+        vector_column: Generated tsvector column of `model`
+        text_column: Column the vector is generated from, used for snippets
+        terms: User search terms in web search syntax
+        filters: Extra SQL criteria, e.g. restricting results to the caller's rows
+        skip: Number of ranked matches to skip
+        limit: Maximum number of matches to return
+
+    Returns:
+        (row, rank, snippet) tuples, best match first; snippets are HTML-safe
+    """
+    pk = primary_key_column(model)
+    tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, terms)
+    rank = func.ts_rank_cd(vector_column, tsquery).label("rank")
+
+    # The vector itself is only needed for matching, not in the page
+    columns = [column for column in model.__table__.columns if column.key != vector_column.key]
+    page = (
+        select(*columns, rank)
+        .where(vector_column.op("@@")(tsquery), *filters)
+        .order_by(rank.desc(), pk)
+        .offset(skip)
+        .limit(limit)
+        .subquery()
+    )
+    matched = aliased(model, page)
+    # Escaped entities are separate tokens to the parser, so words still match
+    snippet = func.ts_headline(TEXT_SEARCH_CONFIG, html_escape(page.c[text_column.key]), tsquery, HEADLINE_OPTIONS)
+    statement = select(matched, page.c.rank, snippet).order_by(page.c.rank.desc(), page.c[pk.key])
+    return [tuple(row) for row in db.execute(statement).all()]
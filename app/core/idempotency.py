@@ -0,0 +1,139 @@
+"""
+Idempotency-Key support for create endpoints.
+
+A client sends a unique `Idempotency-Key` header with a write and reuses it
+for every retry of that write. The first request claims the key by
+inserting an `idempotency_keys` row in the same transaction as the write,
+together with a fingerprint of the route and payload and, before commit,
+the response. Retries get the stored response back with an
+`Idempotent-Replayed: true` header and the handler does not run again.
+
+A retry racing the original waits on the unique index until the original
+commits (then replays its response) or rolls back (then claims the key
+itself), so a write is never executed twice. Reusing a key for a different
+payload is rejected with 422.
+
+Completed responses are also kept in an in-process LRU, so retry storms are
+answered without a database round trip. Keys expire after
+IDEMPOTENCY_KEY_TTL_SECONDS; purge_expired_data.py removes the old rows.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Header, HTTPException, Response, status
+from pydantic import BaseModel
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.cache import LRUCacheBackend
+from app.models.models import IdempotencyKey
+
+load_dotenv()
+
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_ENTRIES", "10000"))
+
+# Completed responses: fingerprint, then the status code, then the body
+_hot_cache = LRUCacheBackend(max_entries=IDEMPOTENCY_CACHE_ENTRIES)
+
+
+def idempotency_key_header(
+    idempotency_key: Optional[str] = Header(
+        None,
+        max_length=255,
+        description="Unique key of this write; retries with the same key replay the first response",
+    ),
+) -> Optional[str]:
+    """Dependency reading the Idempotency-Key header of a write."""
+    return idempotency_key
+
+
+def request_fingerprint(route_name: str, payload: BaseModel) -> str:
+    """Compact fingerprint of a write: its route and its validated payload."""
+    raw = route_name.encode() + b"|" + payload.model_dump_json().encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def _cache_key(user_id: int, key: str) -> str:
+    return f"{user_id}:{key}"
+
+
+def _replay(stored_fingerprint: str, fingerprint: str, status_code: int, body: bytes) -> Response:
+    if stored_fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    response = Response(content=body, status_code=status_code, media_type="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent_replay(db: Session, user_id: int, key: str, fingerprint: str) -> Optional[Response]:
+    """
+    Replay the stored response of `key`, or claim the key for this request.
+
+    A claim inserts the key row in the session's transaction; it becomes
+    visible to retries when the handler commits its write.
+
+    Args:
+        db: Database session of the write
+        user_id: Caller; keys are scoped per user
+        key: Value of the Idempotency-Key header
+        fingerprint: `request_fingerprint` of the request
+
+    Returns:
+        The stored response for a retry, or None when the key was claimed
+    """
+    cached = _hot_cache.get(_cache_key(user_id, key))
+    if cached is not None:
+        return _replay(cached[:32].decode(), fingerprint, int(cached[32:35]), cached[35:])
+
+    try:
+        # Waits for a concurrent request holding the same key to finish
+        with db.begin_nested():
+            db.execute(insert(IdempotencyKey).values(user_id=user_id, idempotency_key=key, fingerprint=fingerprint))
+        return None
+    except IntegrityError:
+        pass
+
+    expired_before = datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_KEY_TTL_SECONDS)
+    reclaimed = db.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.idempotency_key == key,
+            IdempotencyKey.created_at < expired_before,
+        )
+        .values(fingerprint=fingerprint, status_code=None, response_body=None, created_at=datetime.now(timezone.utc))
+        .returning(IdempotencyKey.idempotency_id)
+    ).first()
+    if reclaimed is not None:
+        return None
+
+    stored = (
+        db.query(IdempotencyKey)
+        .filter(IdempotencyKey.user_id == user_id, IdempotencyKey.idempotency_key == key)
+        .one()
+    )
+    return _replay(stored.fingerprint, fingerprint, stored.status_code, stored.response_body)
+
+
+def record_idempotent_response(db: Session, user_id: int, key: str, status_code: int, body: bytes) -> None:
+    """Store the response with the key claimed by `idempotent_replay`; call before committing the write."""
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.idempotency_key == key)
+        .values(status_code=status_code, response_body=body)
+    )
+
+
+def idempotent_response(user_id: int, key: str, fingerprint: str, status_code: int, body: bytes) -> Response:
+    """Response of a committed idempotent write; also keeps it in the hot cache for retries."""
+    value = fingerprint.encode() + b"%03d" % status_code + body
+    _hot_cache.set(_cache_key(user_id, key), value, (), IDEMPOTENCY_KEY_TTL_SECONDS)
+    return Response(content=body, status_code=status_code, media_type="application/json")
@@ -0,0 +1,160 @@
+"""
+Nested `include=` support: load related rows level by level instead of lazily.
+
+`include=panels:50,panels.ownerships:5,maintenance_records` loads the named
+relationships of the returned rows. Every level is fetched with one
+selectin-style query (`WHERE fk IN (...)`) that ranks children per parent
+with a window function, so the optional `:N` suffix caps the children per
+parent in SQL. A request therefore costs one query for the parents plus one
+per included relationship, whatever the number of rows.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+
+import orjson
+from fastapi import HTTPException, Query, status
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+
+DEFAULT_INCLUDE_LIMIT = 100
+MAX_INCLUDE_LIMIT = 1000
+
+
+@dataclass
+class Include:
+    """A relationship that may be requested through `include=`."""
+    relationship: Any
+    schema: Type[BaseModel]
+    children: Dict[str, "Include"] = field(default_factory=dict)
+
+
+@dataclass
+class IncludeNode:
+    """A requested relationship with its per-parent limit and nested requests."""
+    include: Include
+    limit: int = DEFAULT_INCLUDE_LIMIT
+    children: Dict[str, "IncludeNode"] = field(default_factory=dict)
+
+
+def parse_include(raw: Optional[str], available: Dict[str, Include]) -> Optional[Dict[str, IncludeNode]]:
+    """
+    Parse an `include` parameter into a tree of requested relationships.
+
+    Args:
+        raw: Comma-separated dotted paths with optional `:limit` suffixes
+        available: Relationships that may be included, keyed by name
+
+    Returns:
+        Requested relationships keyed by name, or None if nothing was requested
+
+    Raises:
+        HTTPException: If a path is unknown or a limit is invalid
+    """
+    if not raw:
+        return None
+
+    tree: Dict[str, IncludeNode] = {}
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        path, _, limit_text = item.partition(":")
+        limit = None
+        if limit_text:
+            if not limit_text.isdigit() or not 1 <= int(limit_text) <= MAX_INCLUDE_LIMIT:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Include limit must be between 1 and {MAX_INCLUDE_LIMIT}: {item}"
+                )
+            limit = int(limit_text)
+
+        level_available, level_tree = available, tree
+        names = path.split(".")
+        for depth, name in enumerate(names):
+            if name not in level_available:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown include: {path}"
+                )
+            node = level_tree.setdefault(name, IncludeNode(level_available[name]))
+            if depth == len(names) - 1 and limit is not None:
+                node.limit = limit
+            level_available, level_tree = level_available[name].children, node.children
+
+    return tree or None
+
+
+def include_query(available: Dict[str, Include]) -> Callable[..., Optional[Dict[str, IncludeNode]]]:
+    """Build a dependency that parses the `include` query parameter."""
+    def dependency(
+        include: Optional[str] = Query(
+            None,
+            description=f"Related rows to embed: {', '.join(_paths(available))}. "
+                        f"Append `:N` to cap rows per parent (default {DEFAULT_INCLUDE_LIMIT})",
+        )
+    ) -> Optional[Dict[str, IncludeNode]]:
+        return parse_include(include, available)
+    return dependency
+
+
+def _paths(available: Dict[str, Include], prefix: str = "") -> List[str]:
+    paths = []
+    for name, include in available.items():
+        paths.append(prefix + name)
+        paths += _paths(include.children, prefix + name + ".")
+    return paths
+
+
+def load_includes(db: Session, parents: Sequence[Any], tree: Dict[str, IncludeNode]) -> None:
+    """
+    Load the requested relationships of `parents`, one query per level.
+
+    Loaded collections are attached as if the relationship had been loaded
+    by the ORM, so accessing them later issues no further queries.
+
+    Args:
+        db: Database session
+        parents: Already loaded parent objects
+        tree: Requested relationships from `parse_include`
+    """
+    if not parents:
+        return
+
+    for name, node in tree.items():
+        prop = node.include.relationship.property
+        (parent_column, child_column), = prop.local_remote_pairs
+        child_model = prop.mapper.class_
+        child_pk = prop.mapper.primary_key[0]
+
+        parent_keys = {getattr(parent, parent_column.key) for parent in parents}
+        rank = func.row_number().over(partition_by=child_column, order_by=child_pk).label("rank")
+        ranked = select(child_model, rank).where(child_column.in_(parent_keys)).subquery()
+        child_alias = aliased(child_model, ranked)
+        children = db.execute(
+            select(child_alias).where(ranked.c.rank <= node.limit).order_by(ranked.c[child_pk.key])
+        ).scalars().all()
+
+        by_parent = defaultdict(list)
+        for child in children:
+            by_parent[getattr(child, child_column.key)].append(child)
+        for parent in parents:
+            set_committed_value(parent, name, by_parent.get(getattr(parent, parent_column.key), []))
+
+        load_includes(db, children, node.children)
+
+
+def serialize_tree(obj: Any, schema: Type[BaseModel], tree: Optional[Dict[str, IncludeNode]]) -> dict:
+    """Serialize `obj` with `schema`, embedding the included relationships."""
+    data = schema.model_validate(obj, from_attributes=True).model_dump(mode="json")
+    for name, node in (tree or {}).items():
+        data[name] = [serialize_tree(child, node.include.schema, node.children) for child in getattr(obj, name)]
+    return data
+
+
+def tree_response(content: Any) -> Response:
+    """Build a JSON response from serialized trees."""
+    return Response(content=orjson.dumps(content), media_type="application/json")
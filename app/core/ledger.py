@@ -0,0 +1,215 @@
+"""
+Customer ledger balances from running-total snapshots.
+
+A customer's ledger is the sum of their `Transaction.amount` and
+`EnergyCredits.net_amount` values, with amounts signed as they are stored.
+Each customer has one `ledger_snapshots` row holding both totals over the
+rows up to two marks (a transaction id and a credit id). A balance is the
+snapshot plus the customer's rows past the marks, read from
+ix_transactions_customer_transaction and ix_energy_credits_customer_credit
+as index-only range scans, so it costs O(activity since the snapshot)
+rather than O(history).
+
+`take_ledger_snapshots` advances the snapshots; run it periodically. New
+rows always get ids past the marks, so inserts never invalidate a snapshot.
+Updates and deletes of rows a snapshot already covers drop that snapshot
+(see `snapshot_invalidator`); the customer's balance is summed in full until
+the next run rebuilds it.
+
+Marks only cover rows created at least LEDGER_SNAPSHOT_LAG_SECONDS ago: a row
+whose id was allocated before the snapshot but which was committed after it
+would be missed, so writes must commit within the lag.
+"""
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, exists, func, text, update
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.db.writes import primary_key_column
+from app.models.models import EnergyCredits, LedgerSnapshot, Transaction, User
+from app.schemas.schemas import MAX_BULK_ITEMS
+
+load_dotenv()
+
+LEDGER_SNAPSHOT_LAG_SECONDS = int(os.getenv("LEDGER_SNAPSHOT_LAG_SECONDS", "300"))
+
+
+@dataclass(frozen=True)
+class LedgerSource:
+    """A table contributing to the ledger, and the snapshot columns summarizing it."""
+    model: Type[Base]
+    amount: Any
+    mark: str
+    total: str
+
+
+LEDGER_SOURCES = (
+    LedgerSource(Transaction, Transaction.amount, "last_transaction_id", "transactions_total"),
+    LedgerSource(EnergyCredits, EnergyCredits.net_amount, "last_credit_id", "credits_total"),
+)
+
+
+@dataclass
+class LedgerTotals:
+    """Ledger totals of one customer; `snapshot_at` is None when no snapshot was used."""
+    transactions_total: Decimal
+    credits_total: Decimal
+    snapshot_at: Optional[datetime]
+
+    @property
+    def balance(self) -> Decimal:
+        return self.transactions_total + self.credits_total
+
+
+def _sum_after(db: Session, source: LedgerSource, customer_id: int, after: int) -> Decimal:
+    pk = primary_key_column(source.model)
+    total = (
+        db.query(func.coalesce(func.sum(source.amount), 0))
+        .filter(source.model.customer_id == customer_id, pk > after)
+        .scalar()
+    )
+    return Decimal(total)
+
+
+def ledger_balance(db: Session, customer_id: int) -> LedgerTotals:
+    """
+    Ledger totals of a customer: the snapshot plus the rows past its marks.
+
+    Args:
+        db: Database session
+        customer_id: Customer whose ledger to total
+
+    Returns:
+        Transaction and credit totals, and when the snapshot was taken
+    """
+    snapshot = db.get(LedgerSnapshot, customer_id)
+    totals = {}
+    for source in LEDGER_SOURCES:
+        base = getattr(snapshot, source.total) if snapshot is not None else Decimal(0)
+        after = getattr(snapshot, source.mark) if snapshot is not None else 0
+        totals[source.total] = base + _sum_after(db, source, customer_id, after)
+    return LedgerTotals(**totals, snapshot_at=snapshot.taken_at if snapshot is not None else None)
+
+
+def snapshot_invalidator(source_model: Type[Base]) -> Callable[[Session, List[Any]], None]:
+    """
+    Hook for `add_crud_routes(on_modify=...)` keeping snapshots consistent with edits.
+
+    Drops the snapshot of each owner of a changed row that the snapshot already
+    covers. Rows past the marks are summed on every read, so edits to them
+    need nothing.
+
+    Args:
+        source_model: Ledger table the CRUD endpoints write to
+
+    Returns:
+        Function called with the session and the primary keys of the changed rows
+    """
+    source = next(source for source in LEDGER_SOURCES if source.model is source_model)
+    pk = primary_key_column(source_model)
+
+    def invalidate_snapshots(db: Session, pk_values: List[Any]) -> None:
+        covered = exists().where(
+            pk.in_(pk_values),
+            source_model.customer_id == LedgerSnapshot.customer_id,
+            pk <= getattr(LedgerSnapshot, source.mark),
+        )
+        db.execute(delete(LedgerSnapshot).where(covered).execution_options(synchronize_session=False))
+
+    return invalidate_snapshots
+
+
+def _marks(db: Session, now: datetime) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Marks of the previous run and of this one, per snapshot mark column."""
+    cutoff = now - timedelta(seconds=LEDGER_SNAPSHOT_LAG_SECONDS)
+    previous, current = {}, {}
+    for source in LEDGER_SOURCES:
+        pk = primary_key_column(source.model)
+        previous[source.mark] = db.query(func.max(getattr(LedgerSnapshot, source.mark))).scalar() or 0
+        # A range scan over the rows since the previous run
+        newest = (
+            db.query(func.max(pk))
+            .filter(pk > previous[source.mark], source.model.created_at < cutoff)
+            .scalar()
+        )
+        current[source.mark] = newest or previous[source.mark]
+    return previous, current
+
+
+def _totals_by_customer(db: Session, source: LedgerSource, criteria: list) -> Dict[int, Decimal]:
+    rows = (
+        db.query(source.model.customer_id, func.coalesce(func.sum(source.amount), 0))
+        .filter(source.model.customer_id.isnot(None), *criteria)
+        .group_by(source.model.customer_id)
+    )
+    return {customer_id: Decimal(total) for customer_id, total in rows}
+
+
+def take_ledger_snapshots(db: Session, now: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    Bring every customer's snapshot up to the newest settled rows.
+
+    Customers without a snapshot (new ones, and those whose snapshot an edit
+    dropped) get one summed from their full history. Every other snapshot
+    only has the rows since the previous run added, and snapshots of
+    customers without recent activity are left untouched: summing past their
+    old marks gives the same result.
+
+    Args:
+        db: Database session; committed once at the end
+        now: Time the lag is measured from; defaults to the current time
+
+    Returns:
+        Number of snapshots created and advanced
+    """
+    now = now or datetime.now(timezone.utc)
+    if db.get_bind().dialect.name == "postgresql":
+        # Edits drop snapshots inside their own transaction; make them wait for
+        # this run, or make this run wait for them, so no stale total is kept
+        db.execute(text("LOCK TABLE ledger_snapshots IN EXCLUSIVE MODE"))
+    previous, current = _marks(db, now)
+
+    missing = [
+        customer_id for (customer_id,) in
+        db.query(User.id).filter(~exists().where(LedgerSnapshot.customer_id == User.id))
+    ]
+    created = {customer_id: {"customer_id": customer_id, **current} for customer_id in missing}
+    for source in LEDGER_SOURCES:
+        pk = primary_key_column(source.model)
+        totals = {}
+        for chunk in range(0, len(missing), MAX_BULK_ITEMS):
+            totals.update(_totals_by_customer(db, source, [
+                source.model.customer_id.in_(missing[chunk:chunk + MAX_BULK_ITEMS]), pk <= current[source.mark],
+            ]))
+        for customer_id, row in created.items():
+            row[source.total] = totals.get(customer_id, Decimal(0))
+
+    deltas = {
+        source: _totals_by_customer(db, source, [
+            primary_key_column(source.model) > previous[source.mark],
+            primary_key_column(source.model) <= current[source.mark],
+        ])
+        for source in LEDGER_SOURCES
+    }
+    active = set().union(*deltas.values()) - set(created)
+    advanced = []
+    if active:
+        for snapshot in db.query(LedgerSnapshot).filter(LedgerSnapshot.customer_id.in_(active)):
+            row = {"customer_id": snapshot.customer_id, **current, "taken_at": now}
+            for source, delta in deltas.items():
+                row[source.total] = getattr(snapshot, source.total) + delta.get(snapshot.customer_id, Decimal(0))
+            advanced.append(row)
+
+    if created:
+        db.execute(LedgerSnapshot.__table__.insert(), [{**row, "taken_at": now} for row in created.values()])
+    if advanced:
+        # Bulk UPDATE by primary key, one executemany
+        db.execute(update(LedgerSnapshot), advanced)
+    db.commit()
+    return len(created), len(advanced)
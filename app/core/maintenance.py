@@ -0,0 +1,91 @@
+"""
+Bulk maintenance scheduling: one INSERT ... SELECT for any number of panels.
+
+The panels to schedule are described as a SELECT over `solar_panels`, so
+the database writes a maintenance record per matching panel in the same
+statement, like the notification fan-out in app.core.notifications.
+"""
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Select, and_, exists, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate
+from app.models.models import MaintenanceRecord, SolarPanel
+
+# Invalidation tag of cached maintenance record lists and counts (see add_crud_routes)
+MAINTENANCE_LIST_TAG = f"{MaintenanceRecord.__tablename__}:list"
+
+
+def matching_panels(
+    farm_id: Optional[int] = None,
+    panel_ids: Optional[List[int]] = None,
+    panel_status: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    model: Optional[str] = None,
+) -> Select:
+    """
+    Build a SELECT of the panels matching all given criteria.
+
+    Args:
+        farm_id: Only panels on this farm
+        panel_ids: Only these panels
+        panel_status: Only panels in this status, e.g. "active"
+        manufacturer: Only panels of this manufacturer
+        model: Only panels of this model
+
+    Returns:
+        SELECT of the `panel_id` and `farm_id` columns
+    """
+    query = select(SolarPanel.panel_id, SolarPanel.farm_id)
+    if farm_id is not None:
+        query = query.where(SolarPanel.farm_id == farm_id)
+    if panel_ids is not None:
+        query = query.where(SolarPanel.panel_id.in_(panel_ids))
+    for column, value in (
+        (SolarPanel.panel_status, panel_status),
+        (SolarPanel.manufacturer, manufacturer),
+        (SolarPanel.model, model),
+    ):
+        if value is not None:
+            query = query.where(column == value)
+    return query
+
+
+def schedule_maintenance(
+    db: Session,
+    panels: Select,
+    values: Dict[str, Any],
+    skip_pending: bool = True,
+) -> int:
+    """
+    Insert one maintenance record per panel with a single INSERT ... SELECT.
+
+    The caller commits, then should call `maintenance_changed()`.
+
+    Args:
+        db: Database session
+        panels: SELECT of `panel_id` and `farm_id`, e.g. from `matching_panels`
+        values: Columns shared by every record, e.g. maintenance_type and scheduled_date
+        skip_pending: Leave out panels that already have uncompleted maintenance of
+            the same type
+
+    Returns:
+        Number of maintenance records inserted
+    """
+    panel = panels.subquery()
+    rows = select(panel.c.panel_id, panel.c.farm_id, *(literal(value) for value in values.values()))
+    if skip_pending:
+        pending = MaintenanceRecord.__table__.alias("pending")
+        rows = rows.where(~exists().where(and_(
+            pending.c.panel_id == panel.c.panel_id,
+            pending.c.maintenance_type == values.get("maintenance_type"),
+            pending.c.completed_date.is_(None),
+        )))
+    statement = insert(MaintenanceRecord).from_select(["panel_id", "farm_id", *values], rows)
+    return db.execute(statement).rowcount
+
+
+def maintenance_changed() -> None:
+    """Drop cached maintenance record lists and counts after records were written."""
+    invalidate([MAINTENANCE_LIST_TAG])
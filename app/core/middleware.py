@@ -2,9 +2,24 @@
 Custom middleware for authentication and request processing.
 """
 
+import logging
+import time
+from typing import List, Optional
+
 from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.compression import COMPRESSION_MIN_SIZE, create_compressor, is_compressible, negotiate_encoding
+from app.core.timing import RequestTiming, request_timing
+
+from app.db.base import read_your_writes
+from app.db.replica import READ_PRIMARY_COOKIE, request_client_key
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+timing_logger = logging.getLogger("app.timing")
 
 
 class DevAPIKeyMiddleware(BaseHTTPMiddleware):
@@ -56,3 +71,192 @@ class DevAPIKeyMiddleware(BaseHTTPMiddleware):
         # Continue processing the request
         response = await call_next(request)
         return response
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware that pins a client's reads to the primary after it writes.
+
+    Every successful request with an unsafe method is recorded against the
+    client so that `get_read_db` bypasses the replica for the stickiness
+    window. A cookie carrying the same deadline is set as well, so browser
+    clients stay pinned even when their next request lands on another worker.
+    """
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        """
+        Process the request and record successful writes.
+
+        Args:
+            request: The incoming request
+            call_next: The next middleware/endpoint in the chain
+
+        Returns:
+            Response: The response from the endpoint
+        """
+        response = await call_next(request)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            read_your_writes.mark_write(request_client_key(request))
+            window = read_your_writes.window_seconds
+            response.set_cookie(
+                READ_PRIMARY_COOKIE,
+                str(time.time() + window),
+                max_age=max(int(window), 1),
+                httponly=True,
+                samesite="lax",
+            )
+
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Middleware that compresses response bodies with gzip, zstd or brotli.
+
+    The coding is negotiated from Accept-Encoding. Bodies smaller than
+    `min_size` are sent as is; only that much is buffered to decide. Longer
+    bodies, including streaming ones such as exports served through
+    StreamingResponse, are compressed chunk by chunk and flushed after every
+    chunk, so memory use stays constant and clients can decode data as it
+    arrives.
+
+    Implemented as a plain ASGI middleware because BaseHTTPMiddleware would
+    buffer streaming bodies.
+    """
+
+    def __init__(self, app: ASGIApp, min_size: int = COMPRESSION_MIN_SIZE):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: The ASGI application
+            min_size: Smallest complete body, in bytes, that gets compressed
+        """
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        compressor = None
+        passthrough = False
+        # Body chunks held back until we know whether the body reaches min_size
+        pending: List[bytes] = []
+        pending_size = 0
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, compressor, passthrough, pending_size
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                compressible = is_compressible(headers.get("content-type", ""))
+                if "content-encoding" in headers or not compressible:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                pending.append(body)
+                pending_size += len(body)
+                if more_body and pending_size < self.min_size:
+                    return
+
+                body = b"".join(pending)
+                pending.clear()
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.min_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                compressor = create_compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                # The compressed bytes are a different representation: a strong
+                # validator of the identity body must not be reused for them.
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    body = compressor.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+
+            data = compressor.compress(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware reporting where the time of each request went.
+
+    Collects the phases timed through app.core.timing and adds them, with
+    the total, as a `Server-Timing` header. Once the response is complete,
+    logs one "request timing" record to the `app.timing` logger with the
+    method, path, status and timings as structured fields (`extra`), so a
+    JSON log formatter emits them as separate keys. For streaming responses
+    the header covers the time to the first byte and the log the whole body.
+
+    Only installed with SERVER_TIMING=true. A plain ASGI middleware, so the
+    context variable set here is visible to the whole request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: The ASGI application
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timing.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timing.reset(token)
+            timing_logger.info(
+                "request timing",
+                extra={"method": scope["method"], "path": scope["path"], "status": status_code, **timing.log_fields()},
+            )
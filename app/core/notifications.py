@@ -0,0 +1,165 @@
+"""
+Notification fan-out: one INSERT ... SELECT for any number of recipients.
+
+Recipients are described as a SELECT of customer ids, so the database
+resolves them and writes every notification row in the same statement.
+Nothing is loaded into the application, whatever the audience size.
+
+Inserted rows are announced on a LISTEN/NOTIFY channel for server push
+(see app.core.push).
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import CTE, Select, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate
+from app.core.push import NOTIFICATION_CHANNEL, encode_announcements
+from app.db.versions import note_written
+from app.models.models import Notification, PanelOwnership, SolarPanel, User
+
+# Invalidation tag of cached notification lists and counts (see add_crud_routes)
+NOTIFICATION_LIST_TAG = f"{Notification.__tablename__}:list"
+
+
+def id_runs(ids: Iterable[int]) -> List[Tuple[int, int]]:
+    """Collapse ids into ascending runs of consecutive ids, as (first, last) pairs."""
+    runs = []
+    for notification_id in sorted(ids):
+        if runs and notification_id == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], notification_id)
+        else:
+            runs.append((notification_id, notification_id))
+    return runs
+
+
+def announce_notifications(db: Session, runs: Sequence[Tuple[int, int]]) -> None:
+    """
+    Announce inserted notification ids to every worker's push listener.
+
+    Only the inserted ids are announced: ids that other transactions took
+    from the same sequence in between are left out, so no row is announced
+    twice. NOTIFY is transactional: the announcement is delivered on commit
+    and dropped on rollback, so call this before committing the insert.
+
+    Args:
+        db: Session whose transaction inserted the notifications
+        runs: Inserted ids as (first, last) runs of consecutive ids, see `id_runs`
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        for payload in encode_announcements(runs):
+            db.execute(select(func.pg_notify(NOTIFICATION_CHANNEL, payload)))
+
+
+def announce_inserted(db: Session, notifications: Sequence[Notification]) -> None:
+    """Announce notifications inserted through the CRUD endpoints."""
+    if notifications:
+        announce_notifications(db, id_runs(notification.notification_id for notification in notifications))
+
+
+def panel_owner_ids(
+    farm_id: Optional[int] = None,
+    panel_ids: Optional[List[int]] = None,
+    ownership_type: Optional[str] = None,
+    ownership_status: Optional[str] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+) -> Select:
+    """
+    Build a SELECT of the distinct customers owning panels that match all given criteria.
+
+    Args:
+        farm_id: Only owners of panels on this farm
+        panel_ids: Only owners of these panels
+        ownership_type: Only ownerships of this type, e.g. "lease"
+        ownership_status: Only ownerships in this status, e.g. "active"
+        city: Only customers in this city
+        state: Only customers in this state
+
+    Returns:
+        SELECT of one `customer_id` column
+    """
+    query = select(PanelOwnership.customer_id).where(PanelOwnership.customer_id.isnot(None)).distinct()
+    if farm_id is not None:
+        query = query.join(SolarPanel, SolarPanel.panel_id == PanelOwnership.panel_id).where(SolarPanel.farm_id == farm_id)
+    if panel_ids is not None:
+        query = query.where(PanelOwnership.panel_id.in_(panel_ids))
+    if ownership_type is not None:
+        query = query.where(PanelOwnership.ownership_type == ownership_type)
+    if ownership_status is not None:
+        query = query.where(PanelOwnership.ownership_status == ownership_status)
+    if city is not None or state is not None:
+        query = query.join(User, User.id == PanelOwnership.customer_id)
+        if city is not None:
+            query = query.where(User.city == city)
+        if state is not None:
+            query = query.where(User.state == state)
+    return query
+
+
+def insert_notifications(db: Session, rows: Select, also: Sequence[CTE] = ()) -> int:
+    """
+    Insert the notifications produced by `rows` with a single INSERT ... SELECT.
+
+    The inserted rows are announced for server push. The caller commits,
+    then should call `notifications_changed()`.
+
+    Args:
+        db: Database session
+        rows: SELECT whose column labels name Notification columns, one row per notification
+        also: Data-modifying CTEs to run in the same statement, so they see
+            the same snapshot as `rows`, e.g. records of what was notified
+
+    Returns:
+        Number of notifications inserted
+    """
+    columns = [column.key for column in rows.selected_columns]
+    inserted = (
+        insert(Notification)
+        .from_select(columns, rows)
+        .returning(Notification.notification_id)
+        .cte("inserted")
+    )
+    # Gaps and islands: ids minus their rank is constant within a run of consecutive ids
+    ranked = select(
+        inserted.c.notification_id,
+        (inserted.c.notification_id - func.row_number().over(order_by=inserted.c.notification_id)).label("run"),
+    ).subquery("ranked")
+    first_id, last_id = func.min(ranked.c.notification_id), func.max(ranked.c.notification_id)
+    statement = select(first_id, last_id).group_by(ranked.c.run).order_by(first_id)
+    for cte in also:
+        statement = statement.add_cte(cte)
+    note_written(db, Notification.__tablename__, *(cte.element.table.name for cte in also))
+    runs = [tuple(run) for run in db.execute(statement)]
+    if runs:
+        announce_notifications(db, runs)
+    return sum(last - first + 1 for first, last in runs)
+
+
+def fan_out_notifications(db: Session, recipients: Select, values: Dict[str, Any]) -> int:
+    """
+    Insert one notification per recipient with a single INSERT ... SELECT.
+
+    The inserted rows are announced for server push. The caller commits,
+    then should call `notifications_changed()`.
+
+    Args:
+        db: Database session
+        recipients: SELECT of one customer id column
+        values: Notification columns shared by every row, e.g. title and message
+
+    Returns:
+        Number of notifications inserted
+    """
+    recipient = recipients.subquery()
+    rows = select(
+        recipient.c[0].label("customer_id"),
+        literal(False).label("is_read"),
+        *(literal(value).label(name) for name, value in values.items()),
+    )
+    return insert_notifications(db, rows)
+
+
+def notifications_changed() -> None:
+    """Drop cached notification lists and counts after notifications were written."""
+    invalidate([NOTIFICATION_LIST_TAG])
@@ -0,0 +1,251 @@
+"""
+Server push of new notifications to connected customers.
+
+Delivery path:
+1. Writers announce the ids of the notifications they inserted with
+   `pg_notify` in the same transaction, so the announcement is only sent
+   when (and if) the rows are committed, and reaches every worker. Ids are
+   sent as runs of consecutive ids, split over as many payloads as needed
+   to stay under the NOTIFY size limit.
+2. Each worker runs one LISTEN connection in a background thread, started
+   with the first subscriber. For every announcement it loads the new rows
+   of the customers connected to that worker with a single query.
+3. The in-process hub hands each row to the event stream queues of its
+   customer. Each stream skips ids it has already sent, e.g. in the replay
+   of missed rows on reconnect.
+
+A reconnect that missed more rows than a stream queue holds gets a resync
+event instead of the rows. It carries the id of the newest row, so the
+client refetches the list once and later reconnects resume after it.
+
+Without PostgreSQL (e.g. SQLite in development) no announcements are made
+and streams only send keep-alives; clients still get missed rows on
+reconnect through Last-Event-ID.
+"""
+import asyncio
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from pydantic import TypeAdapter
+from sqlalchemy import or_
+
+from app.db.base import SessionLocal, engine
+from app.models.models import Notification
+from app.schemas.schemas import NotificationResponse
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_CHANNEL = "notifications_created"
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT_SECONDS", "15"))
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+# Ids of sent events each stream remembers to skip repeats
+NOTIFICATION_STREAM_SENT_IDS = 10 * NOTIFICATION_STREAM_QUEUE_SIZE
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_BYTES = 7900
+# Announced id runs loaded per query
+DISPATCH_RUNS = 500
+
+# Sent instead of events a slow client could not take; the client should refetch
+RESYNC_EVENT = b"event: resync\ndata: {}\n\n"
+
+notification_adapter = TypeAdapter(NotificationResponse)
+
+
+def encode_announcements(runs: Iterable[Tuple[int, int]]) -> List[str]:
+    """
+    Encode runs of notification ids as NOTIFY payloads.
+
+    Args:
+        runs: (first, last) ids of runs of consecutive inserted ids
+
+    Returns:
+        Payloads such as "10-42,45,50-51", each under NOTIFY_PAYLOAD_BYTES
+    """
+    payloads, parts, size = [], [], 0
+    for first, last in runs:
+        part = str(first) if first == last else f"{first}-{last}"
+        if parts and size + 1 + len(part) > NOTIFY_PAYLOAD_BYTES:
+            payloads.append(",".join(parts))
+            parts, size = [], 0
+        parts.append(part)
+        size += len(part) + 1
+    if parts:
+        payloads.append(",".join(parts))
+    return payloads
+
+
+def decode_announcement(payload: str) -> List[Tuple[int, int]]:
+    """Runs of notification ids of one payload built by `encode_announcements`."""
+    runs = []
+    for part in payload.split(","):
+        first, _, last = part.partition("-")
+        runs.append((int(first), int(last or first)))
+    return runs
+
+
+def resync_event(last_id: int) -> bytes:
+    """A resync event whose id makes the client's next reconnect resume after `last_id`."""
+    return b"id: %d\n" % last_id + RESYNC_EVENT
+
+
+def format_event(notification: Notification) -> bytes:
+    """Encode a notification as a server-sent event whose id is the notification id."""
+    data = notification_adapter.dump_json(notification_adapter.validate_python(notification, from_attributes=True))
+    return b"id: %d\nevent: notification\ndata: %s\n\n" % (notification.notification_id, data)
+
+
+@dataclass(eq=False)
+class Subscriber:
+    """Event queue of one open stream, owned by the event loop that serves it."""
+    customer_id: int
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(NOTIFICATION_STREAM_QUEUE_SIZE))
+    overflowed: bool = False
+    sent_ids: "OrderedDict[int, None]" = field(default_factory=OrderedDict)
+    # Ids up to this one are covered by a resync and never sent
+    resynced_through: int = 0
+
+    def mark_sent(self, notification_id: int) -> bool:
+        """Remember that `notification_id` was sent; False if it already was. Call on self.loop."""
+        if notification_id <= self.resynced_through or notification_id in self.sent_ids:
+            return False
+        self.sent_ids[notification_id] = None
+        if len(self.sent_ids) > NOTIFICATION_STREAM_SENT_IDS:
+            self.sent_ids.popitem(last=False)
+        return True
+
+    def deliver(self, notification_id: int, event: bytes) -> None:
+        # Runs on self.loop
+        if self.overflowed or not self.mark_sent(notification_id):
+            return
+        if self.queue.full():
+            # Drop the backlog and ask the client to resynchronize instead
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+            return
+        self.queue.put_nowait(event)
+
+    async def next_event(self, timeout: float) -> Optional[bytes]:
+        """Wait for the next event; None when `timeout` passes without one."""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is RESYNC_EVENT:
+            self.overflowed = False
+        return event
+
+
+class NotificationHub:
+    """In-process registry of the open notification streams of one worker."""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional["NotificationListener"] = None
+
+    def subscribe(self, customer_id: int) -> Subscriber:
+        subscriber = Subscriber(customer_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(customer_id, set()).add(subscriber)
+            if self._listener is None and engine.dialect.name == "postgresql":
+                self._listener = NotificationListener(self)
+                self._listener.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.customer_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.customer_id]
+
+    def customer_ids(self) -> List[int]:
+        """Customers with at least one open stream on this worker."""
+        with self._lock:
+            return list(self._subscribers)
+
+    def publish(self, customer_id: int, notification_id: int, event: bytes) -> None:
+        """Queue the event of a notification on every stream of `customer_id`. Safe to call from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(customer_id, ()))
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.deliver, notification_id, event)
+
+
+class NotificationListener(threading.Thread):
+    """LISTENs for announced notification ids and dispatches the new rows."""
+
+    def __init__(self, hub: NotificationHub, poll_seconds: float = 5.0):
+        super().__init__(name="notification-listener", daemon=True)
+        self.hub = hub
+        self.poll_seconds = poll_seconds
+
+    def run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Notification listener failed; reconnecting in %.0fs", backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+            else:
+                backoff = 1.0
+
+    def _listen(self) -> None:
+        connection = engine.raw_connection()
+        try:
+            dbapi_connection = connection.driver_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFICATION_CHANNEL}")
+            while True:
+                if select.select([dbapi_connection], [], [], self.poll_seconds) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                runs = []
+                while dbapi_connection.notifies:
+                    runs += decode_announcement(dbapi_connection.notifies.pop(0).payload)
+                if runs:
+                    self.dispatch(runs)
+        finally:
+            connection.invalidate()
+
+    def dispatch(self, runs: List[Tuple[int, int]]) -> None:
+        """Load the announced rows of locally connected customers and publish them."""
+        customer_ids = self.hub.customer_ids()
+        if not customer_ids:
+            return
+        db = SessionLocal()
+        try:
+            for chunk in range(0, len(runs), DISPATCH_RUNS):
+                announced = or_(*(
+                    Notification.notification_id.between(first, last)
+                    for first, last in runs[chunk:chunk + DISPATCH_RUNS]
+                ))
+                notifications = (
+                    db.query(Notification)
+                    .filter(announced, Notification.customer_id.in_(customer_ids))
+                    .order_by(Notification.notification_id)
+                    .all()
+                )
+                for notification in notifications:
+                    self.hub.publish(notification.customer_id, notification.notification_id, format_event(notification))
+        finally:
+            db.close()
+
+
+notification_hub = NotificationHub()
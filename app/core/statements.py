@@ -0,0 +1,280 @@
+"""
+Streaming customer statements.
+
+A statement lists a customer's transactions, energy credits and
+consumption records of a period, followed by one total per entry type.
+The entries of every customer come from one query, a UNION ALL of the
+three tables ordered by customer and date, read through a server-side
+cursor in batches of STATEMENT_FETCH_SIZE rows. Nothing holds more than a
+batch, so memory stays constant whatever the number of customers or rows.
+
+Entries fall in a period [start, end) by transaction date, by the start of
+the credit's billing period, and by the consumption month.
+"""
+import csv
+import io
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from queue import Queue
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import DateTime, Numeric, Select, cast, literal, null, select, type_coerce, union_all
+from sqlalchemy.orm import Session
+
+from app.core.serialization import encode_value
+from app.models.models import CustomerConsumption, EnergyCredits, Transaction
+
+load_dotenv()
+
+STATEMENT_FETCH_SIZE = int(os.getenv("STATEMENT_FETCH_SIZE", "1000"))
+STATEMENT_WORKERS = int(os.getenv("STATEMENT_WORKERS", "4"))
+# Entries buffered per statement file being written
+STATEMENT_QUEUE_SIZE = 1000
+# Size of the chunks rendered statements are emitted in
+STATEMENT_CHUNK_BYTES = 64 * 1024
+
+STATEMENT_FORMATS = ("csv", "json")
+ENTRY_COLUMNS = ("entry_date", "entry_type", "entry_id", "description", "energy_kwh", "amount")
+ENTRY_TYPES = ("transaction", "credit", "consumption")
+
+_END = object()
+
+
+def month_period(month: str) -> Tuple[date, date]:
+    """First day of the month `YYYY-MM` and the first day of the next month."""
+    start = datetime.strptime(month, "%Y-%m").date()
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def statement_entries(start: date, end: date, customer_id: Optional[int] = None) -> Select:
+    """
+    Entries of the statements of the period, ordered by customer then date.
+
+    Args:
+        start: First day of the period
+        end: Day after the period
+        customer_id: Only this customer's entries; every customer when None
+
+    Returns:
+        A UNION ALL with `customer_id` followed by ENTRY_COLUMNS
+    """
+    entry_date = DateTime(timezone=True)
+    start_at = datetime.combine(start, time.min, tzinfo=timezone.utc)
+    end_at = datetime.combine(end, time.min, tzinfo=timezone.utc)
+
+    # Each branch can use its (customer_id, date) index
+    transactions = select(
+        Transaction.customer_id.label("customer_id"),
+        Transaction.transaction_date.label("entry_date"),
+        literal("transaction").label("entry_type"),
+        Transaction.transaction_id.label("entry_id"),
+        Transaction.description.label("description"),
+        cast(null(), Numeric(10, 4)).label("energy_kwh"),
+        Transaction.amount.label("amount"),
+    ).where(Transaction.transaction_date >= start_at, Transaction.transaction_date < end_at)
+    credits = select(
+        EnergyCredits.customer_id,
+        type_coerce(EnergyCredits.billing_period_start, entry_date),
+        literal("credit"),
+        EnergyCredits.credit_id,
+        null(),
+        EnergyCredits.total_generated_kwh,
+        EnergyCredits.net_amount,
+    ).where(EnergyCredits.billing_period_start >= start, EnergyCredits.billing_period_start < end)
+    consumption = select(
+        CustomerConsumption.customer_id,
+        type_coerce(CustomerConsumption.month, entry_date),
+        literal("consumption"),
+        CustomerConsumption.consumption_id,
+        null(),
+        CustomerConsumption.energy_consumed_kwh,
+        CustomerConsumption.total_cost,
+    ).where(CustomerConsumption.month >= start, CustomerConsumption.month < end)
+
+    branches = [
+        (transactions, Transaction.customer_id),
+        (credits, EnergyCredits.customer_id),
+        (consumption, CustomerConsumption.customer_id),
+    ]
+    if customer_id is not None:
+        branches = [(branch.where(column == customer_id), column) for branch, column in branches]
+    else:
+        branches = [(branch.where(column.isnot(None)), column) for branch, column in branches]
+    entries = union_all(*(branch for branch, _ in branches)).subquery("entries")
+    return select(entries).order_by(
+        entries.c.customer_id, entries.c.entry_date, entries.c.entry_type, entries.c.entry_id
+    )
+
+
+def iter_statement_rows(db: Session, start: date, end: date, customer_id: Optional[int] = None) -> Iterator:
+    """Stream the rows of `statement_entries` through a server-side cursor."""
+    result = db.execute(
+        statement_entries(start, end, customer_id),
+        execution_options={"yield_per": STATEMENT_FETCH_SIZE},
+    )
+    yield from result
+
+
+def _chunked(pieces: Iterable[bytes]) -> Iterator[bytes]:
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STATEMENT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _csv_line(values) -> bytes:
+    line = io.StringIO()
+    csv.writer(line).writerow(values)
+    return line.getvalue().encode()
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _csv_pieces(entries: Iterable, totals: dict) -> Iterator[bytes]:
+    yield _csv_line(ENTRY_COLUMNS)
+    for entry in entries:
+        yield _csv_line([
+            _iso(entry.entry_date), entry.entry_type, entry.entry_id,
+            entry.description, entry.energy_kwh, entry.amount,
+        ])
+    for entry_type in ENTRY_TYPES:
+        yield _csv_line(["", "total", "", entry_type, "", totals[entry_type]])
+
+
+def _json_pieces(customer_id: int, start: date, end: date, entries: Iterable, totals: dict) -> Iterator[bytes]:
+    header = encode_value({"customer_id": customer_id, "period_start": start, "period_end": end})
+    yield header[:-1] + b',"entries":['
+    for index, entry in enumerate(entries):
+        yield (b"," if index else b"") + encode_value(dict(zip(ENTRY_COLUMNS, (
+            entry.entry_date, entry.entry_type, entry.entry_id, entry.description, entry.energy_kwh, entry.amount,
+        ))))
+    yield b'],"totals":' + encode_value(totals) + b"}"
+
+
+def render_statement(customer_id: int, start: date, end: date, entries: Iterable, fmt: str) -> Iterator[bytes]:
+    """
+    Render one customer's statement incrementally.
+
+    Args:
+        customer_id: Customer the statement is for
+        start: First day of the period
+        end: Day after the period
+        entries: The customer's rows of `statement_entries`, in order
+        fmt: One of STATEMENT_FORMATS
+
+    Returns:
+        The statement as an iterator of byte chunks
+    """
+    totals = {entry_type: Decimal(0) for entry_type in ENTRY_TYPES}
+
+    def counted(rows):
+        for row in rows:
+            if row.amount is not None:
+                totals[row.entry_type] += row.amount
+            yield row
+
+    # The totals are complete once the generator has consumed every entry
+    if fmt == "csv":
+        pieces = _csv_pieces(counted(entries), totals)
+    else:
+        pieces = _json_pieces(customer_id, start, end, counted(entries), totals)
+    return _chunked(pieces)
+
+
+def statement_path(output_dir: str, customer_id: int, fmt: str) -> str:
+    return os.path.join(output_dir, f"customer_{customer_id}.{fmt}")
+
+
+def _write_statement_file(path: str, customer_id: int, start: date, end: date, fmt: str, queue: Queue) -> None:
+    entries = iter(queue.get, _END)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in render_statement(customer_id, start, end, entries, fmt):
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Keep the reader from blocking on a full queue
+        for _ in entries:
+            pass
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_statements(
+    db: Session,
+    start: date,
+    end: date,
+    fmt: str,
+    output_dir: str,
+    customer_id: Optional[int] = None,
+    workers: int = STATEMENT_WORKERS,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[int, int]:
+    """
+    Write one statement file per customer with entries in the period.
+
+    The cursor is read on the calling thread and each customer's entries are
+    handed to a writer thread through a bounded queue, so up to `workers`
+    files are rendered and written while the next customers are read.
+
+    Args:
+        db: Database session
+        start: First day of the period
+        end: Day after the period
+        fmt: One of STATEMENT_FORMATS
+        output_dir: Directory for the `customer_<id>.<fmt>` files; created if missing
+        customer_id: Only this customer's statement; every customer when None
+        workers: Number of statement files written at the same time
+        progress: Called after each customer with (customer id, entries)
+
+    Returns:
+        Number of statements and entries written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    slots = threading.BoundedSemaphore(workers)
+    errors = []
+    statements, written = 0, 0
+
+    def finished(future) -> None:
+        slots.release()
+        if future.exception() is not None:
+            errors.append(future.exception())
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = iter_statement_rows(db, start, end, customer_id)
+        for entry_customer, entries in itertools.groupby(rows, key=lambda row: row.customer_id):
+            if errors:
+                break
+            slots.acquire()
+            queue = Queue(maxsize=STATEMENT_QUEUE_SIZE)
+            path = statement_path(output_dir, entry_customer, fmt)
+            pool.submit(_write_statement_file, path, entry_customer, start, end, fmt, queue).add_done_callback(finished)
+            count = 0
+            for entry in entries:
+                queue.put(entry)
+                count += 1
+            queue.put(_END)
+
+            statements += 1
+            written += count
+            if progress is not None:
+                progress(entry_customer, count)
+
+    if errors:
+        raise errors[0]
+    return statements, written
@@ -0,0 +1,193 @@
+"""
+Per-request timing of auth, SQL and serialization.
+
+With SERVER_TIMING=true every request gets a `RequestTiming` in a context
+variable, and each phase adds its duration to it:
+
+- auth: token verification and the user lookup in `get_current_user`
+  (its query is also counted under db)
+- db: every SQL statement, timed by engine events
+- serialize: the explicit encoders of the list endpoints, plus everything
+  FastAPI does between the endpoint returning and the response existing
+  (response model validation and serialization), measured by routes of
+  `TimedRoute`
+
+ServerTimingMiddleware reports them in a `Server-Timing` header and in the
+fields of one log record per request. When the setting is off, no event
+listener or middleware is installed, `TimedRoute` behaves as `APIRoute`,
+and `timed()` only reads the unset context variable.
+"""
+import functools
+import inspect
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+TIMING_PHASES = ("auth", "db", "serialize")
+
+
+class RequestTiming:
+    """Accumulated duration and count of each phase of one request."""
+
+    __slots__ = ("started", "seconds", "counts", "returned")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        # When the endpoint of the request last returned, see TimedRoute
+        self.returned: Optional[float] = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        """Value of the Server-Timing header, durations in milliseconds."""
+        metrics = []
+        for phase in TIMING_PHASES:
+            if phase in self.seconds:
+                metric = f"{phase};dur={self.seconds[phase] * 1000:.1f}"
+                if phase == "db":
+                    metric += f';desc="{self.counts[phase]} queries"'
+                metrics.append(metric)
+        metrics.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def log_fields(self) -> Dict[str, float]:
+        """Structured log fields: `<phase>_ms` per phase, `db_queries` and `total_ms`."""
+        fields = {f"{phase}_ms": round(self.seconds.get(phase, 0.0) * 1000, 2) for phase in TIMING_PHASES}
+        fields["db_queries"] = self.counts.get("db", 0)
+        fields["total_ms"] = round(self.elapsed() * 1000, 2)
+        return fields
+
+
+request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+class _Phase:
+    __slots__ = ("timing", "phase", "started")
+
+    def __init__(self, timing: RequestTiming, phase: str):
+        self.timing = timing
+        self.phase = phase
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.timing.add(self.phase, time.perf_counter() - self.started)
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def timed(phase: str):
+    """Context manager adding the duration of its block to `phase` of the current request."""
+    timing = request_timing.get()
+    if timing is None:
+        return _NO_PHASE
+    return _Phase(timing, phase)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if request_timing.get() is not None:
+        context._timing_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    timing = request_timing.get()
+    started = getattr(context, "_timing_started", None)
+    if timing is not None and started is not None:
+        timing.add("db", time.perf_counter() - started)
+
+
+def enable_server_timing() -> None:
+    """Install the SQL hooks; called at startup when SERVER_TIMING is on."""
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _mark_returned() -> None:
+    timing = request_timing.get()
+    if timing is not None:
+        timing.returned = time.perf_counter()
+
+
+def _marking_return(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap `endpoint` to note when it returns; sync stays sync, so FastAPI still runs it in a thread."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def marked(*args, **kwargs):
+            result = await endpoint(*args, **kwargs)
+            _mark_returned()
+            return result
+    else:
+        @functools.wraps(endpoint)
+        def marked(*args, **kwargs):
+            result = endpoint(*args, **kwargs)
+            _mark_returned()
+            return result
+    marked.marks_return = True
+    return marked
+
+
+class TimedRoute(APIRoute):
+    """
+    Route adding FastAPI's own response handling to the `serialize` phase.
+
+    The route handler validates and serializes the endpoint's result after
+    the endpoint returns, with no hook in between. The endpoint is wrapped to
+    note when it returns, and the handler adds the time from then until it
+    has built the response. Pass it as the `route_class` of a router.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        # Routes copied by include_router get the already wrapped endpoint;
+        # generator endpoints stream their own items
+        if SERVER_TIMING and not getattr(endpoint, "marks_return", False) and not (
+            inspect.isgeneratorfunction(endpoint) or inspect.isasyncgenfunction(endpoint)
+        ):
+            endpoint = _marking_return(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        handler = super().get_route_handler()
+        if not SERVER_TIMING:
+            return handler
+
+        async def timed_handler(request: Request) -> Response:
+            response = await handler(request)
+            timing = request_timing.get()
+            if timing is not None and timing.returned is not None:
+                timing.add("serialize", time.perf_counter() - timing.returned)
+                timing.returned = None
+            return response
+
+        return timed_handler
@@ -0,0 +1,478 @@
+"""
+Cold archive of old energy generation readings.
+
+Whole panel-months older than ENERGY_ARCHIVE_AFTER_DAYS are moved out of
+`energy_generation` and `energy_generation_days` (see app.db.packed) into
+one compressed columnar file each:
+
+    {ENERGY_ARCHIVE_DIR}/{panel_id}/{YYYY}-{MM}.egc
+
+Every column is stored as its own zlib-compressed block of little-endian
+int64 values: timestamps as microseconds since the epoch, numerics as
+scaled integers, ids and timestamps delta-encoded. The header holds the
+row count, time range and id range, so readers skip files outside a
+requested range, or not holding a requested id, without decompressing them.
+Archived readings are read-only.
+
+A file is written and fsynced before its rows are deleted, and each
+panel-month is deleted in its own transaction; a rerun after a crash merges
+into the existing file instead of duplicating rows. Readings inserted later
+for an archived month stay in the table until the next run folds them in.
+
+`{ENERGY_ARCHIVE_DIR}/marks.json` bounds the archive for its readers:
+- "upper_bound": no archived reading is at or after it. Raised before a run
+  moves anything, so readers of later ranges skip the archive altogether.
+- "high_water_mark": every reading before it was archived. Raised once a
+  run has completed, so the retention purge never drops unarchived rows.
+- "archived_created_before": readings created before it and older than the
+  high-water mark were seen by a completed run. Readings inserted later for
+  an archived month are newer, so the purge leaves them for the next run.
+  Set ENERGY_ARCHIVE_COMMIT_LAG_SECONDS before the run's start, to cover
+  writes committed after the run read their month.
+"""
+import heapq
+import itertools
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.packed import GenerationReading, as_utc, reading_order, to_reading, unpack_readings
+from app.db.writes import delete_many
+from app.models.models import EnergyGeneration, EnergyGenerationDay, PanelOwnership, SolarPanel
+from app.schemas.schemas import MAX_BULK_ITEMS
+
+load_dotenv()
+
+ENERGY_ARCHIVE_DIR = Path(os.getenv("ENERGY_ARCHIVE_DIR", "archive/energy_generation"))
+ENERGY_ARCHIVE_AFTER_DAYS = int(os.getenv("ENERGY_ARCHIVE_AFTER_DAYS", "365"))
+ENERGY_ARCHIVE_COMMIT_LAG_SECONDS = int(os.getenv("ENERGY_ARCHIVE_COMMIT_LAG_SECONDS", "3600"))
+
+ARCHIVE_MAGIC = b"EGC1"
+ARCHIVE_SUFFIX = ".egc"
+ARCHIVE_MARKS_FILE = "marks.json"
+
+# Stored columns: "id" and "time" columns are delta-encoded, integers give
+# the decimal places of a numeric column. panel_id is implied by the path.
+ARCHIVE_COLUMNS = (
+    ("generation_id", "id"),
+    ("timestamp", "time"),
+    ("energy_generated_kwh", 4),
+    ("voltage", 2),
+    ("current", 2),
+    ("efficiency_percentage", 2),
+    ("created_at", "time"),
+)
+
+_NULL = -(2 ** 63)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _micros(value: datetime) -> int:
+    return (as_utc(value) - _EPOCH) // _MICROSECOND
+
+
+def _encode_value(value, kind) -> int:
+    if value is None:
+        return _NULL
+    if kind == "id":
+        return value
+    if kind == "time":
+        return _micros(value)
+    return int(Decimal(value).scaleb(kind).to_integral_value())
+
+
+def _decode_value(value: int, kind):
+    if value == _NULL:
+        return None
+    if kind == "id":
+        return value
+    if kind == "time":
+        return _EPOCH + value * _MICROSECOND
+    return Decimal(value).scaleb(-kind)
+
+
+def _pack(values: Sequence[int], delta: bool) -> bytes:
+    if delta:
+        values = [current - previous for previous, current in zip(itertools.chain((0,), values), values)]
+    packed = array("q", values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return zlib.compress(packed.tobytes())
+
+
+def _unpack(block: bytes, delta: bool) -> List[int]:
+    packed = array("q")
+    packed.frombytes(zlib.decompress(block))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return list(itertools.accumulate(packed)) if delta else packed.tolist()
+
+
+def archive_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Start of the month holding the newest archivable reading; whole months before it are archived."""
+    oldest = (now or datetime.now(timezone.utc)) - timedelta(days=ENERGY_ARCHIVE_AFTER_DAYS)
+    return oldest.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def panel_month_path(panel_id: int, month: datetime) -> Path:
+    return ENERGY_ARCHIVE_DIR / str(panel_id) / f"{month:%Y-%m}{ARCHIVE_SUFFIX}"
+
+
+def write_panel_month(path: Path, readings: Sequence[GenerationReading]) -> None:
+    """Atomically write `readings`, sorted by `reading_order`, to `path`."""
+    blocks = [
+        _pack([_encode_value(getattr(reading, name), kind) for reading in readings], kind in ("id", "time"))
+        for name, kind in ARCHIVE_COLUMNS
+    ]
+    header = json.dumps({
+        "rows": len(readings),
+        "first": _micros(readings[0].timestamp),
+        "last": _micros(readings[-1].timestamp),
+        "first_id": min(reading.generation_id for reading in readings),
+        "last_id": max(reading.generation_id for reading in readings),
+        "columns": [name for name, kind in ARCHIVE_COLUMNS],
+    }).encode()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".tmp")
+    with open(partial, "wb") as archive:
+        archive.write(ARCHIVE_MAGIC + struct.pack("<I", len(header)) + header)
+        for block in blocks:
+            archive.write(struct.pack("<I", len(block)) + block)
+        archive.flush()
+        os.fsync(archive.fileno())
+    os.replace(partial, path)
+
+
+def read_header(path: Path) -> dict:
+    with open(path, "rb") as archive:
+        if archive.read(4) != ARCHIVE_MAGIC:
+            raise ValueError(f"{path} is not an energy generation archive")
+        (length,) = struct.unpack("<I", archive.read(4))
+        return json.loads(archive.read(length))
+
+
+def read_panel_month(path: Path, panel_id: int) -> List[GenerationReading]:
+    """Decode every reading stored in `path`, in `reading_order`."""
+    with open(path, "rb") as archive:
+        data = archive.read()
+    (length,) = struct.unpack_from("<I", data, 4)
+    offset = 8 + length
+    columns = []
+    for name, kind in ARCHIVE_COLUMNS:
+        (size,) = struct.unpack_from("<I", data, offset)
+        values = _unpack(data[offset + 4:offset + 4 + size], kind in ("id", "time"))
+        columns.append([_decode_value(value, kind) for value in values])
+        offset += 4 + size
+    generation_ids, timestamps, kwh, voltage, current, efficiency, created_at = columns
+    return [
+        GenerationReading(*row)
+        for row in zip(generation_ids, itertools.repeat(panel_id), timestamps, kwh, voltage, current, efficiency, created_at)
+    ]
+
+
+# Parsed marks file, keyed by its modification time
+_marks_cache: Tuple[Optional[int], Dict[str, datetime]] = (None, {})
+
+
+def archive_marks() -> Dict[str, datetime]:
+    """The "upper_bound", "high_water_mark" and "archived_created_before" marks; empty when nothing was archived."""
+    global _marks_cache
+    path = ENERGY_ARCHIVE_DIR / ARCHIVE_MARKS_FILE
+    try:
+        modified = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached_at, marks = _marks_cache
+    if cached_at != modified:
+        with open(path, "rb") as marks_file:
+            marks = {name: datetime.fromisoformat(value) for name, value in json.load(marks_file).items()}
+        _marks_cache = (modified, marks)
+    return marks
+
+
+def raise_archive_mark(name: str, moment: datetime) -> None:
+    """Atomically move the archive mark `name` to `moment`, unless it is already later."""
+    marks = dict(archive_marks())
+    if name in marks and marks[name] >= moment:
+        return
+    marks[name] = moment
+    ENERGY_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = ENERGY_ARCHIVE_DIR / ARCHIVE_MARKS_FILE
+    partial = path.with_suffix(".tmp")
+    with open(partial, "w") as marks_file:
+        json.dump({key: value.isoformat() for key, value in marks.items()}, marks_file)
+        marks_file.flush()
+        os.fsync(marks_file.fileno())
+    os.replace(partial, path)
+
+
+def archived_months(
+    panel_ids: Iterable[int],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Dict[int, List[Path]]:
+    """
+    Find the archive files of `panel_ids` that may hold readings in [start, end).
+
+    Returns:
+        Oldest-first file paths by panel id; panels without such files are left out
+    """
+    if not ENERGY_ARCHIVE_DIR.is_dir():
+        return {}
+    first_month = as_utc(start).astimezone(timezone.utc).strftime("%Y-%m") if start is not None else ""
+    last_month = as_utc(end).astimezone(timezone.utc).strftime("%Y-%m") if end is not None else "9999-99"
+    found = {}
+    for panel_id in panel_ids:
+        directory = ENERGY_ARCHIVE_DIR / str(panel_id)
+        if not directory.is_dir():
+            continue
+        paths = sorted(
+            path for path in directory.glob(f"*{ARCHIVE_SUFFIX}")
+            if first_month <= path.stem <= last_month
+        )
+        if paths:
+            found[panel_id] = paths
+    return found
+
+
+def _in_range(reading: GenerationReading, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    return (start is None or reading.timestamp >= start) and (end is None or reading.timestamp < end)
+
+
+def _panel_readings(panel_id: int, paths: List[Path], start, end) -> Iterator[GenerationReading]:
+    # Files are decoded lazily, so a page near the start only reads the first ones
+    for path in paths:
+        for reading in read_panel_month(path, panel_id):
+            if _in_range(reading, start, end):
+                yield reading
+
+
+def iter_archived(
+    months: Dict[int, List[Path]],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[GenerationReading]:
+    """Stream the archived readings in [start, end) of all panels in `reading_order`."""
+    start, end = as_utc(start), as_utc(end)
+    streams = [_panel_readings(panel_id, paths, start, end) for panel_id, paths in months.items()]
+    return heapq.merge(*streams, key=reading_order)
+
+
+def count_archived(
+    months: Dict[int, List[Path]],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> int:
+    """Count archived readings in [start, end); only files cut by the range are decoded."""
+    start, end = as_utc(start), as_utc(end)
+    low = _micros(start) if start is not None else None
+    high = _micros(end) if end is not None else None
+    total = 0
+    for panel_id, paths in months.items():
+        for path in paths:
+            header = read_header(path)
+            if (low is None or header["first"] >= low) and (high is None or header["last"] < high):
+                total += header["rows"]
+            elif (low is None or header["last"] >= low) and (high is None or header["first"] < high):
+                total += sum(1 for reading in read_panel_month(path, panel_id) if _in_range(reading, start, end))
+    return total
+
+
+def customer_archived_months(
+    db: Session,
+    customer_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Dict[int, List[Path]]:
+    """
+    Archive files in [start, end) of the panels owned by `customer_id`.
+
+    Ranges starting at or after the archive's upper bound return without
+    querying the panels or listing any directory.
+    """
+    if not ENERGY_ARCHIVE_DIR.is_dir():
+        return {}
+    # Archives written before the marks existed have no bound and are always listed
+    upper_bound = archive_marks().get("upper_bound")
+    if upper_bound is not None and start is not None and as_utc(start) >= upper_bound:
+        return {}
+    panel_ids = [
+        panel_id for (panel_id,) in
+        db.query(PanelOwnership.panel_id).filter(PanelOwnership.customer_id == customer_id).distinct()
+        if panel_id is not None
+    ]
+    return archived_months(panel_ids, start, end)
+
+
+def find_archived(panel_ids: Iterable[int], generation_id: int) -> Optional[GenerationReading]:
+    """
+    Read one archived reading of `panel_ids` by id.
+
+    Files whose header id range does not cover `generation_id` are skipped
+    unread; files written before headers had one are decoded.
+
+    Returns:
+        The reading, or None when no archive file of the panels holds it
+    """
+    for panel_id, paths in archived_months(panel_ids).items():
+        for path in paths:
+            header = read_header(path)
+            if not header.get("first_id", generation_id) <= generation_id <= header.get("last_id", generation_id):
+                continue
+            for reading in read_panel_month(path, panel_id):
+                if reading.generation_id == generation_id:
+                    return reading
+    return None
+
+
+def reading_cursor(reading) -> str:
+    """Cursor continuing a listing after `reading`: "<timestamp in epoch microseconds>.<generation_id>"."""
+    return f"{_micros(reading.timestamp)}.{reading.generation_id}"
+
+
+def parse_reading_cursor(cursor: str) -> Tuple[datetime, int]:
+    """The `reading_order` key a `reading_cursor` continues after; raises ValueError if malformed."""
+    micros, generation_id = cursor.split(".")
+    return _EPOCH + int(micros) * _MICROSECOND, int(generation_id)
+
+
+def merge_page(
+    streams: Sequence[Iterable[GenerationReading]],
+    skip: int,
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> list:
+    """
+    Return one page of readings merged from several storage tiers, in `reading_order`.
+
+    Args:
+        streams: Readings of each tier in `reading_order`, e.g. from `iter_archived`,
+            `iter_packed` and the first skip + limit live rows after the cursor
+        skip: Rows to skip
+        limit: Page size
+        after: `reading_order` key of the last reading of the previous page
+
+    Returns:
+        Rows of the page
+    """
+    if after is not None:
+        streams = [itertools.dropwhile(lambda reading: reading_order(reading) <= after, stream) for stream in streams]
+    merged = heapq.merge(*streams, key=reading_order)
+    return list(itertools.islice(merged, skip, skip + limit))
+
+
+def _oldest_month(db: Session, panel_id: int, cutoff: datetime) -> Optional[datetime]:
+    # Both lookups use the (panel_id, time) index of their table
+    oldest_row = (
+        db.query(func.min(EnergyGeneration.timestamp))
+        .filter(EnergyGeneration.panel_id == panel_id, EnergyGeneration.timestamp < cutoff)
+        .scalar()
+    )
+    oldest_day = (
+        db.query(func.min(EnergyGenerationDay.day))
+        .filter(EnergyGenerationDay.panel_id == panel_id, EnergyGenerationDay.day < cutoff.date())
+        .scalar()
+    )
+    candidates = [as_utc(oldest_row).astimezone(timezone.utc)] if oldest_row is not None else []
+    if oldest_day is not None:
+        candidates.append(datetime(oldest_day.year, oldest_day.month, 1, tzinfo=timezone.utc))
+    if not candidates:
+        return None
+    return min(candidates).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def archive_energy_generation(
+    db: Session,
+    cutoff: Optional[datetime] = None,
+    progress: Optional[Callable[[int, datetime, int], None]] = None,
+) -> Tuple[int, int]:
+    """
+    Move every whole panel-month of readings before `cutoff` into archive files.
+
+    Both reading rows and packed panel-days (see app.db.packed) are archived.
+    Readings without a panel are left in the table.
+
+    Args:
+        db: Database session; every panel-month is committed on its own
+        cutoff: Start of the first month to keep; defaults to `archive_cutoff()`
+        progress: Called after each panel-month with (panel id, month, readings archived)
+
+    Returns:
+        Number of panel-months and readings archived
+    """
+    cutoff = cutoff or archive_cutoff()
+    started = datetime.now(timezone.utc)
+    # Readers of ranges past the previous bound must start looking at the archive
+    raise_archive_mark("upper_bound", cutoff)
+    panel_months, archived = 0, 0
+    panel_ids = [panel_id for (panel_id,) in db.query(SolarPanel.panel_id).order_by(SolarPanel.panel_id)]
+    db.rollback()
+
+    for panel_id in panel_ids:
+        while True:
+            month = _oldest_month(db, panel_id, cutoff)
+            if month is None:
+                break
+            month_end = min(_next_month(month), cutoff)
+            rows = (
+                db.query(EnergyGeneration)
+                .filter(
+                    EnergyGeneration.panel_id == panel_id,
+                    EnergyGeneration.timestamp >= month,
+                    EnergyGeneration.timestamp < month_end,
+                )
+                .all()
+            )
+            packed_days = (
+                db.query(EnergyGenerationDay)
+                .filter(
+                    EnergyGenerationDay.panel_id == panel_id,
+                    EnergyGenerationDay.day >= month.date(),
+                    EnergyGenerationDay.day < month_end.date(),
+                )
+                .all()
+            )
+
+            path = panel_month_path(panel_id, month)
+            readings = {row.generation_id: to_reading(row) for row in rows}
+            for packed_day in packed_days:
+                for reading in unpack_readings(packed_day):
+                    readings.setdefault(reading.generation_id, reading)
+            moved = len(readings)
+            if path.exists():
+                for reading in read_panel_month(path, panel_id):
+                    readings.setdefault(reading.generation_id, reading)
+            write_panel_month(path, sorted(readings.values(), key=reading_order))
+
+            ids = [row.generation_id for row in rows]
+            for chunk in range(0, len(ids), MAX_BULK_ITEMS):
+                delete_many(db, EnergyGeneration, ids[chunk:chunk + MAX_BULK_ITEMS])
+            delete_many(db, EnergyGenerationDay, [packed_day.day_id for packed_day in packed_days])
+            db.commit()
+            db.expunge_all()
+
+            panel_months += 1
+            archived += moved
+            if progress is not None:
+                progress(panel_id, month, moved)
+
+    raise_archive_mark("high_water_mark", cutoff)
+    raise_archive_mark("archived_created_before", started - timedelta(seconds=ENERGY_ARCHIVE_COMMIT_LAG_SECONDS))
+    return panel_months, archived
@@ -1,15 +1,48 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.requests import Request
 import os
+import time
 from dotenv import load_dotenv
+from app.db.replica import ReplicaMonitor, ReadYourWritesTracker, READ_PRIMARY_COOKIE, request_client_key
+from app.db.versions import track_table_writes
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Optional streaming replica used by read-only endpoints
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+REPLICA_CONNECT_TIMEOUT_SECONDS = int(os.getenv("REPLICA_CONNECT_TIMEOUT_SECONDS", "2"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
 engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects returned by INSERT/UPDATE ... RETURNING are complete; expiring them on
+# commit would force a refresh SELECT as soon as the response is serialized.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+# Every commit bumps the versions of the tables it wrote (see app/db/versions.py)
+track_table_writes(SessionLocal)
+
+replica_engine = None
+ReplicaSessionLocal = None
+if REPLICA_DATABASE_URL:
+    replica_engine = create_engine(
+        REPLICA_DATABASE_URL,
+        pool_pre_ping=True,
+        connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT_SECONDS},
+    )
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+replica_monitor = ReplicaMonitor(
+    replica_engine,
+    max_lag_seconds=REPLICA_MAX_LAG_SECONDS,
+    check_interval=REPLICA_CHECK_INTERVAL_SECONDS,
+)
+read_your_writes = ReadYourWritesTracker(window_seconds=READ_YOUR_WRITES_SECONDS)
 
 Base = declarative_base()
 
@@ -19,3 +52,54 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def reads_pinned_to_primary(request: Request) -> bool:
+    """Return True if the client wrote within the read-your-writes window."""
+    if read_your_writes.is_sticky(request_client_key(request)):
+        return True
+    pinned_until = request.cookies.get(READ_PRIMARY_COOKIE)
+    try:
+        return pinned_until is not None and float(pinned_until) > time.time()
+    except ValueError:
+        return False
+
+
+def get_read_db(request: Request):
+    """
+    Session for read-only endpoints.
+
+    Uses the replica when one is configured, reachable and within the lag
+    threshold, and the client has not written recently. Otherwise falls
+    back to the primary.
+    """
+    use_replica = (
+        ReplicaSessionLocal is not None
+        and not reads_pinned_to_primary(request)
+        and replica_monitor.is_available()
+    )
+    db = ReplicaSessionLocal() if use_replica else SessionLocal()
+    db.info["replica"] = use_replica
+    try:
+        yield db
+    except OperationalError:
+        if use_replica:
+            replica_monitor.mark_unavailable()
+        raise
+    finally:
+        db.close()
+
+
+def read_is_cacheable(db: Session) -> bool:
+    """
+    Return True if responses read through `db` may be stored in the response cache.
+
+    Reads from the primary always may. Reads from the replica only may while
+    its last measured lag is below the read-your-writes window: a body missing
+    a write could otherwise be cached after that write invalidated its tags,
+    and outlive the window that keeps the writer away from stale reads.
+    """
+    if not db.info.get("replica"):
+        return True
+    lag = replica_monitor.lag_seconds
+    return lag is not None and lag < READ_YOUR_WRITES_SECONDS
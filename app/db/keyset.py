@@ -0,0 +1,32 @@
+"""
+Keyset pagination: pages continue after the last key seen instead of at an offset.
+
+Each page is a range scan starting at the cursor, so page 1000 costs the same
+as page 1, and rows inserted meanwhile never shift or repeat results.
+"""
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy.orm import Query
+
+
+def keyset_page(query: Query, key_column: Any, after: Optional[Any], limit: int) -> Tuple[List[Any], Optional[Any]]:
+    """
+    Fetch one page of `query` ordered by a unique key.
+
+    Args:
+        query: Filtered query without ordering or limit
+        key_column: Unique, indexed column the pages are ordered by
+        after: Key of the last row of the previous page, or None for the first page
+        limit: Maximum number of rows in the page
+
+    Returns:
+        The rows of the page and the cursor of the next page, or None on the last page
+    """
+    if after is not None:
+        query = query.filter(key_column > after)
+    # One extra row tells whether another page follows
+    rows = query.order_by(key_column).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, getattr(rows[-1], key_column.key)
@@ -0,0 +1,276 @@
+"""
+Packed storage of energy generation readings: one row per panel-day.
+
+A row of `energy_generation` costs a tuple header, four numerics and
+entries in three indexes for every reading. Once a UTC day is older than
+ENERGY_PACK_AFTER_DAYS, its readings are moved into a single
+`energy_generation_days` row whose `readings` column holds every column
+encoded with app.core.codecs:
+
+    generation_id, timestamp, created_at   delta-encoded
+    energy_generated_kwh                   scaled by 10**4
+    voltage, current, efficiency_percentage scaled by 10**2
+
+That is typically 10-20 bytes per reading and one index entry per
+panel-day. Packed readings are decoded on the fly by the list endpoint.
+Each row also keeps the lowest and highest generation_id it holds, so
+`find_packed` reads a reading by id from the few days whose range covers
+it; packed readings are history and cannot be updated or deleted.
+
+Packing is enabled with ENERGY_PACKED_STORAGE=true. Once days are packed,
+keep it enabled, or the list endpoint stops returning them.
+"""
+import heapq
+import itertools
+import os
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import BigInteger, func, literal, or_
+from sqlalchemy.orm import Session
+
+from app.core.codecs import (
+    datetimes_to_micros, decode_deltas, decode_scaled, encode_deltas, encode_scaled, micros_to_datetimes,
+)
+from app.db.writes import delete_many
+from app.models.models import EnergyGeneration, EnergyGenerationDay, PanelOwnership, SolarPanel
+from app.schemas.schemas import MAX_BULK_ITEMS
+
+load_dotenv()
+
+ENERGY_PACKED_STORAGE = os.getenv("ENERGY_PACKED_STORAGE", "false").lower() == "true"
+ENERGY_PACK_AFTER_DAYS = int(os.getenv("ENERGY_PACK_AFTER_DAYS", "2"))
+
+# One reading, with the attributes of EnergyGenerationResponse
+GenerationReading = namedtuple(
+    "GenerationReading",
+    ["generation_id", "panel_id", "timestamp", "energy_generated_kwh",
+     "voltage", "current", "efficiency_percentage", "created_at"],
+)
+READING_FIELDS = GenerationReading._fields
+
+# Decimal places of the packed numeric columns, as in the EnergyGeneration model
+SCALED_COLUMNS = (
+    ("energy_generated_kwh", 4),
+    ("voltage", 2),
+    ("current", 2),
+    ("efficiency_percentage", 2),
+)
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Make `value` timezone-aware; naive datetimes are taken as UTC, as in the API."""
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def reading_order(reading) -> tuple:
+    """Sort key of readings across storage tiers: (timestamp, generation_id)."""
+    return as_utc(reading.timestamp), reading.generation_id
+
+
+def pack_readings(readings: Sequence[GenerationReading]) -> bytes:
+    """Encode readings, sorted by `reading_order`, into one `readings` value."""
+    return b"".join([
+        encode_deltas([reading.generation_id for reading in readings]),
+        encode_deltas(datetimes_to_micros([reading.timestamp for reading in readings])),
+        encode_deltas(datetimes_to_micros([reading.created_at for reading in readings])),
+        *(encode_scaled([getattr(reading, name) for reading in readings], places) for name, places in SCALED_COLUMNS),
+    ])
+
+
+def unpack_readings(day: EnergyGenerationDay) -> List[GenerationReading]:
+    """Decode the readings of a packed panel-day, in `reading_order`."""
+    data, count = memoryview(day.readings), day.reading_count
+    generation_ids, offset = decode_deltas(data, 0, count)
+    timestamps, offset = decode_deltas(data, offset, count)
+    created_at, offset = decode_deltas(data, offset, count)
+    scaled = []
+    for name, places in SCALED_COLUMNS:
+        values, offset = decode_scaled(data, offset, count, places)
+        scaled.append(values)
+    kwh, voltage, current, efficiency = scaled
+    return [
+        GenerationReading(*row)
+        for row in zip(
+            generation_ids.tolist(), itertools.repeat(day.panel_id), micros_to_datetimes(timestamps),
+            kwh, voltage, current, efficiency, micros_to_datetimes(created_at),
+        )
+    ]
+
+
+def to_reading(row) -> GenerationReading:
+    return GenerationReading(*(getattr(row, name) for name in READING_FIELDS))
+
+
+def pack_cutoff(now: Optional[datetime] = None) -> date:
+    """First UTC day that is kept as rows; every day before it is packed."""
+    return ((now or datetime.now(timezone.utc)) - timedelta(days=ENERGY_PACK_AFTER_DAYS)).date()
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def pack_energy_generation(
+    db: Session,
+    cutoff: Optional[date] = None,
+    progress: Optional[Callable[[int, date, int], None]] = None,
+) -> Tuple[int, int]:
+    """
+    Move the readings of every panel-day before `cutoff` into packed rows.
+
+    Readings arriving later for a packed day are merged into its row by the
+    next run. Readings without a panel are left in the table.
+
+    Args:
+        db: Database session; every panel-day is committed on its own
+        cutoff: First UTC day to keep as rows; defaults to `pack_cutoff()`
+        progress: Called after each panel-day with (panel id, day, rows packed)
+
+    Returns:
+        Number of panel-days and readings packed
+    """
+    cutoff = _day_start(cutoff or pack_cutoff())
+    panel_days, packed = 0, 0
+    panel_ids = [panel_id for (panel_id,) in db.query(SolarPanel.panel_id).order_by(SolarPanel.panel_id)]
+    db.rollback()
+
+    for panel_id in panel_ids:
+        while True:
+            # Uses ix_energy_generation_panel_timestamp
+            oldest = (
+                db.query(func.min(EnergyGeneration.timestamp))
+                .filter(EnergyGeneration.panel_id == panel_id, EnergyGeneration.timestamp < cutoff)
+                .scalar()
+            )
+            if oldest is None:
+                break
+            day = as_utc(oldest).astimezone(timezone.utc).date()
+            rows = (
+                db.query(EnergyGeneration)
+                .filter(
+                    EnergyGeneration.panel_id == panel_id,
+                    EnergyGeneration.timestamp >= _day_start(day),
+                    EnergyGeneration.timestamp < _day_start(day + timedelta(days=1)),
+                )
+                .all()
+            )
+
+            readings = {row.generation_id: to_reading(row) for row in rows}
+            packed_day = (
+                db.query(EnergyGenerationDay)
+                .filter(EnergyGenerationDay.panel_id == panel_id, EnergyGenerationDay.day == day)
+                .with_for_update()
+                .first()
+            )
+            if packed_day is None:
+                packed_day = EnergyGenerationDay(panel_id=panel_id, day=day)
+                db.add(packed_day)
+            else:
+                for reading in unpack_readings(packed_day):
+                    readings.setdefault(reading.generation_id, reading)
+            ordered = sorted(readings.values(), key=reading_order)
+            packed_day.reading_count = len(ordered)
+            packed_day.readings = pack_readings(ordered)
+            packed_day.first_generation_id = min(readings)
+            packed_day.last_generation_id = max(readings)
+
+            ids = [row.generation_id for row in rows]
+            for chunk in range(0, len(ids), MAX_BULK_ITEMS):
+                delete_many(db, EnergyGeneration, ids[chunk:chunk + MAX_BULK_ITEMS])
+            db.commit()
+            db.expunge_all()
+
+            panel_days += 1
+            packed += len(rows)
+            if progress is not None:
+                progress(panel_id, day, len(rows))
+
+    return panel_days, packed
+
+
+def _customer_days(db: Session, customer_id: int, start: Optional[datetime], end: Optional[datetime]):
+    owned = db.query(PanelOwnership.panel_id).filter(PanelOwnership.customer_id == customer_id)
+    query = db.query(EnergyGenerationDay).filter(EnergyGenerationDay.panel_id.in_(owned.scalar_subquery()))
+    if start is not None:
+        query = query.filter(EnergyGenerationDay.day >= start.astimezone(timezone.utc).date())
+    if end is not None:
+        query = query.filter(EnergyGenerationDay.day <= end.astimezone(timezone.utc).date())
+    return query
+
+
+def _in_range(reading: GenerationReading, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    timestamp = as_utc(reading.timestamp)
+    return (start is None or timestamp >= start) and (end is None or timestamp < end)
+
+
+def iter_packed(
+    db: Session,
+    customer_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[GenerationReading]:
+    """Stream the packed readings in [start, end) of the panels of `customer_id`, in `reading_order`."""
+    start, end = as_utc(start), as_utc(end)
+    days = _customer_days(db, customer_id, start, end).order_by(EnergyGenerationDay.day, EnergyGenerationDay.panel_id)
+    # UTC days do not overlap, so only the panels of one day need merging
+    for day, panel_days in itertools.groupby(days.yield_per(100), key=lambda packed_day: packed_day.day):
+        merged = heapq.merge(*(unpack_readings(packed_day) for packed_day in panel_days), key=reading_order)
+        for reading in merged:
+            if _in_range(reading, start, end):
+                yield reading
+
+
+def count_packed(
+    db: Session,
+    customer_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> int:
+    """Count packed readings in [start, end); only the days cut by the range are decoded."""
+    start, end = as_utc(start), as_utc(end)
+    days = _customer_days(db, customer_id, start, end)
+    edges = [moment.astimezone(timezone.utc).date() for moment in (start, end) if moment is not None]
+    inner = days.filter(EnergyGenerationDay.day.notin_(edges)) if edges else days
+    total = inner.with_entities(func.coalesce(func.sum(EnergyGenerationDay.reading_count), 0)).scalar()
+    if edges:
+        for packed_day in days.filter(EnergyGenerationDay.day.in_(edges)):
+            total += sum(1 for reading in unpack_readings(packed_day) if _in_range(reading, start, end))
+    return total
+
+
+def find_packed(db: Session, generation_id: int, panel_ids=None) -> Optional[GenerationReading]:
+    """
+    Read one packed reading by id.
+
+    Only the days whose id range covers `generation_id` are searched, and of
+    those only the id column is decoded until the reading is found.
+
+    Args:
+        db: Database session
+        generation_id: Id of the reading
+        panel_ids: Panel ids, or a subquery of them, to search; None searches every panel
+
+    Returns:
+        The reading, or None when no packed day holds it
+    """
+    first, last = EnergyGenerationDay.first_generation_id, EnergyGenerationDay.last_generation_id
+    query = db.query(EnergyGenerationDay)
+    if panel_ids is not None:
+        query = query.filter(EnergyGenerationDay.panel_id.in_(panel_ids))
+    if db.get_bind().dialect.name == "postgresql":
+        # Uses ix_energy_generation_days_id_range; NULL bounds are unbounded
+        query = query.filter(func.int8range(first, last, "[]").op("@>")(literal(generation_id, BigInteger)))
+    else:
+        query = query.filter(or_(first.is_(None), first <= generation_id), or_(last.is_(None), last >= generation_id))
+    for packed_day in query.yield_per(100):
+        generation_ids, _ = decode_deltas(memoryview(packed_day.readings), 0, packed_day.reading_count)
+        found = np.flatnonzero(generation_ids == generation_id)
+        if found.size:
+            return unpack_readings(packed_day)[int(found[0])]
+    return None
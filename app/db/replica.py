@@ -0,0 +1,147 @@
+"""
+Read-replica health tracking and read-your-writes stickiness.
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.requests import Request
+
+# Name of the cookie that pins a browser client to the primary after a write.
+# Unlike the in-process tracker it survives hops between worker processes.
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+# Replication lag in seconds. An idle replica that has replayed everything it
+# received reports zero lag instead of the age of the last replayed transaction.
+# On a primary both LSN functions return NULL, which also yields zero.
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class ReplicaMonitor:
+    """
+    Decides whether the read replica may serve queries.
+
+    The replica is probed at most once per `check_interval` seconds; between
+    probes the last verdict is reused so the check costs nothing per request.
+    A replica that cannot be reached or lags more than `max_lag_seconds`
+    behind the primary is reported as unavailable. The lag measured by the
+    last successful probe is kept in `lag_seconds`.
+    """
+
+    def __init__(self, engine: Optional[Engine], max_lag_seconds: float, check_interval: float):
+        """
+        Initialize the monitor.
+
+        Args:
+            engine: Engine bound to the replica, or None when no replica is configured
+            max_lag_seconds: Largest tolerated replication lag
+            check_interval: Seconds between two probes of the replica
+        """
+        self.engine = engine
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.lag_seconds: Optional[float] = None
+        self._available = False
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        """Return True if reads may currently be routed to the replica."""
+        if self.engine is None:
+            return False
+
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._available
+
+        with self._lock:
+            # Another thread may have probed while we waited for the lock
+            if time.monotonic() - self._checked_at >= self.check_interval:
+                self._available = self._probe()
+                self._checked_at = time.monotonic()
+        return self._available
+
+    def mark_unavailable(self) -> None:
+        """Stop routing reads to the replica until the next probe is due."""
+        self.lag_seconds = None
+        self._available = False
+        self._checked_at = time.monotonic()
+
+    def _probe(self) -> bool:
+        try:
+            with self.engine.connect() as connection:
+                lag = connection.execute(REPLICA_LAG_QUERY).scalar()
+        except SQLAlchemyError:
+            self.lag_seconds = None
+            return False
+        self.lag_seconds = float(lag) if lag is not None else None
+        return self.lag_seconds is not None and self.lag_seconds <= self.max_lag_seconds
+
+
+class ReadYourWritesTracker:
+    """
+    Remembers which clients wrote recently so their reads stay on the primary.
+
+    Entries live in process memory; expired ones are pruned lazily once the
+    table grows past `max_entries`.
+    """
+
+    def __init__(self, window_seconds: float, max_entries: int = 10000):
+        """
+        Initialize the tracker.
+
+        Args:
+            window_seconds: How long a client is pinned to the primary after a write
+            max_entries: Table size that triggers pruning of expired entries
+        """
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._last_write: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark_write(self, client_key: str) -> None:
+        """Record that `client_key` has just written."""
+        now = time.monotonic()
+        with self._lock:
+            self._last_write[client_key] = now
+            if len(self._last_write) > self.max_entries:
+                cutoff = now - self.window_seconds
+                self._last_write = {
+                    key: written_at
+                    for key, written_at in self._last_write.items()
+                    if written_at >= cutoff
+                }
+
+    def is_sticky(self, client_key: str) -> bool:
+        """Return True if `client_key` wrote within the stickiness window."""
+        written_at = self._last_write.get(client_key)
+        return written_at is not None and time.monotonic() - written_at < self.window_seconds
+
+
+def request_client_key(request: Request) -> str:
+    """
+    Derive a stable, non-reversible key identifying the client of a request.
+
+    The credential presented by the client is preferred so that all requests
+    of one user share a key; anonymous requests fall back to the peer address.
+
+    Args:
+        request: The incoming request
+
+    Returns:
+        Hex digest identifying the client
+    """
+    credential = request.headers.get("Authorization") or request.headers.get("X-API-Key")
+    if not credential:
+        credential = request.client.host if request.client else ""
+    return hashlib.sha256(credential.encode()).hexdigest()
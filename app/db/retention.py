@@ -0,0 +1,276 @@
+"""
+Retention policies and batched purging of expired rows.
+
+Rows are deleted in short keyset-ordered batches, each in its own
+transaction: a batch deletes the next `batch_size` expired rows after the
+last primary key seen. Locks are held for one batch only, WAL is written at
+a bounded rate, and no batch rescans the range already purged. A batch
+that times out waiting for row locks is retried a few times, then left for
+the next run.
+
+With ARCHIVE_BEFORE_PURGE (the default), energy readings are only purged
+before the archive's high-water mark (see app.db.archive), and only if
+they were created before the last archive run: readings inserted late for
+an archived month wait for the next run instead of being deleted
+unarchived.
+"""
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional, Type
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate
+from app.core.counting import estimate_count
+from app.db.archive import archive_marks
+from app.db.base import Base
+from app.db.writes import primary_key_column
+from app.models.models import EnergyGeneration, EnergyGenerationDay, IdempotencyKey, Notification
+
+load_dotenv()
+
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+RETENTION_PAUSE_SECONDS = float(os.getenv("RETENTION_PAUSE_SECONDS", "0.2"))
+# A batch that cannot get its locks quickly fails instead of queueing behind other writers
+RETENTION_LOCK_TIMEOUT = os.getenv("RETENTION_LOCK_TIMEOUT", "2s")
+# Attempts of a batch that timed out on locks before its rows are skipped
+RETENTION_LOCK_RETRIES = int(os.getenv("RETENTION_LOCK_RETRIES", "3"))
+ARCHIVE_BEFORE_PURGE = os.getenv("ARCHIVE_BEFORE_PURGE", "true").lower() == "true"
+
+# SQLSTATE lock_not_available, raised when lock_timeout expires
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def archived_before() -> Optional[datetime]:
+    """Time before which every energy reading was archived; None when nothing was."""
+    return archive_marks().get("high_water_mark")
+
+
+def archive_run_started() -> Optional[datetime]:
+    """Creation time before which readings older than `archived_before` were archived; None when unknown."""
+    return archive_marks().get("archived_created_before")
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Rows of `model` whose `age_column` is older than `retain_days` are purged.
+
+    `purged_before`, when set, returns the latest cutoff the purge may use,
+    or None when no row may be purged yet. `created_before`, when set,
+    likewise bounds `created_column`: newer rows are kept whatever their age.
+    """
+    name: str
+    model: Type[Base]
+    age_column: Any
+    retain_days: int
+    purged_before: Optional[Callable[[], Optional[datetime]]] = None
+    created_column: Any = None
+    created_before: Optional[Callable[[], Optional[datetime]]] = None
+
+    def cutoff(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=self.retain_days)
+        if self.purged_before is None:
+            return cutoff
+        bound = self.purged_before()
+        return min(cutoff, bound) if bound is not None else None
+
+    def expired(self, cutoff: Optional[datetime]) -> Optional[list]:
+        """Criteria of the rows purged at `cutoff`; None when no row may be purged yet."""
+        if cutoff is None:
+            return None
+        criteria = [self.age_column < cutoff]
+        if self.created_before is not None:
+            bound = self.created_before()
+            if bound is None:
+                return None
+            criteria.append(self.created_column < bound)
+        return criteria
+
+
+# Energy readings are only purged once archived, unless archiving is not used
+energy_purged_before = archived_before if ARCHIVE_BEFORE_PURGE else None
+energy_created_before = archive_run_started if ARCHIVE_BEFORE_PURGE else None
+
+
+RETENTION_POLICIES = {
+    policy.name: policy
+    for policy in (
+        RetentionPolicy(
+            "notifications", Notification, Notification.created_at,
+            int(os.getenv("RETENTION_NOTIFICATIONS_DAYS", "180")),
+        ),
+        RetentionPolicy(
+            "energy_generation", EnergyGeneration, EnergyGeneration.timestamp,
+            int(os.getenv("RETENTION_ENERGY_GENERATION_DAYS", "730")), energy_purged_before,
+            EnergyGeneration.created_at, energy_created_before,
+        ),
+        # Packed readings (see app.db.packed) follow the same retention period
+        RetentionPolicy(
+            "energy_generation_days", EnergyGenerationDay, EnergyGenerationDay.day,
+            int(os.getenv("RETENTION_ENERGY_GENERATION_DAYS", "730")), energy_purged_before,
+            EnergyGenerationDay.created_at, energy_created_before,
+        ),
+        # Keep longer than IDEMPOTENCY_KEY_TTL_SECONDS; expired keys are reclaimed anyway
+        RetentionPolicy(
+            "idempotency_keys", IdempotencyKey, IdempotencyKey.created_at,
+            int(os.getenv("RETENTION_IDEMPOTENCY_KEYS_DAYS", "2")),
+        ),
+    )
+}
+
+
+@dataclass
+class PurgeReport:
+    """Outcome of a purge or of its dry run; `cutoff` is None when the policy allowed no purge."""
+    policy: str
+    cutoff: Optional[datetime]
+    rows: int
+    bytes_estimate: int
+    batches: int
+    seconds: float = 0.0
+    dry_run: bool = False
+    skipped_rows: int = 0
+
+
+def _is_lock_timeout(exc: OperationalError) -> bool:
+    return getattr(exc.orig, "pgcode", None) == LOCK_NOT_AVAILABLE
+
+
+def _bytes_per_row(db: Session, table: str) -> float:
+    """Average on-disk size of a row including its indexes, from PostgreSQL statistics."""
+    if db.get_bind().dialect.name != "postgresql":
+        return 0.0
+    size, reltuples = db.execute(
+        text("SELECT pg_total_relation_size(c.oid), c.reltuples FROM pg_class c WHERE c.oid = to_regclass(:table)"),
+        {"table": table},
+    ).one()
+    return size / reltuples if reltuples and reltuples > 0 else 0.0
+
+
+def estimate_purge(db: Session, policy: RetentionPolicy, batch_size: int = RETENTION_BATCH_SIZE) -> PurgeReport:
+    """
+    Estimate what `purge` would delete, from PostgreSQL planner statistics when available.
+
+    Args:
+        db: Database session
+        policy: Retention policy to evaluate
+        batch_size: Rows per batch the purge would use
+
+    Returns:
+        Report with the estimated rows, reclaimed bytes and number of batches
+    """
+    cutoff = policy.cutoff()
+    expired = policy.expired(cutoff)
+    if expired is None:
+        return PurgeReport(policy=policy.name, cutoff=None, rows=0, bytes_estimate=0, batches=0, dry_run=True)
+    query = db.query(policy.model).filter(*expired)
+    rows = estimate_count(db, query) if db.get_bind().dialect.name == "postgresql" else query.count()
+    per_row = _bytes_per_row(db, policy.model.__tablename__)
+    return PurgeReport(
+        policy=policy.name,
+        cutoff=cutoff,
+        rows=rows,
+        bytes_estimate=int(rows * per_row),
+        batches=-(-rows // batch_size),
+        dry_run=True,
+    )
+
+
+def purge(
+    db: Session,
+    policy: RetentionPolicy,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause_seconds: float = RETENTION_PAUSE_SECONDS,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> PurgeReport:
+    """
+    Delete the rows expired under `policy` in keyset-ordered batches.
+
+    A batch that hits the lock timeout is rolled back and retried up to
+    RETENTION_LOCK_RETRIES times; its rows are then skipped until the next run.
+
+    Args:
+        db: Database session; every batch is committed on its own
+        policy: Retention policy to apply
+        batch_size: Maximum rows deleted per batch
+        pause_seconds: Sleep between batches, to leave I/O and WAL bandwidth to other work
+        progress: Called after each batch with (rows in batch, rows deleted so far)
+
+    Returns:
+        Report with the rows deleted and skipped, and the estimated bytes reclaimed
+    """
+    cutoff = policy.cutoff()
+    expired = policy.expired(cutoff)
+    if expired is None:
+        return PurgeReport(policy=policy.name, cutoff=None, rows=0, bytes_estimate=0, batches=0)
+    pk = primary_key_column(policy.model)
+    per_row = _bytes_per_row(db, policy.model.__tablename__)
+    postgres = db.get_bind().dialect.name == "postgresql"
+    started = time.monotonic()
+    last_key, deleted, skipped, batches, attempts = None, 0, 0, 0, 0
+
+    while True:
+        batch = select(pk).where(*expired).order_by(pk).limit(batch_size)
+        if last_key is not None:
+            batch = batch.where(pk > last_key)
+        try:
+            if postgres:
+                db.execute(text(f"SET LOCAL lock_timeout = '{RETENTION_LOCK_TIMEOUT}'"))
+            keys = db.execute(
+                delete(policy.model)
+                .where(pk.in_(batch.scalar_subquery()))
+                .returning(pk)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            db.commit()
+        except OperationalError as exc:
+            db.rollback()
+            if not _is_lock_timeout(exc):
+                raise
+            attempts += 1
+            if attempts <= RETENTION_LOCK_RETRIES:
+                time.sleep(pause_seconds * attempts)
+                continue
+            # Plain reads take no row locks; step over the contended batch
+            keys = db.execute(batch).scalars().all()
+            db.rollback()
+            attempts = 0
+            if not keys:
+                break
+            last_key = max(keys)
+            skipped += len(keys)
+            if len(keys) < batch_size:
+                break
+            continue
+        attempts = 0
+        if not keys:
+            break
+
+        last_key = max(keys)
+        deleted += len(keys)
+        batches += 1
+        if progress is not None:
+            progress(len(keys), deleted)
+        if len(keys) < batch_size:
+            break
+        time.sleep(pause_seconds)
+
+    if deleted:
+        # Cached lists and counts of the table (see add_crud_routes)
+        invalidate([f"{policy.model.__tablename__}:list"])
+    return PurgeReport(
+        policy=policy.name,
+        cutoff=cutoff,
+        rows=deleted,
+        bytes_estimate=int(deleted * per_row),
+        batches=batches,
+        seconds=time.monotonic() - started,
+        skipped_rows=skipped,
+    )
+
@@ -0,0 +1,123 @@
+"""
+Per-table write counters backing the validators of list responses.
+
+Every transaction that writes a table increments the table's version in
+`table_versions`. A list ETag combines the version with the request, so it
+is read with one index lookup instead of aggregating the filtered rows.
+
+Writes are tracked by session events rather than by the code that makes
+them, so routes, scripts and helpers all count: statements executed
+through the session and flushed ORM changes note their table, and the
+versions are bumped in `before_commit`, the last point of the transaction.
+Writes hidden inside a SELECT (data-modifying CTEs) are noted by their
+caller with `note_written`.
+
+Each table's version is spread over TABLE_VERSION_SLOTS rows and a bump
+increments one at random, so concurrent writers rarely wait on the same
+row lock, and only for the instant between the bump and their commit. The
+version is the sum of the slots. A sequence would not need the rows at
+all, but `nextval` is not transactional: readers would see a version
+before the write it counts is visible.
+
+Read the version before the rows: a write committing in between then yields
+an ETag older than the body, and the client merely gets a 200 again on its
+next request, never a 304 for data it has not seen.
+"""
+import os
+import random
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event, func, inspect, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+load_dotenv()
+
+TABLE_VERSION_SLOTS = int(os.getenv("TABLE_VERSION_SLOTS", "16"))
+
+VERSIONS_TABLE = "table_versions"
+# Session.info key of the tables written in the current transaction
+_WRITTEN = "written_tables"
+
+
+def bump_table_version(db: Session, table: str) -> None:
+    """Increment the version of `table`; call in the writing transaction, before it commits."""
+    # Imported here: app.db.base imports this module before the models exist
+    from app.models.models import TableVersion
+
+    now = datetime.now(timezone.utc)
+    slot = random.randrange(TABLE_VERSION_SLOTS)
+    bumped = db.execute(
+        update(TableVersion)
+        .where(TableVersion.table_name == table, TableVersion.slot == slot)
+        .values(version=TableVersion.version + 1, updated_at=now)
+    ).rowcount
+    if bumped:
+        return
+    try:
+        # First write to this slot; a concurrent first write wins the insert
+        with db.begin_nested():
+            db.execute(insert(TableVersion).values(table_name=table, slot=slot, version=1, updated_at=now))
+    except IntegrityError:
+        bump_table_version(db, table)
+
+
+def table_version(db: Session, table: str) -> Tuple[int, Optional[datetime]]:
+    """
+    Current version of `table` and the time of its last write.
+
+    Args:
+        db: Database session
+        table: Name of the table
+
+    Returns:
+        The version, 0 for a table never written since versions were
+        tracked, and the time of the last bump or None
+    """
+    from app.models.models import TableVersion
+
+    version, updated_at = db.execute(
+        select(func.coalesce(func.sum(TableVersion.version), 0), func.max(TableVersion.updated_at))
+        .where(TableVersion.table_name == table)
+    ).one()
+    return int(version), updated_at
+
+
+def note_written(db: Session, *tables: str) -> None:
+    """Count writes to `tables` the session events cannot see, e.g. DML inside a CTE."""
+    db.info.setdefault(_WRITTEN, set()).update(table for table in tables if table != VERSIONS_TABLE)
+
+
+def _note_statement(execute_state) -> None:
+    if execute_state.is_insert or execute_state.is_update or execute_state.is_delete:
+        note_written(execute_state.session, execute_state.statement.table.name)
+
+
+def _note_flush(session: Session, flush_context) -> None:
+    changed = [*session.new, *session.deleted, *(obj for obj in session.dirty if session.is_modified(obj))]
+    note_written(session, *{inspect(obj).mapper.local_table.name for obj in changed})
+
+
+def _bump_written(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    # Pending ORM changes are flushed after this hook; count them now
+    session.flush()
+    # Sorted, so concurrent writers of several tables lock slots in the same order
+    for table in sorted(session.info.pop(_WRITTEN, ())):
+        bump_table_version(session, table)
+
+
+def _forget_written(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_WRITTEN, None)
+
+
+def track_table_writes(session_factory: sessionmaker) -> None:
+    """Bump the versions of the tables each transaction of `session_factory` writes, as it commits."""
+    event.listen(session_factory, "do_orm_execute", _note_statement)
+    event.listen(session_factory, "after_flush", _note_flush)
+    event.listen(session_factory, "before_commit", _bump_written)
+    event.listen(session_factory, "after_transaction_end", _forget_written)
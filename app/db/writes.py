@@ -0,0 +1,177 @@
+"""
+Single-statement write helpers built on INSERT/UPDATE ... RETURNING.
+
+The returned ORM objects carry every column, server defaults included, so
+handlers need neither a SELECT before an UPDATE nor a refresh after COMMIT.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Type, TypeVar
+
+from sqlalchemy import delete, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+
+ModelT = TypeVar("ModelT", bound=Base)
+
+
+def primary_key_column(model: Type[Base]):
+    """Return the single primary key column of `model`."""
+    return inspect(model).primary_key[0]
+
+
+def insert_returning(db: Session, model: Type[ModelT], values: Dict[str, Any]) -> ModelT:
+    """
+    Insert one row and return it as a fully loaded ORM object.
+
+    Args:
+        db: Database session
+        model: Mapped class to insert into
+        values: Column values for the new row
+
+    Returns:
+        The inserted row, including server-generated columns
+    """
+    statement = insert(model).values(**values).returning(model)
+    return db.execute(statement).scalar_one()
+
+
+def update_returning(
+    db: Session,
+    model: Type[ModelT],
+    pk_value: Any,
+    values: Dict[str, Any],
+) -> Optional[ModelT]:
+    """
+    Update one row by primary key and return its new state.
+
+    Columns with an `onupdate` default (such as `updated_at`) are refreshed
+    by the same statement.
+
+    Args:
+        db: Database session
+        model: Mapped class to update
+        pk_value: Primary key of the row
+        values: Column values to change
+
+    Returns:
+        The updated row, or None if no row has that primary key
+    """
+    if not values:
+        return db.get(model, pk_value)
+
+    statement = (
+        update(model)
+        .where(primary_key_column(model) == pk_value)
+        .values(**values)
+        .returning(model)
+    )
+    return db.execute(statement).scalar_one_or_none()
+
+
+def delete_by_pk(db: Session, model: Type[Base], pk_value: Any) -> bool:
+    """
+    Delete one row by primary key without loading it first.
+
+    Args:
+        db: Database session
+        model: Mapped class to delete from
+        pk_value: Primary key of the row
+
+    Returns:
+        True if a row was deleted, False if none matched
+    """
+    return delete_many(db, model, [pk_value]) > 0
+
+
+def insert_many_returning(db: Session, model: Type[ModelT], rows: Sequence[Dict[str, Any]]) -> List[ModelT]:
+    """
+    Insert several rows with one multi-row INSERT ... RETURNING.
+
+    All rows must provide the same keys. Callers are responsible for keeping
+    `len(rows) * len(columns)` below the 65535 bind parameter limit of PostgreSQL.
+
+    Args:
+        db: Database session
+        model: Mapped class to insert into
+        rows: Column values, one mapping per new row
+
+    Returns:
+        The inserted rows
+    """
+    if not rows:
+        return []
+    statement = insert(model).values(list(rows)).returning(model)
+    return list(db.execute(statement).scalars())
+
+
+def update_many_returning(
+    db: Session,
+    model: Type[ModelT],
+    pk_values: Sequence[Any],
+    values: Dict[str, Any],
+) -> List[ModelT]:
+    """
+    Apply the same changes to several rows with one UPDATE ... RETURNING.
+
+    Args:
+        db: Database session
+        model: Mapped class to update
+        pk_values: Primary keys of the rows to change
+        values: Column values to change
+
+    Returns:
+        The updated rows; ids that matched no row are absent
+    """
+    pk = primary_key_column(model)
+    if not values:
+        return list(db.execute(select(model).where(pk.in_(pk_values))).scalars())
+
+    statement = (
+        update(model)
+        .where(pk.in_(pk_values))
+        .values(**values)
+        .returning(model)
+        .execution_options(synchronize_session=False)
+    )
+    return list(db.execute(statement).scalars())
+
+
+def delete_many(db: Session, model: Type[Base], pk_values: Sequence[Any]) -> int:
+    """
+    Delete several rows by primary key with one DELETE statement.
+
+    Args:
+        db: Database session
+        model: Mapped class to delete from
+        pk_values: Primary keys of the rows to delete
+
+    Returns:
+        Number of rows deleted
+    """
+    statement = (
+        delete(model)
+        .where(primary_key_column(model).in_(pk_values))
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(statement).rowcount
+
+
+def delete_returning(db: Session, model: Type[ModelT], pk_value: Any) -> Optional[ModelT]:
+    """
+    Delete one row by primary key and return its final state.
+
+    Args:
+        db: Database session
+        model: Mapped class to delete from
+        pk_value: Primary key of the row
+
+    Returns:
+        The deleted row, or None if no row has that primary key
+    """
+    statement = (
+        delete(model)
+        .where(primary_key_column(model) == pk_value)
+        .returning(model)
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(statement).scalar_one_or_none()
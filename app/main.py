@@ -1,7 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import health, auth, user, farms, customers, energy
-from app.core.middleware import DevAPIKeyMiddleware
+from app.core.middleware import DevAPIKeyMiddleware, ReadYourWritesMiddleware, CompressionMiddleware, ServerTimingMiddleware
+from app.core.timing import SERVER_TIMING, enable_server_timing
 
 app = FastAPI(title="Cloud Solar Backend")
 
@@ -10,14 +11,26 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # Update with your frontend URL
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],  # Allow all headers including Authorization
+    expose_headers=["X-Total-Count", "Server-Timing"],
 )
 
 # Add Dev API Key middleware for development
 # This allows bypassing authentication with X-API-Key: dev_api_key_123 header
 app.add_middleware(DevAPIKeyMiddleware, dev_user_id=1)
 
+# Keep clients on the primary database for a short window after they write
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Negotiated gzip/zstd/brotli compression for large and streaming responses
+app.add_middleware(CompressionMiddleware)
+
+# Per-request auth/SQL/serialization timings, outermost so the total covers every middleware
+if SERVER_TIMING:
+    enable_server_timing()
+    app.add_middleware(ServerTimingMiddleware)
+
 # Include routers
 app.include_router(health.router)
 app.include_router(auth.router)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Numeric, Date, Float, Index, CheckConstraint
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Numeric, Date, Float, Index, CheckConstraint, Computed, LargeBinary
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.sql import func, text
 from app.db.base import Base
 
 
@@ -59,6 +60,10 @@ class SolarFarm(Base):
     __table_args__ = (
         CheckConstraint('land_lease_start_date IS NULL OR land_lease_end_date IS NULL OR land_lease_start_date <= land_lease_end_date',
                        name='check_lease_dates'),
+        # Farm search: status with lease end range, or lease end range alone
+        Index('ix_solar_farms_status_lease_end', 'operational_status', 'land_lease_end_date'),
+        Index('ix_solar_farms_lease_end', 'land_lease_end_date',
+              postgresql_where=text('land_lease_end_date IS NOT NULL')),
     )
 
 
@@ -66,7 +71,7 @@ class SolarPanel(Base):
     __tablename__ = "solar_panels"
 
     panel_id = Column(Integer, primary_key=True, index=True)
-    farm_id = Column(Integer, ForeignKey("solar_farms.farm_id"), nullable=True)
+    farm_id = Column(Integer, ForeignKey("solar_farms.farm_id"), nullable=True, index=True)
     panel_serial_number = Column(String(100), unique=True, nullable=True)
     manufacturer = Column(String(100), nullable=True)
     model = Column(String(100), nullable=True)
@@ -82,15 +87,29 @@ class SolarPanel(Base):
     farm = relationship("SolarFarm", back_populates="panels")
     ownerships = relationship("PanelOwnership", back_populates="panel")
     energy_generations = relationship("EnergyGeneration", back_populates="panel")
+    generation_days = relationship("EnergyGenerationDay", back_populates="panel")
     maintenance_records = relationship("MaintenanceRecord", back_populates="panel")
 
+    # Panel search: equality filters end in panel_id so keyset pages are read
+    # in index order; date ranges only ever match non-null dates
+    __table_args__ = (
+        Index('ix_solar_panels_status_panel_id', 'panel_status', 'panel_id'),
+        Index('ix_solar_panels_manufacturer_model_panel_id', 'manufacturer', 'model', 'panel_id'),
+        Index('ix_solar_panels_manufacturer_warranty', 'manufacturer', 'warranty_expiry_date',
+              postgresql_where=text('warranty_expiry_date IS NOT NULL')),
+        Index('ix_solar_panels_warranty_expiry', 'warranty_expiry_date',
+              postgresql_where=text('warranty_expiry_date IS NOT NULL')),
+        Index('ix_solar_panels_installation_date', 'installation_date',
+              postgresql_where=text('installation_date IS NOT NULL')),
+    )
+
 
 class PanelOwnership(Base):
     __tablename__ = "panel_ownership"
 
     ownership_id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    panel_id = Column(Integer, ForeignKey("solar_panels.panel_id"), nullable=True)
+    customer_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    panel_id = Column(Integer, ForeignKey("solar_panels.panel_id"), nullable=True, index=True)
     ownership_type = Column(String(20), nullable=True)
     ownership_status = Column(String(20), nullable=True)
     purchase_date = Column(Date, nullable=True)
@@ -109,6 +128,9 @@ class PanelOwnership(Base):
     __table_args__ = (
         CheckConstraint('lease_start_date IS NULL OR lease_end_date IS NULL OR lease_start_date <= lease_end_date',
                        name='check_ownership_lease_dates'),
+        # Range scans of upcoming lease ends (see app/core/expiry.py)
+        Index('ix_panel_ownership_lease_end', 'lease_end_date',
+              postgresql_where=text('lease_end_date IS NOT NULL')),
     )
 
 
@@ -133,6 +155,30 @@ class EnergyGeneration(Base):
     )
 
 
+class EnergyGenerationDay(Base):
+    __tablename__ = "energy_generation_days"
+    # One panel-day of energy generation readings packed into one row (see app/db/packed.py)
+
+    day_id = Column(Integer, primary_key=True)
+    panel_id = Column(Integer, ForeignKey("solar_panels.panel_id"), nullable=False)
+    day = Column(Date, nullable=False)  # UTC day of the readings
+    reading_count = Column(Integer, nullable=False)
+    readings = Column(LargeBinary, nullable=False)
+    # Lowest and highest generation_id in `readings`, so a reading is found by
+    # id without decoding every day; PostgreSQL indexes the range with GiST
+    # (migration 37622cc6a0ce)
+    first_generation_id = Column(BigInteger, nullable=True)
+    last_generation_id = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # Relationships
+    panel = relationship("SolarPanel", back_populates="generation_days")
+
+    __table_args__ = (
+        Index('ix_energy_generation_days_panel_day', 'panel_id', 'day', unique=True),
+    )
+
+
 class CustomerConsumption(Base):
     __tablename__ = "customer_consumption"
     # Monthly energy consumption records for customers for Comparison with energy generated
@@ -173,6 +219,8 @@ class EnergyCredits(Base):
     # Composite index and check constraint
     __table_args__ = (
         Index('ix_energy_credits_customer_billing', 'customer_id', 'billing_period_start'),
+        # Ledger deltas since a snapshot, as index-only scans
+        Index('ix_energy_credits_customer_credit', 'customer_id', 'credit_id', postgresql_include=['net_amount']),
         CheckConstraint('billing_period_start <= billing_period_end',
                        name='check_billing_period_dates'),
     )
@@ -183,6 +231,7 @@ class MaintenanceRecord(Base):
 
     maintenance_id = Column(Integer, primary_key=True, index=True)
     panel_id = Column(Integer, ForeignKey("solar_panels.panel_id"), nullable=True)
+    # Indexed by ix_maintenance_records_farm_scheduled
     farm_id = Column(Integer, ForeignKey("solar_farms.farm_id"), nullable=True)
     maintenance_type = Column(String(50), nullable=True)
     scheduled_date = Column(Date, nullable=True)
@@ -192,6 +241,8 @@ class MaintenanceRecord(Base):
     # status = Column(String(20), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # Full-text search vector, maintained by PostgreSQL; never loaded unless asked for
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('english', coalesce(description, ''))", persisted=True)))
 
     # Relationships
     panel = relationship("SolarPanel", back_populates="maintenance_records")
@@ -201,6 +252,16 @@ class MaintenanceRecord(Base):
     __table_args__ = (
         CheckConstraint('scheduled_date IS NULL OR completed_date IS NULL OR scheduled_date <= completed_date',
                        name='check_maintenance_dates'),
+        Index('ix_maintenance_records_search_vector', 'search_vector', postgresql_using='gin'),
+        # Calendar queries: date ranges per farm or panel, pending and completed work
+        Index('ix_maintenance_records_farm_scheduled', 'farm_id', 'scheduled_date'),
+        Index('ix_maintenance_records_panel_scheduled', 'panel_id', 'scheduled_date'),
+        Index('ix_maintenance_records_scheduled_date', 'scheduled_date',
+              postgresql_where=text('scheduled_date IS NOT NULL')),
+        Index('ix_maintenance_records_pending', 'scheduled_date',
+              postgresql_where=text('completed_date IS NULL')),
+        Index('ix_maintenance_records_completed_date', 'completed_date',
+              postgresql_where=text('completed_date IS NOT NULL')),
     )
 
 
@@ -208,7 +269,7 @@ class Transaction(Base):
     __tablename__ = "transactions"
 
     transaction_id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    customer_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     transaction_type = Column(String(30), nullable=True)
     amount = Column(Numeric(10, 2), nullable=True)
     transaction_date = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -221,18 +282,93 @@ class Transaction(Base):
     # Relationships
     customer = relationship("User", back_populates="transactions")
 
+    __table_args__ = (
+        # Ledger deltas since a snapshot, as index-only scans
+        Index('ix_transactions_customer_transaction', 'customer_id', 'transaction_id', postgresql_include=['amount']),
+        # Statements of a customer's period
+        Index('ix_transactions_customer_date', 'customer_id', 'transaction_date'),
+    )
+
 
 class Notification(Base):
     __tablename__ = "notifications"
 
     notification_id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    customer_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     notification_type = Column(String(50), nullable=True)
     title = Column(String(255), nullable=True)
     message = Column(Text, nullable=True)
     priority = Column(String(20), nullable=True)
     is_read = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Full-text search vector, maintained by PostgreSQL; never loaded unless asked for
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('english', coalesce(message, ''))", persisted=True)))
 
     # Relationships
     customer = relationship("User", back_populates="notifications")
+
+    __table_args__ = (
+        Index('ix_notifications_search_vector', 'search_vector', postgresql_using='gin'),
+        # Unread counts only touch unread rows
+        Index('ix_notifications_customer_unread', 'customer_id', postgresql_where=text('is_read = false')),
+    )
+
+
+class ExpiryScanMark(Base):
+    __tablename__ = "expiry_scan_marks"
+    # Last run of each expiry scan, which looked ahead to `horizon`; runs lock the row
+
+    scan = Column(String(50), primary_key=True)
+    horizon = Column(Date, nullable=False)
+    scanned_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ExpiryNotice(Base):
+    __tablename__ = "expiry_notices"
+    # An expiry that has been notified: a row of the scan's table and its expiry date
+
+    scan = Column(String(50), primary_key=True)
+    row_id = Column(Integer, primary_key=True)
+    expiry_date = Column(Date, primary_key=True)
+    notified_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class LedgerSnapshot(Base):
+    __tablename__ = "ledger_snapshots"
+    # Running totals of a customer's ledger over the rows up to the two marks;
+    # balances add the customer's rows past the marks
+
+    customer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_transaction_id = Column(Integer, nullable=False)
+    last_credit_id = Column(Integer, nullable=False)
+    transactions_total = Column(Numeric(14, 2), nullable=False)
+    credits_total = Column(Numeric(14, 2), nullable=False)
+    taken_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    # Response of a write made with an Idempotency-Key header, replayed to its retries
+
+    idempotency_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    idempotency_key = Column(String(255), nullable=False)
+    fingerprint = Column(String(32), nullable=False)
+    # Set in the transaction that claims the key, so committed rows always have them
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_idempotency_keys_user_key', 'user_id', 'idempotency_key', unique=True),
+    )
+
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+    # One slot of the write counter of a table (see app/db/versions.py)
+
+    table_name = Column(String(63), primary_key=True)
+    slot = Column(Integer, primary_key=True, default=0)
+    version = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -5,8 +5,9 @@ from app.models.models import User
 from app.schemas.auth import SignupRequest, LoginRequest, UserResponse
 from app.core.security import get_password_hash, verify_password, create_access_token
 from app.core.dependencies import get_current_user
+from app.core.timing import TimedRoute
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=TimedRoute)
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
@@ -0,0 +1,12 @@
+"""
+Factory for the standard CRUD endpoints of a model.
+
+Each call registers, on an existing router, the single-row endpoints
+(create, list, read, update, delete) plus admin-only bulk variants that
+each run as one SQL statement:
+
+- POST   {path}/bulk   create many rows (multi-row INSERT ... RETURNING)
+- PATCH  {path}/bulk   apply the same changes to a list of ids (UPDATE ... RETURNING)
+- DELETE {path}/bulk   delete a list of ids (DELETE ... WHERE id IN (...))
+"""
+from app.routers.crud.routes import add_crud_routes, no_filters, no_idempotency_key, no_includes
@@ -0,0 +1,118 @@
+"""
+Response caching of the CRUD endpoints.
+
+Lists carry the `<table>:list` tag, plus `<table>:list:<partition>=<value>`
+or `<table>:list:all` when the model has a cache partition; details carry
+`<table>:<id>`. Writes invalidate the tags of every response showing the
+rows they change.
+
+A read that raced a write can store the rows it saw after the write
+invalidated their tags. So a store checks the table version (see
+app.db.versions) against the one read before the rows, and invalidates
+the tags again if a write committed in between.
+"""
+from typing import Any, List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from app.core.cache import CachedResponse, cache_key, get_cached, invalidate, store_cached
+from app.core.conditional import is_not_modified, not_modified_response
+from app.db.base import read_is_cacheable, reads_pinned_to_primary
+from app.db.versions import table_version
+from app.models.models import User
+
+
+class CrudCache:
+    """Cache keys and tags of one model's CRUD endpoints."""
+
+    def __init__(
+        self,
+        table: str,
+        pk_name: str,
+        ttl: Optional[int],
+        partition: Optional[str] = None,
+        owner_scoped: bool = False,
+    ):
+        self.table = table
+        self.pk_name = pk_name
+        self.ttl = ttl
+        self.partition = partition
+        self.owner_scoped = owner_scoped
+        self.list_tag = f"{table}:list"
+
+    def detail_tag(self, pk_value: Any) -> str:
+        return f"{self.table}:{pk_value}"
+
+    def partition_tag(self, value: Any) -> str:
+        # Falsy values leave the list unfiltered, like `if farm_id:` in the filter
+        return f"{self.list_tag}:{self.partition}={value}" if value else f"{self.list_tag}:all"
+
+    def list_entry_tags(self, request: Request) -> List[str]:
+        """Tags of the cached list response of `request`."""
+        tags = [self.list_tag]
+        if self.partition is not None:
+            try:
+                value = int(request.query_params.get(self.partition) or 0)
+            except ValueError:
+                value = 0
+            tags.append(self.partition_tag(value))
+        return tags
+
+    def row_tags(self, db_item: Any) -> List[str]:
+        """Tags of every cached response that shows `db_item`."""
+        tags = [self.detail_tag(getattr(db_item, self.pk_name))]
+        if self.partition is None:
+            tags.append(self.list_tag)
+        else:
+            tags += [self.partition_tag(None), self.partition_tag(getattr(db_item, self.partition))]
+        return tags
+
+    def ids_tags(self, pk_values: List[Any]) -> List[str]:
+        """Tags of every cached response that may show one of the rows `pk_values`."""
+        return [self.list_tag] + [self.detail_tag(pk_value) for pk_value in pk_values]
+
+    def scope(self, current_user: User) -> str:
+        """Auth scope of the caller; owner-scoped responses are cached per user."""
+        if self.owner_scoped:
+            return f"user:{current_user.id}"
+        return "admin" if current_user.is_admin else "user"
+
+    def key(self, route_name: str, request: Request, current_user: User) -> Optional[str]:
+        """
+        Cache key of a read, or None when the read bypasses the cache.
+
+        A client that just wrote must see its write, not another worker's
+        copy, so clients pinned to the primary bypass the cache.
+        """
+        if not self.ttl or reads_pinned_to_primary(request):
+            return None
+        return cache_key(route_name, request, self.scope(current_user))
+
+    def store(self, db: Session, key: str, entry: CachedResponse, tags: List[str], version: int) -> None:
+        """
+        Store a response read through `db`, unless that session may have read stale rows.
+
+        Args:
+            db: Session the response was read through
+            key: Cache key of the read
+            entry: The response
+            tags: Invalidation tags of the response
+            version: Table version read before the rows
+        """
+        if not read_is_cacheable(db):
+            return
+        store_cached(key, entry, tags, self.ttl)
+        # Checked after storing: a write committing later invalidates the entry itself
+        if table_version(db, self.table)[0] != version:
+            invalidate(tags)
+
+
+def cached_response(request: Request, key: str) -> Optional[Response]:
+    """The cached response of `key` for `request`, a 304 if it matches the client's copy, or None."""
+    cached = get_cached(key)
+    if cached is None:
+        return None
+    if cached.etag is not None and is_not_modified(request, cached.etag, cached.last_modified):
+        return not_modified_response(cached.etag, cached.last_modified)
+    return cached.to_response()
@@ -0,0 +1,69 @@
+"""
+Row selection and rendering of the CRUD list endpoint.
+
+A list response is, depending on the request:
+- `fast=true`: column tuples of every response field, encoded directly
+- `fields=...`: column tuples of the selected fields, see app.core.fieldsets
+- a cacheable list: ORM rows serialized once by the response schema, so the
+  same body can be stored and sent
+- otherwise: ORM rows, serialized by FastAPI's response model
+"""
+from typing import Any, List, Optional, Sequence, Tuple, Type, Union
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.orm import Query, Session
+
+from app.core.fieldsets import select_columns, sparse_response
+from app.core.serialization import fast_json_response, response_fields
+from app.core.timing import timed
+from app.models.models import User
+
+
+def list_query(db: Session, model: Any, owner_column: Any, current_user: User, filters: list) -> Query:
+    """Rows of `model` the caller may list, narrowed by the list filter criteria."""
+    query = db.query(model)
+    if owner_column is not None:
+        query = query.filter(owner_column == current_user.id)
+    for criterion in filters:
+        query = query.filter(criterion)
+    return query
+
+
+class ListRenderer:
+    """Reads one page of a model's list and builds its response."""
+
+    def __init__(self, model: Any, response_schema: Type[BaseModel]):
+        self.model = model
+        self.response_schema = response_schema
+        self.adapter = TypeAdapter(List[response_schema])
+
+    def render(
+        self, query: Query, selected: Optional[Tuple[str, ...]], fast: bool, serialize: bool
+    ) -> Union[Response, List[Any]]:
+        """
+        Read the page selected by `query` and build its response.
+
+        Args:
+            query: The list query, already offset and limited
+            selected: Fields selected by `parse_fields`, or None
+            fast: Encode every response field from column tuples
+            serialize: Serialize ORM rows to a JSON response instead of returning them
+
+        Returns:
+            A JSON response, or the ORM rows for FastAPI to serialize
+        """
+        columns = selected or (response_fields(self.response_schema) if fast else None)
+        if columns:
+            query = query.with_entities(*select_columns(self.model, columns))
+        rows: Sequence[Any] = query.all()
+
+        if fast:
+            return fast_json_response(columns, rows)
+        if selected:
+            return sparse_response(self.response_schema, selected, rows)
+        if serialize:
+            with timed("serialize"):
+                body = self.adapter.dump_json(self.adapter.validate_python(rows, from_attributes=True))
+            return Response(content=body, media_type="application/json")
+        return rows
@@ -0,0 +1,351 @@
+"""
+The `add_crud_routes` factory.
+
+Handlers only wire the steps together; each concern lives in its own module
+of this package: response caching (caching), conditional GET validators
+(validators), list rendering (listing), and write hooks, version bumps,
+invalidation and Idempotency-Key handling (writes).
+"""
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Request, Response, status
+from pydantic import BaseModel, TypeAdapter, create_model
+from sqlalchemy.orm import Session
+
+from app.core.auth_dependencies import get_current_admin_user, get_current_user
+from app.core.cache import CachedResponse
+from app.core.conditional import is_not_modified, not_modified_response, set_validators
+from app.core.counting import COUNT_QUERY, count_rows, set_total_count
+from app.core.idempotency import idempotency_key_header
+from app.core.fieldsets import FIELDS_QUERY, parse_fields
+from app.core.includes import Include, include_query, load_includes, serialize_tree, tree_response
+from app.core.serialization import FAST_QUERY
+from app.core.timing import timed
+from app.db.base import Base, get_db, get_read_db
+from app.db.versions import table_version
+from app.db.writes import (
+    delete_many, delete_returning, insert_many_returning, insert_returning,
+    primary_key_column, update_many_returning, update_returning,
+)
+from app.models.models import User
+from app.routers.crud.caching import CrudCache, cached_response
+from app.routers.crud.listing import ListRenderer, list_query
+from app.routers.crud.validators import item_not_modified, item_validators, list_validators
+from app.routers.crud.writes import IdempotentCreate, WriteEffects
+from app.schemas.schemas import (
+    BulkDeleteRequest, BulkDeleteResponse, BulkIds, MAX_BULK_ITEMS, PaginationParams
+)
+
+
+def no_filters() -> list:
+    """Default list filter dependency: no extra criteria."""
+    return []
+
+
+def no_includes() -> None:
+    """Default include dependency for models without includable relationships."""
+    return None
+
+
+def no_idempotency_key() -> None:
+    """Idempotency key dependency of create endpoints that do not accept one."""
+    return None
+
+
+def add_crud_routes(
+    router: APIRouter,
+    *,
+    path: str,
+    model: Type[Base],
+    create_schema: Type[BaseModel],
+    update_schema: Type[BaseModel],
+    response_schema: Type[BaseModel],
+    name: str,
+    plural: str,
+    label: str,
+    owner_column: Any = None,
+    list_filters: Callable[..., list] = no_filters,
+    cache_ttl: Optional[int] = None,
+    cache_partition: Optional[str] = None,
+    includes: Optional[Dict[str, Include]] = None,
+    on_insert: Optional[Callable[[Session, List[Any]], None]] = None,
+    on_modify: Optional[Callable[[Session, List[Any]], None]] = None,
+    idempotent: bool = False,
+) -> None:
+    """
+    Register CRUD and bulk endpoints for `model` on `router`.
+
+    Routes are registered in an order where the literal `/bulk` paths come
+    before the `/{id}` paths, so custom routes with literal segments must be
+    added to the router before calling this function.
+
+    Args:
+        router: Router to add the endpoints to
+        path: Path of the collection relative to the router prefix, e.g. "/panels"
+        model: Mapped class the endpoints operate on
+        create_schema: Request body schema for create
+        update_schema: Request body schema for update
+        response_schema: Response schema for a single row
+        name: Singular snake_case name used for route names, e.g. "solar_panel"
+        plural: Plural snake_case name used for the list route, e.g. "solar_panels"
+        label: Human readable name used in error messages, e.g. "Solar Panel"
+        owner_column: Column restricting list results to the current user's rows
+        list_filters: Dependency returning extra SQL criteria for the list endpoint
+        cache_ttl: Cache list and detail responses for this many seconds; None disables caching.
+            Clients pinned to the primary after a write bypass the cache, and only bodies
+            read from the primary or from a replica within the stickiness window are stored.
+        cache_partition: Integer list filter (e.g. "farm_id") whose values partition cached
+            lists, so a write only invalidates the unfiltered list and the list of its partition
+        includes: Relationships the list and detail endpoints can embed via `include=`.
+            Responses with includes bypass the cache and carry no validators, since
+            they depend on rows of other tables.
+        on_insert: Called with the session and the inserted rows by the create
+            endpoints, before the transaction commits
+        on_modify: Called with the session and the primary keys of the rows the update
+            and delete endpoints change: before the change, and for updates again after
+            it, so both the old and new values are seen before the transaction commits
+        idempotent: Accept an Idempotency-Key header on the single-row create endpoint,
+            so that retries replay the first response instead of inserting again
+    """
+    pk_column = primary_key_column(model)
+    pk_name = pk_column.key
+    table = model.__tablename__
+    # Models with an updated_at column support conditional GETs: details are
+    # validated by the row's updated_at, lists by the table version
+    version_column = getattr(model, "updated_at", None)
+    not_found = f"{label} not found"
+    item_path = f"{path}/{{{pk_name}}}"
+
+    cache = CrudCache(table, pk_name, cache_ttl, cache_partition, owner_scoped=owner_column is not None)
+    effects = WriteEffects(table, on_insert, on_modify)
+    renderer = ListRenderer(model, response_schema)
+    item_adapter = TypeAdapter(response_schema)
+    include_dependency = include_query(includes) if includes else no_includes
+    idempotency_dependency = idempotency_key_header if idempotent else no_idempotency_key
+
+    bulk_update_schema = create_model(
+        f"{model.__name__}BulkUpdate",
+        __base__=BulkIds,
+        changes=(update_schema, ...),
+    )
+
+    # --- Bulk endpoints ---
+
+    async def bulk_create(
+        items: List[create_schema] = Body(..., min_length=1, max_length=MAX_BULK_ITEMS),
+        db: Session = Depends(get_db),
+        admin_user: User = Depends(get_current_admin_user)
+    ):
+        db_items = insert_many_returning(db, model, [item.model_dump() for item in items])
+        effects.inserted(db, db_items)
+        effects.commit(db, (tag for db_item in db_items for tag in cache.row_tags(db_item)))
+        return db_items
+
+    async def bulk_update(
+        bulk_update: bulk_update_schema,
+        db: Session = Depends(get_db),
+        admin_user: User = Depends(get_current_admin_user)
+    ):
+        effects.modified(db, bulk_update.ids)
+        db_items = update_many_returning(db, model, bulk_update.ids, bulk_update.changes.model_dump(exclude_unset=True))
+        effects.modified(db, bulk_update.ids)
+        effects.commit(db, cache.ids_tags(bulk_update.ids))
+        return db_items
+
+    async def bulk_delete(
+        bulk_delete: BulkDeleteRequest,
+        db: Session = Depends(get_db),
+        admin_user: User = Depends(get_current_admin_user)
+    ):
+        effects.modified(db, bulk_delete.ids)
+        deleted = delete_many(db, model, bulk_delete.ids)
+        effects.commit(db, cache.ids_tags(bulk_delete.ids))
+        return BulkDeleteResponse(deleted=deleted)
+
+    # --- Single row endpoints ---
+
+    async def create_item(
+        item: create_schema,
+        idempotency_key: Optional[str] = Depends(idempotency_dependency),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+    ):
+        idempotent_create = None
+        if idempotency_key is not None:
+            idempotent_create = IdempotentCreate(
+                db, current_user.id, idempotency_key, f"create_{name}", item, status.HTTP_201_CREATED
+            )
+            replay = idempotent_create.replay()
+            if replay is not None:
+                return replay
+
+        db_item = insert_returning(db, model, item.model_dump())
+        effects.inserted(db, [db_item])
+        if idempotent_create is not None:
+            idempotent_create.record(item_adapter, db_item)
+        effects.commit(db, cache.row_tags(db_item))
+        if idempotent_create is not None:
+            return idempotent_create.response()
+        return db_item
+
+    async def read_items(
+        request: Request,
+        response: Response,
+        pagination: PaginationParams = Depends(),
+        filters: list = Depends(list_filters),
+        fields: Optional[str] = FIELDS_QUERY,
+        fast: bool = FAST_QUERY,
+        include_tree: Optional[dict] = Depends(include_dependency),
+        count: Optional[str] = COUNT_QUERY,
+        db: Session = Depends(get_read_db),
+        current_user: User = Depends(get_current_user)
+    ):
+        selected = parse_fields(fields, response_schema)
+        if include_tree and (selected or fast):
+            raise HTTPException(status_code=400, detail="include cannot be combined with fields or fast")
+
+        key = None if include_tree else cache.key(f"read_{plural}", request, current_user)
+        if key is not None:
+            cached = cached_response(request, key)
+            if cached is not None:
+                return cached
+
+        validated = version_column is not None and not include_tree
+        # Read before the rows, see app.db.versions
+        version = table_version(db, table) if key is not None or validated else None
+        query = list_query(db, model, owner_column, current_user, filters)
+
+        etag = last_modified = None
+        if validated:
+            owner_id = current_user.id if owner_column is not None else None
+            etag, last_modified = list_validators(table, request, owner_id, version)
+            if is_not_modified(request, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+
+        tags = cache.list_entry_tags(request)
+        total = count_rows(db, query, count, tags) if count else None
+        query = query.offset(pagination.skip).limit(pagination.limit)
+
+        if include_tree:
+            db_items = query.all()
+            load_includes(db, db_items, include_tree)
+            trees = [serialize_tree(db_item, response_schema, include_tree) for db_item in db_items]
+            return set_total_count(tree_response(trees), total)
+
+        result = renderer.render(query, selected, fast, serialize=key is not None)
+        if key is not None:
+            cache.store(db, key, CachedResponse(result.body, etag, last_modified, total), tags, version[0])
+        headers_target = result if isinstance(result, Response) else response
+        if etag is not None:
+            set_validators(headers_target, etag, last_modified)
+        set_total_count(headers_target, total)
+        return result
+
+    async def read_item(
+        request: Request,
+        response: Response,
+        item_id: int = Path(..., alias=pk_name),
+        include_tree: Optional[dict] = Depends(include_dependency),
+        db: Session = Depends(get_read_db),
+        current_user: User = Depends(get_current_user)
+    ):
+        if include_tree:
+            db_item = db.get(model, item_id)
+            if db_item is None:
+                raise HTTPException(status_code=404, detail=not_found)
+            load_includes(db, [db_item], include_tree)
+            return tree_response(serialize_tree(db_item, response_schema, include_tree))
+
+        key = cache.key(f"read_{name}", request, current_user)
+        if key is not None:
+            cached = cached_response(request, key)
+            if cached is not None:
+                return cached
+            version, _ = table_version(db, table)
+
+        if version_column is not None:
+            not_modified = item_not_modified(db, request, table, version_column, pk_column, item_id, not_found)
+            if not_modified is not None:
+                return not_modified
+
+        db_item = db.get(model, item_id)
+        if db_item is None:
+            raise HTTPException(status_code=404, detail=not_found)
+
+        etag = last_modified = None
+        if version_column is not None:
+            etag, last_modified = item_validators(table, item_id, db_item.updated_at)
+        if key is None:
+            if etag is not None:
+                set_validators(response, etag, last_modified)
+            return db_item
+
+        with timed("serialize"):
+            body = item_adapter.dump_json(item_adapter.validate_python(db_item, from_attributes=True))
+        cache.store(db, key, CachedResponse(body, etag, last_modified), [cache.detail_tag(item_id)], version)
+        result = Response(content=body, media_type="application/json")
+        return set_validators(result, etag, last_modified) if etag is not None else result
+
+    async def update_item(
+        item_update: update_schema,
+        item_id: int = Path(..., alias=pk_name),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+    ):
+        changes = item_update.model_dump(exclude_unset=True)
+        effects.modified(db, [item_id])
+        db_item = update_returning(db, model, item_id, changes)
+        if db_item is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        effects.modified(db, [item_id])
+
+        # Moving a row to another partition also affects the list it left
+        moved = cache_partition is not None and cache_partition in changes
+        effects.commit(db, cache.row_tags(db_item) + ([cache.list_tag] if moved else []))
+        return db_item
+
+    async def delete_item(
+        item_id: int = Path(..., alias=pk_name),
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+    ):
+        effects.modified(db, [item_id])
+        db_item = delete_returning(db, model, item_id)
+        if db_item is None:
+            raise HTTPException(status_code=404, detail=not_found)
+
+        effects.commit(db, cache.row_tags(db_item))
+        return None
+
+    router.add_api_route(
+        f"{path}/bulk", bulk_create, methods=["POST"], name=f"bulk_create_{plural}",
+        response_model=List[response_schema], status_code=status.HTTP_201_CREATED,
+    )
+    router.add_api_route(
+        f"{path}/bulk", bulk_update, methods=["PATCH"], name=f"bulk_update_{plural}",
+        response_model=List[response_schema],
+    )
+    router.add_api_route(
+        f"{path}/bulk", bulk_delete, methods=["DELETE"], name=f"bulk_delete_{plural}",
+        response_model=BulkDeleteResponse,
+    )
+    router.add_api_route(
+        f"{path}/", create_item, methods=["POST"], name=f"create_{name}",
+        response_model=response_schema, status_code=status.HTTP_201_CREATED,
+    )
+    router.add_api_route(
+        f"{path}/", read_items, methods=["GET"], name=f"read_{plural}",
+        response_model=List[response_schema],
+    )
+    router.add_api_route(
+        item_path, read_item, methods=["GET"], name=f"read_{name}",
+        response_model=response_schema,
+    )
+    router.add_api_route(
+        item_path, update_item, methods=["PUT"], name=f"update_{name}",
+        response_model=response_schema,
+    )
+    router.add_api_route(
+        item_path, delete_item, methods=["DELETE"], name=f"delete_{name}",
+        status_code=status.HTTP_204_NO_CONTENT,
+    )
@@ -0,0 +1,74 @@
+"""
+Conditional GET validators of the CRUD endpoints.
+
+Only models with an `updated_at` column get validators. A detail is
+validated by its row's `updated_at`; a list by the version counter of its
+table (see app.db.versions), together with the query parameters and, for
+owner-scoped lists, the caller.
+"""
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy.orm import Session
+
+from app.core.conditional import is_conditional, is_not_modified, make_etag, not_modified_response
+
+
+def list_validators(
+    table: str, request: Request, owner_id: Optional[int], table_version: Tuple[int, Optional[datetime]]
+) -> Tuple[str, Optional[datetime]]:
+    """
+    ETag and Last-Modified of a list response.
+
+    The version must be read before the rows, so a concurrent write can
+    only make the ETag older than the rows, never newer.
+
+    Args:
+        table: Table the list reads
+        request: The list request; its query parameters select the rows
+        owner_id: Caller the list is restricted to, or None
+        table_version: Version of the table and time of its last write, from `table_version`
+
+    Returns:
+        The ETag and the time of the table's last write, if known
+    """
+    version, last_modified = table_version
+    etag = make_etag(table, sorted(request.query_params.multi_items()), owner_id, version)
+    return etag, last_modified
+
+
+def item_validators(table: str, item_id: Any, updated_at: datetime) -> Tuple[str, datetime]:
+    """ETag and Last-Modified of a detail response."""
+    return make_etag(table, item_id, updated_at), updated_at
+
+
+def item_not_modified(
+    db: Session, request: Request, table: str, version_column: Any, pk_column: Any, item_id: Any, not_found: str
+) -> Optional[Response]:
+    """
+    A 304 for a conditional detail read the client's copy still matches.
+
+    Compares against the stored `updated_at` without loading the row.
+
+    Args:
+        db: Database session
+        request: The detail request
+        table: Table of the row
+        version_column: The model's `updated_at` column
+        pk_column: The model's primary key column
+        item_id: Primary key of the row
+        not_found: Detail of the 404 raised when the row does not exist
+
+    Returns:
+        The 304 response, or None when the request is unconditional or the copy is stale
+    """
+    if not is_conditional(request):
+        return None
+    version = db.query(version_column).filter(pk_column == item_id).scalar()
+    if version is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    etag, last_modified = item_validators(table, item_id, version)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    return None
@@ -0,0 +1,82 @@
+"""
+Side effects of the CRUD write endpoints.
+
+Around the statement itself a write runs the model's hooks, commits (which
+bumps the table version list validators are built from, see
+app.db.versions), and then invalidates the cached responses showing the
+changed rows. Idempotent
+creates also store their response with the Idempotency-Key they claimed.
+"""
+from typing import Any, Callable, Iterable, List, Optional
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate
+from app.core.idempotency import (
+    idempotent_replay, idempotent_response, record_idempotent_response, request_fingerprint
+)
+
+WriteHook = Callable[[Session, List[Any]], None]
+
+
+class WriteEffects:
+    """Hooks, commit and invalidation of one model's writes."""
+
+    def __init__(
+        self,
+        table: str,
+        on_insert: Optional[WriteHook] = None,
+        on_modify: Optional[WriteHook] = None,
+    ):
+        self.table = table
+        self.on_insert = on_insert
+        self.on_modify = on_modify
+
+    def inserted(self, db: Session, db_items: List[Any]) -> None:
+        """Run the insert hook on rows just inserted."""
+        if self.on_insert is not None:
+            self.on_insert(db, db_items)
+
+    def modified(self, db: Session, pk_values: List[Any]) -> None:
+        """Run the modify hook on rows about to change, or just updated."""
+        if self.on_modify is not None:
+            self.on_modify(db, pk_values)
+
+    def commit(self, db: Session, tags: Iterable[str]) -> None:
+        """
+        Commit the write and drop the cached responses it affects.
+
+        Args:
+            db: Session of the write
+            tags: Cache tags of every response showing a changed row
+        """
+        tags = list(tags)
+        db.commit()
+        invalidate(tags)
+
+
+class IdempotentCreate:
+    """The Idempotency-Key steps of one single-row create."""
+
+    def __init__(self, db: Session, user_id: int, key: str, route_name: str, payload: BaseModel, status_code: int):
+        self.db = db
+        self.user_id = user_id
+        self.key = key
+        self.fingerprint = request_fingerprint(route_name, payload)
+        self.status_code = status_code
+        self.body = b""
+
+    def replay(self) -> Optional[Response]:
+        """The stored response of a retry, or None once this request claimed the key."""
+        return idempotent_replay(self.db, self.user_id, self.key, self.fingerprint)
+
+    def record(self, adapter: TypeAdapter, db_item: Any) -> None:
+        """Store the response for retries; call before committing the write."""
+        self.body = adapter.dump_json(adapter.validate_python(db_item, from_attributes=True))
+        record_idempotent_response(self.db, self.user_id, self.key, self.status_code, self.body)
+
+    def response(self) -> Response:
+        """Response of the committed create."""
+        return idempotent_response(self.user_id, self.key, self.fingerprint, self.status_code, self.body)
@@ -1,354 +1,292 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import false, func, update
 from sqlalchemy.orm import Session
-from app.db.base import get_db
-from app.core.auth_dependencies import get_current_user
+from app.core.auth_dependencies import get_current_admin_user, get_current_user
+from app.core.fulltext import SEARCH_QUERY, search_documents
+from app.core.ledger import ledger_balance, snapshot_invalidator
+from app.core.statements import iter_statement_rows, month_period, render_statement
+from app.core.notifications import announce_inserted, fan_out_notifications, notifications_changed, panel_owner_ids
+from app.core.push import (
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS, NOTIFICATION_STREAM_QUEUE_SIZE, format_event, notification_hub,
+    resync_event,
+)
+from app.core.timing import TimedRoute
+from app.db.base import get_db, get_read_db
 from app.models.models import PanelOwnership, CustomerConsumption, EnergyCredits, Transaction, Notification, User
+from app.routers.crud import add_crud_routes
 from app.schemas.schemas import (
     PanelOwnershipCreate, PanelOwnershipUpdate, PanelOwnershipResponse,
     CustomerConsumptionCreate, CustomerConsumptionUpdate, CustomerConsumptionResponse,
     EnergyCreditsCreate, EnergyCreditsUpdate, EnergyCreditsResponse,
-    TransactionCreate, TransactionUpdate, TransactionResponse,
-    NotificationCreate, NotificationUpdate, NotificationResponse,
-    PaginationParams
+    TransactionCreate, TransactionUpdate, TransactionResponse, LedgerBalance,
+    NotificationCreate, NotificationUpdate, NotificationResponse, NotificationSearchHit,
+    NotificationFanOut, NotificationFanOutResponse, NotificationUnreadCount,
+    NotificationMarkRead, NotificationMarkReadResponse, PaginationParams,
 )
 
 router = APIRouter(
     prefix="/customers",
-    tags=["Customers"]
+    tags=["Customers"],
+    route_class=TimedRoute
 )
 
 # --- Panel Ownership Endpoints ---
 
-@router.post("/ownership/", response_model=PanelOwnershipResponse, status_code=status.HTTP_201_CREATED)
-async def create_panel_ownership(
-    ownership: PanelOwnershipCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_ownership = PanelOwnership(**ownership.dict())
-    db.add(db_ownership)
-    db.commit()
-    db.refresh(db_ownership)
-    return db_ownership
-
-@router.get("/ownership/", response_model=List[PanelOwnershipResponse])
-async def read_panel_ownerships(
-    pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    ownerships = db.query(PanelOwnership).filter(PanelOwnership.customer_id == current_user.id).offset(pagination.skip).limit(pagination.limit).all()
-    return ownerships
-
-@router.get("/ownership/{ownership_id}", response_model=PanelOwnershipResponse)
-async def read_panel_ownership(
-    ownership_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    ownership = db.query(PanelOwnership).filter(PanelOwnership.ownership_id == ownership_id).first()
-    if ownership is None:
-        raise HTTPException(status_code=404, detail="Panel Ownership not found")
-    return ownership
-
-@router.put("/ownership/{ownership_id}", response_model=PanelOwnershipResponse)
-async def update_panel_ownership(
-    ownership_id: int,
-    ownership_update: PanelOwnershipUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_ownership = db.query(PanelOwnership).filter(PanelOwnership.ownership_id == ownership_id).first()
-    if db_ownership is None:
-        raise HTTPException(status_code=404, detail="Panel Ownership not found")
-    
-    update_data = ownership_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_ownership, key, value)
-    
-    db.commit()
-    db.refresh(db_ownership)
-    return db_ownership
-
-@router.delete("/ownership/{ownership_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_panel_ownership(
-    ownership_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_ownership = db.query(PanelOwnership).filter(PanelOwnership.ownership_id == ownership_id).first()
-    if db_ownership is None:
-        raise HTTPException(status_code=404, detail="Panel Ownership not found")
-    
-    db.delete(db_ownership)
-    db.commit()
-    return None
+add_crud_routes(
+    router,
+    path="/ownership",
+    model=PanelOwnership,
+    create_schema=PanelOwnershipCreate,
+    update_schema=PanelOwnershipUpdate,
+    response_schema=PanelOwnershipResponse,
+    name="panel_ownership",
+    plural="panel_ownerships",
+    label="Panel Ownership",
+    owner_column=PanelOwnership.customer_id,
+)
 
 # --- Customer Consumption Endpoints ---
 
-@router.post("/consumption/", response_model=CustomerConsumptionResponse, status_code=status.HTTP_201_CREATED)
-async def create_customer_consumption(
-    consumption: CustomerConsumptionCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_consumption = CustomerConsumption(**consumption.dict())
-    db.add(db_consumption)
-    db.commit()
-    db.refresh(db_consumption)
-    return db_consumption
+add_crud_routes(
+    router,
+    path="/consumption",
+    model=CustomerConsumption,
+    create_schema=CustomerConsumptionCreate,
+    update_schema=CustomerConsumptionUpdate,
+    response_schema=CustomerConsumptionResponse,
+    name="customer_consumption",
+    plural="customer_consumptions",
+    label="Customer Consumption",
+    owner_column=CustomerConsumption.customer_id,
+)
 
-@router.get("/consumption/", response_model=List[CustomerConsumptionResponse])
-async def read_customer_consumptions(
-    pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    consumptions = db.query(CustomerConsumption).filter(CustomerConsumption.customer_id == current_user.id).offset(pagination.skip).limit(pagination.limit).all()
-    return consumptions
+# --- Energy Credits Endpoints ---
 
-@router.get("/consumption/{consumption_id}", response_model=CustomerConsumptionResponse)
-async def read_customer_consumption(
-    consumption_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    consumption = db.query(CustomerConsumption).filter(CustomerConsumption.consumption_id == consumption_id).first()
-    if consumption is None:
-        raise HTTPException(status_code=404, detail="Customer Consumption not found")
-    return consumption
+add_crud_routes(
+    router,
+    path="/credits",
+    model=EnergyCredits,
+    create_schema=EnergyCreditsCreate,
+    update_schema=EnergyCreditsUpdate,
+    response_schema=EnergyCreditsResponse,
+    name="energy_credit",
+    plural="energy_credits",
+    label="Energy Credit",
+    owner_column=EnergyCredits.customer_id,
+    on_modify=snapshot_invalidator(EnergyCredits),
+)
 
-@router.put("/consumption/{consumption_id}", response_model=CustomerConsumptionResponse)
-async def update_customer_consumption(
-    consumption_id: int,
-    consumption_update: CustomerConsumptionUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_consumption = db.query(CustomerConsumption).filter(CustomerConsumption.consumption_id == consumption_id).first()
-    if db_consumption is None:
-        raise HTTPException(status_code=404, detail="Customer Consumption not found")
-    
-    update_data = consumption_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_consumption, key, value)
-    
-    db.commit()
-    db.refresh(db_consumption)
-    return db_consumption
+# --- Transaction Endpoints ---
 
-@router.delete("/consumption/{consumption_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_customer_consumption(
-    consumption_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_consumption = db.query(CustomerConsumption).filter(CustomerConsumption.consumption_id == consumption_id).first()
-    if db_consumption is None:
-        raise HTTPException(status_code=404, detail="Customer Consumption not found")
-    
-    db.delete(db_consumption)
-    db.commit()
-    return None
+add_crud_routes(
+    router,
+    path="/transactions",
+    model=Transaction,
+    create_schema=TransactionCreate,
+    update_schema=TransactionUpdate,
+    response_schema=TransactionResponse,
+    name="transaction",
+    plural="transactions",
+    label="Transaction",
+    owner_column=Transaction.customer_id,
+    on_modify=snapshot_invalidator(Transaction),
+    # Retried payments must not charge twice
+    idempotent=True,
+)
 
-# --- Energy Credits Endpoints ---
+# --- Ledger Endpoints ---
 
-@router.post("/credits/", response_model=EnergyCreditsResponse, status_code=status.HTTP_201_CREATED)
-async def create_energy_credit(
-    credit: EnergyCreditsCreate,
-    db: Session = Depends(get_db),
+@router.get("/ledger/balance", response_model=LedgerBalance)
+async def read_ledger_balance(
+    customer_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_credit = EnergyCredits(**credit.dict())
-    db.add(db_credit)
-    db.commit()
-    db.refresh(db_credit)
-    return db_credit
+    # Admins may read any customer's balance; customers only their own
+    if customer_id is None:
+        customer_id = current_user.id
+    elif customer_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    totals = ledger_balance(db, customer_id)
+    return LedgerBalance(
+        customer_id=customer_id,
+        transactions_total=totals.transactions_total,
+        credits_total=totals.credits_total,
+        balance=totals.balance,
+        snapshot_at=totals.snapshot_at,
+    )
 
-@router.get("/credits/", response_model=List[EnergyCreditsResponse])
-async def read_energy_credits(
-    pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    credits = db.query(EnergyCredits).filter(EnergyCredits.customer_id == current_user.id).offset(pagination.skip).limit(pagination.limit).all()
-    return credits
+# --- Statement Endpoints ---
 
-@router.get("/credits/{credit_id}", response_model=EnergyCreditsResponse)
-async def read_energy_credit(
-    credit_id: int,
-    db: Session = Depends(get_db),
+@router.get("/statements/{month}", response_class=StreamingResponse)
+async def read_statement(
+    month: str,
+    format: str = Query("csv", pattern="^(csv|json)$"),
+    customer_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    credit = db.query(EnergyCredits).filter(EnergyCredits.credit_id == credit_id).first()
-    if credit is None:
-        raise HTTPException(status_code=404, detail="Energy Credit not found")
-    return credit
+    try:
+        start, end = month_period(month)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month must be formatted as YYYY-MM")
+    if customer_id is None:
+        customer_id = current_user.id
+    elif customer_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    # Rendered while the rows stream from the cursor; never held in memory.
+    # Needs FastAPI 0.118+, which closes `db` only after the body is sent
+    entries = iter_statement_rows(db, start, end, customer_id)
+    return StreamingResponse(
+        render_statement(customer_id, start, end, entries, format),
+        media_type="text/csv" if format == "csv" else "application/json",
+        headers={"Content-Disposition": f'attachment; filename="statement_{customer_id}_{month}.{format}"'},
+    )
 
-@router.put("/credits/{credit_id}", response_model=EnergyCreditsResponse)
-async def update_energy_credit(
-    credit_id: int,
-    credit_update: EnergyCreditsUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_credit = db.query(EnergyCredits).filter(EnergyCredits.credit_id == credit_id).first()
-    if db_credit is None:
-        raise HTTPException(status_code=404, detail="Energy Credit not found")
-    
-    update_data = credit_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_credit, key, value)
-    
-    db.commit()
-    db.refresh(db_credit)
-    return db_credit
+# --- Notification Endpoints ---
 
-@router.delete("/credits/{credit_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_energy_credit(
-    credit_id: int,
-    db: Session = Depends(get_db),
+@router.get("/notifications/unread-count", response_model=NotificationUnreadCount)
+async def read_unread_notification_count(
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_credit = db.query(EnergyCredits).filter(EnergyCredits.credit_id == credit_id).first()
-    if db_credit is None:
-        raise HTTPException(status_code=404, detail="Energy Credit not found")
-    
-    db.delete(db_credit)
-    db.commit()
-    return None
-
-# --- Transaction Endpoints ---
+    # `is_read = false` matches the predicate of ix_notifications_customer_unread,
+    # so this is an index-only count over the caller's unread rows
+    unread = db.query(func.count()).filter(
+        Notification.customer_id == current_user.id, Notification.is_read == false()
+    ).scalar()
+    return NotificationUnreadCount(unread=unread)
 
-@router.post("/transactions/", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
-async def create_transaction(
-    transaction: TransactionCreate,
+@router.get("/notifications/stream", response_class=StreamingResponse)
+async def stream_notifications(
+    request: Request,
+    last_event_id: Optional[int] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_transaction = Transaction(**transaction.dict())
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
+    customer_id = current_user.id
+    subscriber = notification_hub.subscribe(customer_id)
+    try:
+        # Rows created while the client was disconnected; EventSource sends
+        # the id of the last event it received when it reconnects
+        replay = []
+        if last_event_id is not None:
+            missed = (
+                db.query(Notification)
+                .filter(Notification.customer_id == customer_id, Notification.notification_id > last_event_id)
+                .order_by(Notification.notification_id)
+                .limit(NOTIFICATION_STREAM_QUEUE_SIZE + 1)
+                .all()
+            )
+            if len(missed) > NOTIFICATION_STREAM_QUEUE_SIZE:
+                # Too many to replay: the client refetches up to the newest row instead
+                newest = db.query(func.max(Notification.notification_id)).filter(
+                    Notification.customer_id == customer_id
+                ).scalar()
+                subscriber.resynced_through = newest
+                replay = [resync_event(newest)]
+            else:
+                # Announcements of these rows may already be on their way to the queue
+                for notification in missed:
+                    subscriber.mark_sent(notification.notification_id)
+                replay = [format_event(notification) for notification in missed]
+    except Exception:
+        notification_hub.unsubscribe(subscriber)
+        raise
+    # Give the connection back to the pool; the stream may stay open for hours
+    db.close()
 
-@router.get("/transactions/", response_model=List[TransactionResponse])
-async def read_transactions(
-    pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    transactions = db.query(Transaction).filter(Transaction.customer_id == current_user.id).offset(pagination.skip).limit(pagination.limit).all()
-    return transactions
+    async def events():
+        try:
+            yield b"retry: 5000\n\n"
+            for event in replay:
+                yield event
+            while not await request.is_disconnected():
+                event = await subscriber.next_event(NOTIFICATION_STREAM_HEARTBEAT_SECONDS)
+                yield event if event is not None else b": keep-alive\n\n"
+        finally:
+            notification_hub.unsubscribe(subscriber)
 
-@router.get("/transactions/{transaction_id}", response_model=TransactionResponse)
-async def read_transaction(
-    transaction_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    transaction = db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
-    if transaction is None:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    return transaction
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@router.put("/transactions/{transaction_id}", response_model=TransactionResponse)
-async def update_transaction(
-    transaction_id: int,
-    transaction_update: TransactionUpdate,
+@router.post("/notifications/mark-read", response_model=NotificationMarkReadResponse)
+async def mark_notifications_read(
+    mark_read: NotificationMarkRead,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_transaction = db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
-    if db_transaction is None:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    update_data = transaction_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_transaction, key, value)
-    
+    statement = (
+        update(Notification)
+        .where(Notification.customer_id == current_user.id, Notification.is_read == false())
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    if mark_read.up_to_id is not None:
+        statement = statement.where(Notification.notification_id <= mark_read.up_to_id)
+    if mark_read.before is not None:
+        statement = statement.where(Notification.created_at < mark_read.before)
+    updated = db.execute(statement).rowcount
     db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
+    notifications_changed()
+    return NotificationMarkReadResponse(updated=updated)
 
-@router.delete("/transactions/{transaction_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_transaction(
-    transaction_id: int,
+@router.post("/notifications/fan-out", response_model=NotificationFanOutResponse, status_code=status.HTTP_201_CREATED)
+async def fan_out_notification(
+    fan_out: NotificationFanOut,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    admin_user: User = Depends(get_current_admin_user)
 ):
-    db_transaction = db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
-    if db_transaction is None:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    db.delete(db_transaction)
-    db.commit()
-    return None
-
-# --- Notification Endpoints ---
+    targets = fan_out.model_dump(include={"farm_id", "panel_ids", "ownership_type", "ownership_status", "city", "state"})
+    if all(value is None for value in targets.values()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one recipient criterion is required"
+        )
 
-@router.post("/notifications/", response_model=NotificationResponse, status_code=status.HTTP_201_CREATED)
-async def create_notification(
-    notification: NotificationCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_notification = Notification(**notification.dict())
-    db.add(db_notification)
+    content = fan_out.model_dump(include={"notification_type", "title", "message", "priority"})
+    recipients = fan_out_notifications(db, panel_owner_ids(**targets), content)
     db.commit()
-    db.refresh(db_notification)
-    return db_notification
+    notifications_changed()
+    return NotificationFanOutResponse(recipients=recipients)
 
-@router.get("/notifications/", response_model=List[NotificationResponse])
-async def read_notifications(
+@router.get("/notifications/search", response_model=List[NotificationSearchHit])
+async def search_notifications(
+    q: str = SEARCH_QUERY,
     pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    notifications = db.query(Notification).filter(Notification.customer_id == current_user.id).offset(pagination.skip).limit(pagination.limit).all()
-    return notifications
-
-@router.get("/notifications/{notification_id}", response_model=NotificationResponse)
-async def read_notification(
-    notification_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    notification = db.query(Notification).filter(Notification.notification_id == notification_id).first()
-    if notification is None:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    return notification
-
-@router.put("/notifications/{notification_id}", response_model=NotificationResponse)
-async def update_notification(
-    notification_id: int,
-    notification_update: NotificationUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_notification = db.query(Notification).filter(Notification.notification_id == notification_id).first()
-    if db_notification is None:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    
-    update_data = notification_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_notification, key, value)
-    
-    db.commit()
-    db.refresh(db_notification)
-    return db_notification
+    hits = search_documents(
+        db, Notification, Notification.search_vector, Notification.message,
+        q, [Notification.customer_id == current_user.id], pagination.skip, pagination.limit,
+    )
+    return [
+        NotificationSearchHit(**NotificationResponse.model_validate(notification).model_dump(), rank=rank, snippet=snippet)
+        for notification, rank, snippet in hits
+    ]
 
-@router.delete("/notifications/{notification_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_notification(
-    notification_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_notification = db.query(Notification).filter(Notification.notification_id == notification_id).first()
-    if db_notification is None:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    
-    db.delete(db_notification)
-    db.commit()
-    return None
+add_crud_routes(
+    router,
+    path="/notifications",
+    model=Notification,
+    create_schema=NotificationCreate,
+    update_schema=NotificationUpdate,
+    response_schema=NotificationResponse,
+    name="notification",
+    plural="notifications",
+    label="Notification",
+    owner_column=Notification.customer_id,
+    on_insert=announce_inserted,
+)
@@ -1,8 +1,27 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from app.db.base import get_db
+from app.db.archive import (
+    count_archived, customer_archived_months, find_archived, iter_archived, merge_page, parse_reading_cursor,
+    reading_cursor,
+)
+from app.db.base import get_db, get_read_db
+from app.db.packed import (
+    ENERGY_PACKED_STORAGE, READING_FIELDS, GenerationReading, as_utc, count_packed, find_packed, iter_packed
+)
+from app.db.writes import delete_by_pk, insert_returning, update_returning
 from app.core.auth_dependencies import get_current_user
+from app.core.cache import invalidate
+from app.core.counting import COUNT_QUERY, count_rows, set_total_count
+from app.core.fieldsets import FIELDS_QUERY, parse_fields, select_columns, sparse_response
+from app.core.idempotency import (
+    idempotency_key_header, idempotent_replay, idempotent_response, record_idempotent_response, request_fingerprint
+)
+from app.core.serialization import FAST_QUERY, fast_json_response, response_fields
+from app.core.timing import TimedRoute
 from app.models.models import EnergyGeneration, User, PanelOwnership, SolarPanel
 from app.schemas.schemas import (
     EnergyGenerationCreate, EnergyGenerationUpdate, EnergyGenerationResponse,
@@ -11,39 +30,152 @@ from app.schemas.schemas import (
 
 router = APIRouter(
     prefix="/energy",
-    tags=["Energy Generation"]
+    tags=["Energy Generation"],
+    route_class=TimedRoute
 )
 
+# Tag of cached generation counts, invalidated by every generation write
+GENERATION_LIST_TAG = "energy_generation:list"
+# Cursor of the page following a full page of readings
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+generation_adapter = TypeAdapter(EnergyGenerationResponse)
+# Detail of writes to readings moved out of the table by packing or archiving
+READ_ONLY_GENERATION = "Energy Generation is packed or archived and can no longer be modified"
+
+
+def find_stored_generation(db: Session, generation_id: int, current_user: User) -> Optional[GenerationReading]:
+    """A reading moved to packed days or the archive, searched among the caller's panels (every panel for admins)."""
+    if current_user.is_admin:
+        panels = db.query(SolarPanel.panel_id)
+    else:
+        panels = db.query(PanelOwnership.panel_id).filter(PanelOwnership.customer_id == current_user.id).distinct()
+    panel_ids = [panel_id for (panel_id,) in panels if panel_id is not None]
+    if not panel_ids:
+        return None
+    return find_packed(db, generation_id, panel_ids) or find_archived(panel_ids, generation_id)
+
 # --- Energy Generation Endpoints ---
 
 @router.post("/generation/", response_model=EnergyGenerationResponse, status_code=status.HTTP_201_CREATED)
 async def create_energy_generation(
     generation: EnergyGenerationCreate,
+    idempotency_key: Optional[str] = Depends(idempotency_key_header),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_generation = EnergyGeneration(**generation.dict())
-    db.add(db_generation)
+    # Retried uploads replay the first response instead of storing the reading twice
+    if idempotency_key is not None:
+        fingerprint = request_fingerprint("create_energy_generation", generation)
+        replay = idempotent_replay(db, current_user.id, idempotency_key, fingerprint)
+        if replay is not None:
+            return replay
+
+    db_generation = insert_returning(db, EnergyGeneration, generation.model_dump())
+    if idempotency_key is not None:
+        body = generation_adapter.dump_json(generation_adapter.validate_python(db_generation, from_attributes=True))
+        record_idempotent_response(db, current_user.id, idempotency_key, status.HTTP_201_CREATED, body)
     db.commit()
-    db.refresh(db_generation)
+    invalidate([GENERATION_LIST_TAG])
+    if idempotency_key is not None:
+        return idempotent_response(current_user.id, idempotency_key, fingerprint, status.HTTP_201_CREATED, body)
     return db_generation
 
 @router.get("/generation/", response_model=List[EnergyGenerationResponse])
 async def read_energy_generations(
+    response: Response,
     pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
+    fields: Optional[str] = FIELDS_QUERY,
+    fast: bool = FAST_QUERY,
+    count: Optional[str] = COUNT_QUERY,
+    start: Optional[datetime] = Query(None, description="Only readings at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only readings before this time"),
+    after: Optional[str] = Query(
+        None,
+        description=f"Continue after the last reading of the previous page, from its {NEXT_CURSOR_HEADER} header",
+    ),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    generations = db.query(EnergyGeneration).join(EnergyGeneration.panel).join(SolarPanel.ownerships).filter(PanelOwnership.customer_id == current_user.id).offset(pagination.skip).limit(pagination.limit).all()
-    return generations
+    selected = parse_fields(fields, EnergyGenerationResponse)
+    columns = selected or (response_fields(EnergyGenerationResponse) if fast else None)
+    cursor = None
+    if after is not None:
+        try:
+            cursor = parse_reading_cursor(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid after cursor")
+    # Older storage tiers only matter for the part of the range the page can reach
+    lower = start
+    if cursor is not None and (start is None or cursor[0] > as_utc(start)):
+        lower = cursor[0]
+    archived = customer_archived_months(db, current_user.id, lower, end)
+    merged = bool(archived) or ENERGY_PACKED_STORAGE
+
+    if merged:
+        # Merging with older storage tiers needs every column
+        query = db.query(*select_columns(EnergyGeneration, READING_FIELDS))
+    elif columns:
+        # The cursor of the next page needs the sort key
+        key_fields = [name for name in ("timestamp", "generation_id") if name not in columns]
+        query = db.query(*select_columns(EnergyGeneration, [*columns, *key_fields]))
+    else:
+        query = db.query(EnergyGeneration)
+    query = query.join(EnergyGeneration.panel).join(SolarPanel.ownerships).filter(PanelOwnership.customer_id == current_user.id)
+    if start is not None:
+        query = query.filter(EnergyGeneration.timestamp >= start)
+    if end is not None:
+        query = query.filter(EnergyGeneration.timestamp < end)
+
+    total = None
+    if count:
+        total = count_rows(db, query, count, [GENERATION_LIST_TAG])
+        # The total covers the whole range, not only the part after the cursor
+        in_range = archived if lower is start else customer_archived_months(db, current_user.id, start, end)
+        total += count_archived(in_range, start, end)
+        if ENERGY_PACKED_STORAGE:
+            total += count_packed(db, current_user.id, start, end)
+
+    if cursor is not None:
+        query = query.filter(tuple_(EnergyGeneration.timestamp, EnergyGeneration.generation_id) > tuple_(*cursor))
+    # (timestamp, generation_id) is unique, so pages neither repeat nor skip rows
+    query = query.order_by(EnergyGeneration.timestamp, EnergyGeneration.generation_id)
+    # One extra row tells whether another page follows
+    if merged:
+        streams = [query.limit(pagination.skip + pagination.limit + 1).all()]
+        if archived:
+            streams.append(iter_archived(archived, lower, end))
+        if ENERGY_PACKED_STORAGE:
+            streams.append(iter_packed(db, current_user.id, lower, end))
+        generations = merge_page(streams, pagination.skip, pagination.limit + 1, after=cursor)
+    else:
+        generations = query.offset(pagination.skip).limit(pagination.limit + 1).all()
+
+    next_cursor = None
+    if len(generations) > pagination.limit:
+        generations = generations[:pagination.limit]
+        next_cursor = reading_cursor(generations[-1])
+    if fast:
+        rows = [tuple(getattr(row, name) for name in columns) for row in generations]
+        result = fast_json_response(columns, rows)
+    elif selected:
+        result = sparse_response(EnergyGenerationResponse, selected, generations)
+    else:
+        result = generations
+    headers_target = result if isinstance(result, Response) else response
+    if next_cursor is not None:
+        headers_target.headers[NEXT_CURSOR_HEADER] = next_cursor
+    set_total_count(headers_target, total)
+    return result
 
 @router.get("/generation/{generation_id}", response_model=EnergyGenerationResponse)
 async def read_energy_generation(
     generation_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     generation = db.query(EnergyGeneration).filter(EnergyGeneration.generation_id == generation_id).first()
+    if generation is None:
+        generation = find_stored_generation(db, generation_id, current_user)
     if generation is None:
         raise HTTPException(status_code=404, detail="Energy Generation not found")
     return generation
@@ -55,16 +187,14 @@ async def update_energy_generation(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_generation = db.query(EnergyGeneration).filter(EnergyGeneration.generation_id == generation_id).first()
+    db_generation = update_returning(db, EnergyGeneration, generation_id, generation_update.model_dump(exclude_unset=True))
     if db_generation is None:
+        if find_stored_generation(db, generation_id, current_user) is not None:
+            raise HTTPException(status_code=409, detail=READ_ONLY_GENERATION)
         raise HTTPException(status_code=404, detail="Energy Generation not found")
     
-    update_data = generation_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_generation, key, value)
-    
     db.commit()
-    db.refresh(db_generation)
+    invalidate([GENERATION_LIST_TAG])
     return db_generation
 
 @router.delete("/generation/{generation_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -73,10 +203,11 @@ async def delete_energy_generation(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_generation = db.query(EnergyGeneration).filter(EnergyGeneration.generation_id == generation_id).first()
-    if db_generation is None:
+    if not delete_by_pk(db, EnergyGeneration, generation_id):
+        if find_stored_generation(db, generation_id, current_user) is not None:
+            raise HTTPException(status_code=409, detail=READ_ONLY_GENERATION)
         raise HTTPException(status_code=404, detail="Energy Generation not found")
     
-    db.delete(db_generation)
     db.commit()
+    invalidate([GENERATION_LIST_TAG])
     return None
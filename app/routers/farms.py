@@ -1,222 +1,221 @@
+from datetime import date
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.db.base import get_db
-from app.core.auth_dependencies import get_current_user
+from app.core.auth_dependencies import get_current_admin_user, get_current_user
+from app.core.cache import CACHE_TTL_SECONDS
+from app.core.fulltext import SEARCH_QUERY, search_documents
+from app.core.includes import Include
+from app.core.maintenance import maintenance_changed, matching_panels, schedule_maintenance
+from app.core.timing import TimedRoute
+from app.db.base import get_db, get_read_db
+from app.db.keyset import keyset_page
 from app.models.models import SolarFarm, SolarPanel, MaintenanceRecord, User
+from app.routers.crud import add_crud_routes
 from app.schemas.schemas import (
     SolarFarmCreate, SolarFarmUpdate, SolarFarmResponse,
+    SolarFarmSearchParams, SolarFarmSearchPage,
     SolarPanelCreate, SolarPanelUpdate, SolarPanelResponse,
+    SolarPanelSearchParams, SolarPanelSearchPage,
     MaintenanceRecordCreate, MaintenanceRecordUpdate, MaintenanceRecordResponse,
-    PaginationParams
+    MaintenanceRecordSearchHit, MaintenanceSchedule, MaintenanceScheduleResponse,
+    PanelOwnershipResponse, KeysetParams, PaginationParams,
 )
 
 router = APIRouter(
     prefix="/farms",
-    tags=["Solar Farms"]
+    tags=["Solar Farms"],
+    route_class=TimedRoute
 )
 
 # --- Solar Farm Endpoints ---
 
-@router.post("/", response_model=SolarFarmResponse, status_code=status.HTTP_201_CREATED)
-async def create_solar_farm(
-    farm: SolarFarmCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_farm = SolarFarm(**farm.dict())
-    db.add(db_farm)
-    db.commit()
-    db.refresh(db_farm)
-    return db_farm
-
-@router.get("/", response_model=List[SolarFarmResponse])
-async def read_solar_farms(
-    pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    farms = db.query(SolarFarm).offset(pagination.skip).limit(pagination.limit).all()
-    return farms
-
-@router.get("/{farm_id}", response_model=SolarFarmResponse)
-async def read_solar_farm(
-    farm_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    farm = db.query(SolarFarm).filter(SolarFarm.farm_id == farm_id).first()
-    if farm is None:
-        raise HTTPException(status_code=404, detail="Solar Farm not found")
-    return farm
-
-@router.put("/{farm_id}", response_model=SolarFarmResponse)
-async def update_solar_farm(
-    farm_id: int,
-    farm_update: SolarFarmUpdate,
-    db: Session = Depends(get_db),
+# Search routes are registered before the CRUD routes so "/search" is not
+# matched as an id.
+@router.get("/search", response_model=SolarFarmSearchPage)
+async def search_solar_farms(
+    search: SolarFarmSearchParams = Depends(),
+    page: KeysetParams = Depends(),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_farm = db.query(SolarFarm).filter(SolarFarm.farm_id == farm_id).first()
-    if db_farm is None:
-        raise HTTPException(status_code=404, detail="Solar Farm not found")
-    
-    update_data = farm_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_farm, key, value)
-    
-    db.commit()
-    db.refresh(db_farm)
-    return db_farm
-
-@router.delete("/{farm_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_solar_farm(
-    farm_id: int,
-    db: Session = Depends(get_db),
+    query = db.query(SolarFarm)
+    if search.operational_status is not None:
+        query = query.filter(SolarFarm.operational_status == search.operational_status)
+    if search.lease_end_from is not None:
+        query = query.filter(SolarFarm.land_lease_end_date >= search.lease_end_from)
+    if search.lease_end_to is not None:
+        query = query.filter(SolarFarm.land_lease_end_date <= search.lease_end_to)
+
+    farms, next_after = keyset_page(query, SolarFarm.farm_id, page.after, page.limit)
+    return SolarFarmSearchPage(items=farms, next_after=next_after)
+
+@router.get("/panels/search", response_model=SolarPanelSearchPage)
+async def search_solar_panels(
+    search: SolarPanelSearchParams = Depends(),
+    page: KeysetParams = Depends(),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_farm = db.query(SolarFarm).filter(SolarFarm.farm_id == farm_id).first()
-    if db_farm is None:
-        raise HTTPException(status_code=404, detail="Solar Farm not found")
-    
-    db.delete(db_farm)
-    db.commit()
-    return None
+    query = db.query(SolarPanel)
+    for column, value in (
+        (SolarPanel.farm_id, search.farm_id),
+        (SolarPanel.panel_status, search.panel_status),
+        (SolarPanel.manufacturer, search.manufacturer),
+        (SolarPanel.model, search.model),
+    ):
+        if value is not None:
+            query = query.filter(column == value)
+    for column, low, high in (
+        (SolarPanel.capacity_watts, search.capacity_min, search.capacity_max),
+        (SolarPanel.installation_date, search.installed_from, search.installed_to),
+        (SolarPanel.warranty_expiry_date, search.warranty_from, search.warranty_to),
+    ):
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            query = query.filter(column <= high)
+
+    panels, next_after = keyset_page(query, SolarPanel.panel_id, page.after, page.limit)
+    return SolarPanelSearchPage(items=panels, next_after=next_after)
+
+# Relationships a farm tree can embed, e.g. include=panels,panels.ownerships
+SOLAR_FARM_INCLUDES = {
+    "panels": Include(
+        SolarFarm.panels,
+        SolarPanelResponse,
+        children={"ownerships": Include(SolarPanel.ownerships, PanelOwnershipResponse)},
+    ),
+    "maintenance_records": Include(SolarFarm.maintenance_records, MaintenanceRecordResponse),
+}
+
+add_crud_routes(
+    router,
+    path="",
+    model=SolarFarm,
+    create_schema=SolarFarmCreate,
+    update_schema=SolarFarmUpdate,
+    response_schema=SolarFarmResponse,
+    name="solar_farm",
+    plural="solar_farms",
+    label="Solar Farm",
+    cache_ttl=CACHE_TTL_SECONDS,
+    includes=SOLAR_FARM_INCLUDES,
+)
 
 # --- Solar Panel Endpoints ---
 
-@router.post("/panels/", response_model=SolarPanelResponse, status_code=status.HTTP_201_CREATED)
-async def create_solar_panel(
-    panel: SolarPanelCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_panel = SolarPanel(**panel.dict())
-    db.add(db_panel)
-    db.commit()
-    db.refresh(db_panel)
-    return db_panel
-
-@router.get("/panels/", response_model=List[SolarPanelResponse])
-async def read_solar_panels(
-    farm_id: Optional[int] = None,
-    pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    query = db.query(SolarPanel)
+def solar_panel_filters(farm_id: Optional[int] = None) -> list:
+    filters = []
     if farm_id:
-        query = query.filter(SolarPanel.farm_id == farm_id)
-    panels = query.offset(pagination.skip).limit(pagination.limit).all()
-    return panels
-
-@router.get("/panels/{panel_id}", response_model=SolarPanelResponse)
-async def read_solar_panel(
-    panel_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    panel = db.query(SolarPanel).filter(SolarPanel.panel_id == panel_id).first()
-    if panel is None:
-        raise HTTPException(status_code=404, detail="Solar Panel not found")
-    return panel
-
-@router.put("/panels/{panel_id}", response_model=SolarPanelResponse)
-async def update_solar_panel(
-    panel_id: int,
-    panel_update: SolarPanelUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_panel = db.query(SolarPanel).filter(SolarPanel.panel_id == panel_id).first()
-    if db_panel is None:
-        raise HTTPException(status_code=404, detail="Solar Panel not found")
-    
-    update_data = panel_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_panel, key, value)
-    
-    db.commit()
-    db.refresh(db_panel)
-    return db_panel
-
-@router.delete("/panels/{panel_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_solar_panel(
-    panel_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_panel = db.query(SolarPanel).filter(SolarPanel.panel_id == panel_id).first()
-    if db_panel is None:
-        raise HTTPException(status_code=404, detail="Solar Panel not found")
-    
-    db.delete(db_panel)
-    db.commit()
-    return None
+        filters.append(SolarPanel.farm_id == farm_id)
+    return filters
+
+add_crud_routes(
+    router,
+    path="/panels",
+    model=SolarPanel,
+    create_schema=SolarPanelCreate,
+    update_schema=SolarPanelUpdate,
+    response_schema=SolarPanelResponse,
+    name="solar_panel",
+    plural="solar_panels",
+    label="Solar Panel",
+    list_filters=solar_panel_filters,
+    cache_ttl=CACHE_TTL_SECONDS,
+    cache_partition="farm_id",
+)
 
 # --- Maintenance Record Endpoints ---
 
-@router.post("/maintenance/", response_model=MaintenanceRecordResponse, status_code=status.HTTP_201_CREATED)
-async def create_maintenance_record(
-    record: MaintenanceRecordCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_record = MaintenanceRecord(**record.dict())
-    db.add(db_record)
-    db.commit()
-    db.refresh(db_record)
-    return db_record
-
-@router.get("/maintenance/", response_model=List[MaintenanceRecordResponse])
-async def read_maintenance_records(
+@router.get("/maintenance/search", response_model=List[MaintenanceRecordSearchHit])
+async def search_maintenance_records(
+    q: str = SEARCH_QUERY,
+    farm_id: Optional[int] = None,
     pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    records = db.query(MaintenanceRecord).offset(pagination.skip).limit(pagination.limit).all()
-    return records
-
-@router.get("/maintenance/{maintenance_id}", response_model=MaintenanceRecordResponse)
-async def read_maintenance_record(
-    maintenance_id: int,
+    filters = [MaintenanceRecord.farm_id == farm_id] if farm_id else []
+    hits = search_documents(
+        db, MaintenanceRecord, MaintenanceRecord.search_vector, MaintenanceRecord.description,
+        q, filters, pagination.skip, pagination.limit,
+    )
+    return [
+        MaintenanceRecordSearchHit(
+            **MaintenanceRecordResponse.model_validate(record).model_dump(), rank=rank, snippet=snippet
+        )
+        for record, rank, snippet in hits
+    ]
+
+@router.post("/maintenance/schedule", response_model=MaintenanceScheduleResponse, status_code=status.HTTP_201_CREATED)
+async def schedule_maintenance_records(
+    schedule: MaintenanceSchedule,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    admin_user: User = Depends(get_current_admin_user)
 ):
-    record = db.query(MaintenanceRecord).filter(MaintenanceRecord.maintenance_id == maintenance_id).first()
-    if record is None:
-        raise HTTPException(status_code=404, detail="Maintenance Record not found")
-    return record
-
-@router.put("/maintenance/{maintenance_id}", response_model=MaintenanceRecordResponse)
-async def update_maintenance_record(
-    maintenance_id: int,
-    record_update: MaintenanceRecordUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_record = db.query(MaintenanceRecord).filter(MaintenanceRecord.maintenance_id == maintenance_id).first()
-    if db_record is None:
-        raise HTTPException(status_code=404, detail="Maintenance Record not found")
-    
-    update_data = record_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_record, key, value)
-    
+    targets = schedule.model_dump(include={"farm_id", "panel_ids", "panel_status", "manufacturer", "model"})
+    if schedule.farm_id is None and schedule.panel_ids is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="farm_id or panel_ids is required"
+        )
+
+    values = schedule.model_dump(include={"maintenance_type", "scheduled_date", "description"})
+    scheduled = schedule_maintenance(db, matching_panels(**targets), values, schedule.skip_pending)
     db.commit()
-    db.refresh(db_record)
-    return db_record
+    maintenance_changed()
+    return MaintenanceScheduleResponse(scheduled=scheduled)
 
-@router.delete("/maintenance/{maintenance_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_maintenance_record(
-    maintenance_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    db_record = db.query(MaintenanceRecord).filter(MaintenanceRecord.maintenance_id == maintenance_id).first()
-    if db_record is None:
-        raise HTTPException(status_code=404, detail="Maintenance Record not found")
-    
-    db.delete(db_record)
-    db.commit()
-    return None
+def maintenance_record_filters(
+    farm_id: Optional[int] = None,
+    panel_id: Optional[int] = None,
+    maintenance_type: Optional[str] = None,
+    maintenance_status: Optional[str] = Query(
+        None,
+        alias="status",
+        pattern="^(pending|overdue|completed)$",
+        description="pending: not completed; overdue: pending and scheduled before today",
+    ),
+    scheduled_from: Optional[date] = None,
+    scheduled_to: Optional[date] = None,
+    completed_from: Optional[date] = None,
+    completed_to: Optional[date] = None,
+) -> list:
+    filters = []
+    for column, value in (
+        (MaintenanceRecord.farm_id, farm_id),
+        (MaintenanceRecord.panel_id, panel_id),
+        (MaintenanceRecord.maintenance_type, maintenance_type),
+    ):
+        if value is not None:
+            filters.append(column == value)
+    if maintenance_status == "completed":
+        filters.append(MaintenanceRecord.completed_date.isnot(None))
+    elif maintenance_status is not None:
+        filters.append(MaintenanceRecord.completed_date.is_(None))
+        if maintenance_status == "overdue":
+            filters.append(MaintenanceRecord.scheduled_date < func.current_date())
+    for column, low, high in (
+        (MaintenanceRecord.scheduled_date, scheduled_from, scheduled_to),
+        (MaintenanceRecord.completed_date, completed_from, completed_to),
+    ):
+        if low is not None:
+            filters.append(column >= low)
+        if high is not None:
+            filters.append(column <= high)
+    return filters
+
+add_crud_routes(
+    router,
+    path="/maintenance",
+    model=MaintenanceRecord,
+    create_schema=MaintenanceRecordCreate,
+    update_schema=MaintenanceRecordUpdate,
+    response_schema=MaintenanceRecordResponse,
+    name="maintenance_record",
+    plural="maintenance_records",
+    label="Maintenance Record",
+    list_filters=maintenance_record_filters,
+)
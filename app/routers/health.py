@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 
-router = APIRouter()
+from app.core.timing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/healthhh", tags=["Health Check"])
 def health_check():
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app.core.auth_dependencies import get_current_user, get_current_admin_user
+from app.core.timing import TimedRoute
 from app.models.models import User
 from app.db.base import get_db
 from app.schemas.auth import UserResponse
 
 router = APIRouter(
     prefix="/user",
-    tags=["User"]
+    tags=["User"],
+    route_class=TimedRoute
 )
 
 @router.get("/profile", response_model=UserResponse, summary="Get user profile")
@@ -9,6 +9,24 @@ class PaginationParams(BaseModel):
     skip: int = 0
     limit: int = 100
 
+# Upper bound for bulk requests. Keeps a multi-row INSERT of the widest
+# schema below PostgreSQL's limit of 65535 bind parameters.
+MAX_BULK_ITEMS = 5000
+
+class BulkIds(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkDeleteRequest(BulkIds):
+    pass
+
+class BulkDeleteResponse(BaseModel):
+    deleted: int
+
+class KeysetParams(BaseModel):
+    # Primary key of the last row of the previous page
+    after: Optional[int] = None
+    limit: int = Field(100, ge=1, le=1000)
+
 # --- Solar Farm Schemas ---
 
 class SolarFarmBase(BaseModel):
@@ -35,6 +53,15 @@ class SolarFarmResponse(SolarFarmBase):
     class Config:
         from_attributes = True
 
+class SolarFarmSearchParams(BaseModel):
+    operational_status: Optional[str] = None
+    lease_end_from: Optional[date] = None
+    lease_end_to: Optional[date] = None
+
+class SolarFarmSearchPage(BaseModel):
+    items: List[SolarFarmResponse]
+    next_after: Optional[int] = None
+
 # --- Solar Panel Schemas ---
 
 class SolarPanelBase(BaseModel):
@@ -62,6 +89,22 @@ class SolarPanelResponse(SolarPanelBase):
     class Config:
         from_attributes = True
 
+class SolarPanelSearchParams(BaseModel):
+    farm_id: Optional[int] = None
+    panel_status: Optional[str] = None
+    manufacturer: Optional[str] = None
+    model: Optional[str] = None
+    capacity_min: Optional[Decimal] = None
+    capacity_max: Optional[Decimal] = None
+    installed_from: Optional[date] = None
+    installed_to: Optional[date] = None
+    warranty_from: Optional[date] = None
+    warranty_to: Optional[date] = None
+
+class SolarPanelSearchPage(BaseModel):
+    items: List[SolarPanelResponse]
+    next_after: Optional[int] = None
+
 # --- Panel Ownership Schemas ---
 
 class PanelOwnershipBase(BaseModel):
@@ -182,6 +225,30 @@ class MaintenanceRecordResponse(MaintenanceRecordBase):
     class Config:
         from_attributes = True
 
+class MaintenanceRecordSearchHit(MaintenanceRecordResponse):
+    rank: float
+    snippet: Optional[str] = Field(
+        None,
+        description="Matching fragments of the description as HTML, with terms wrapped in <mark>. "
+                    "The description is HTML-escaped first, so the snippet is safe to render as is.",
+    )
+
+class MaintenanceSchedule(BaseModel):
+    maintenance_type: str = Field(..., max_length=50)
+    scheduled_date: date
+    description: Optional[str] = None
+    # Panels: every panel matching all given criteria
+    farm_id: Optional[int] = None
+    panel_ids: Optional[List[int]] = Field(None, min_length=1, max_length=MAX_BULK_ITEMS)
+    panel_status: Optional[str] = None
+    manufacturer: Optional[str] = None
+    model: Optional[str] = None
+    # Leave out panels that already have uncompleted maintenance of this type
+    skip_pending: bool = True
+
+class MaintenanceScheduleResponse(BaseModel):
+    scheduled: int
+
 # --- Transaction Schemas ---
 
 class TransactionBase(BaseModel):
@@ -207,6 +274,14 @@ class TransactionResponse(TransactionBase):
     class Config:
         from_attributes = True
 
+class LedgerBalance(BaseModel):
+    customer_id: int
+    transactions_total: Decimal
+    credits_total: Decimal
+    balance: Decimal
+    # When the snapshot the totals start from was taken; None if summed in full
+    snapshot_at: Optional[datetime] = None
+
 # --- Notification Schemas ---
 
 class NotificationBase(BaseModel):
@@ -229,3 +304,38 @@ class NotificationResponse(NotificationBase):
 
     class Config:
         from_attributes = True
+
+class NotificationSearchHit(NotificationResponse):
+    rank: float
+    snippet: Optional[str] = Field(
+        None,
+        description="Matching fragments of the message as HTML, with terms wrapped in <mark>. "
+                    "The message is HTML-escaped first, so the snippet is safe to render as is.",
+    )
+
+class NotificationFanOut(BaseModel):
+    notification_type: Optional[str] = None
+    title: Optional[str] = None
+    message: str
+    priority: Optional[str] = None
+    # Recipients: owners of panels matching all given criteria
+    farm_id: Optional[int] = None
+    panel_ids: Optional[List[int]] = Field(None, min_length=1, max_length=MAX_BULK_ITEMS)
+    ownership_type: Optional[str] = None
+    ownership_status: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+
+class NotificationFanOutResponse(BaseModel):
+    recipients: int
+
+class NotificationUnreadCount(BaseModel):
+    unread: int
+
+class NotificationMarkRead(BaseModel):
+    # Without bounds every unread notification of the caller is marked read
+    up_to_id: Optional[int] = None
+    before: Optional[datetime] = None
+
+class NotificationMarkReadResponse(BaseModel):
+    updated: int
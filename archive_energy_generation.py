@@ -0,0 +1,49 @@
+"""
+Script to move old energy generation readings into compressed archive files.
+
+Every whole panel-month older than ENERGY_ARCHIVE_AFTER_DAYS is written to
+ENERGY_ARCHIVE_DIR and deleted from the database (see app/db/archive.py).
+Archived readings are still returned by GET /energy/generation/.
+"""
+import argparse
+from datetime import datetime, timezone
+
+from app.db.archive import ENERGY_ARCHIVE_DIR, archive_cutoff, archive_energy_generation
+from app.db.base import SessionLocal
+
+
+def archive_old_readings(cutoff):
+    """Archive every panel-month of readings before `cutoff`."""
+    db = SessionLocal()
+
+    try:
+        print("=" * 60)
+        print("Archiving energy generation readings")
+        print("=" * 60)
+        print(f"\nBefore: {cutoff.isoformat()}")
+        print(f"Into:   {ENERGY_ARCHIVE_DIR.resolve()}\n")
+
+        def progress(panel_id, month, rows):
+            print(f"  ... panel {panel_id}, {month:%Y-%m}: {rows} readings")
+
+        panel_months, rows = archive_energy_generation(db, cutoff, progress)
+
+        print("\n" + "=" * 60)
+        print(f"Archived {rows} readings in {panel_months} panel-months")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\nError occurred: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--before", type=datetime.fromisoformat,
+                        help="archive months before this date, e.g. 2024-01-01 (default: from ENERGY_ARCHIVE_AFTER_DAYS)")
+    args = parser.parse_args()
+
+    cutoff = args.before.replace(tzinfo=args.before.tzinfo or timezone.utc) if args.before else archive_cutoff()
+    archive_old_readings(cutoff)
@@ -0,0 +1,58 @@
+"""
+Benchmark the CPU-vs-bandwidth trade-off of response compression.
+
+Compresses a typical 1,000-row list page with every available coding at a
+range of levels and reports compressed size, ratio and compression time.
+Use the output to pick COMPRESSION_LEVEL_GZIP / _ZSTD / _BROTLI.
+
+Usage:
+    python benchmarks/compression.py [--rows 1000] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.compression import COMPRESSORS, create_compressor
+from app.core.serialization import encode_rows, response_fields
+from app.schemas.schemas import EnergyGenerationResponse
+from benchmarks.serialization import build_rows
+
+LEVELS = {
+    "gzip": [1, 6, 9],
+    "zstd": [1, 3, 9, 19],
+    "br": [1, 4, 9, 11],
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = encode_rows(response_fields(EnergyGenerationResponse), build_rows(args.rows))
+    print(f"payload: {args.rows} rows, {len(payload)} bytes uncompressed")
+    print(f"{'coding':<8}{'level':>6}{'bytes':>10}{'ratio':>8}{'ms':>9}{'MB/s':>9}")
+
+    for encoding in COMPRESSORS:
+        for level in LEVELS[encoding]:
+            compressed = create_compressor(encoding, level).finish(payload)
+            seconds = min(timeit.repeat(
+                lambda: create_compressor(encoding, level).finish(payload),
+                number=1,
+                repeat=args.repeat,
+            ))
+            print(
+                f"{encoding:<8}{level:>6}{len(compressed):>10}"
+                f"{len(payload) / len(compressed):>8.1f}"
+                f"{seconds * 1000:>9.2f}"
+                f"{len(payload) / seconds / 1e6:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Index advisor and query plan regression check.
+
+Drives every GET route of the API in-process against a seeded PostgreSQL
+database, captures each SELECT the routers issue and runs it again under
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). The check fails when:
+
+- a sequential scan reads more than --seq-scan-rows rows. An index on the
+  filtered or joined columns is suggested for it
+- a query's plan shape (node types, relations and indexes) differs from
+  the baseline, or it touches more than --buffer-factor times the baseline
+  shared buffers
+- a query is not in the baseline, or there is no baseline at all
+
+Point DATABASE_URL at a throwaway database migrated with `alembic upgrade head`.
+Seeding only inserts into empty tables. The baseline, query_plans.json next
+to this script, is committed: record it with --seed --update-baseline at the
+default scale, and rerun that whenever a change adds queries or changes
+plans on purpose.
+
+Usage:
+    python benchmarks/query_plans.py --seed [--scale 1]   # seed empty tables, then check
+    python benchmarks/query_plans.py                      # check against the baseline
+    python benchmarks/query_plans.py --update-baseline    # accept the current plans
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Every request must reach the database: no response cache, no replica
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["REPLICA_DATABASE_URL"] = ""
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.db.base import engine
+from app.main import app
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plans.json")
+DEV_API_KEY = "dev_api_key_123"
+
+# Row counts at --scale 1
+SEED_ROWS = {
+    "users": 1_000,
+    "solar_farms": 50,
+    "solar_panels": 20_000,
+    "panel_ownership": 20_000,
+    "energy_generation": 500_000,
+    "customer_consumption": 12_000,
+    "energy_credits": 12_000,
+    "maintenance_records": 10_000,
+    "transactions": 50_000,
+    "notifications": 50_000,
+}
+
+SEED_SQL = {
+    "users": """
+        INSERT INTO users (id, username, email, hashed_password, is_admin, is_active)
+        SELECT i, 'user' || i, 'user' || i || '@example.com', 'x', i = 1, true
+        FROM generate_series(1, :n) AS i
+    """,
+    "solar_farms": """
+        INSERT INTO solar_farms (farm_id, farm_name, operational_status)
+        SELECT i, 'Farm ' || i, 'active' FROM generate_series(1, :n) AS i
+    """,
+    "solar_panels": """
+        INSERT INTO solar_panels (panel_id, farm_id, panel_serial_number, manufacturer, panel_status, warranty_expiry_date)
+        SELECT i, i % :farms + 1, 'SN-' || i, 'Acme', 'active', date '2030-01-01' + i % 3650
+        FROM generate_series(1, :n) AS i
+    """,
+    "panel_ownership": """
+        INSERT INTO panel_ownership (ownership_id, customer_id, panel_id, ownership_type, ownership_status)
+        SELECT i, i % :users + 1, i % :panels + 1, 'purchase', 'active'
+        FROM generate_series(1, :n) AS i
+    """,
+    "energy_generation": """
+        INSERT INTO energy_generation (generation_id, panel_id, timestamp, energy_generated_kwh)
+        SELECT i, i % :panels + 1, timestamptz '2024-01-01' + (i / :panels) * interval '15 minutes', (i % 97) / 10.0
+        FROM generate_series(1, :n) AS i
+    """,
+    "customer_consumption": """
+        INSERT INTO customer_consumption (consumption_id, customer_id, month, energy_consumed_kwh)
+        SELECT i, i % :users + 1, date '2024-01-01' + (i / :users) * interval '1 month', i % 500
+        FROM generate_series(1, :n) AS i
+    """,
+    "energy_credits": """
+        INSERT INTO energy_credits (credit_id, customer_id, billing_period_start, billing_period_end, net_amount)
+        SELECT i, i % :users + 1, date '2024-01-01' + (i / :users) * interval '1 month',
+               date '2024-01-28' + (i / :users) * interval '1 month', i % 100
+        FROM generate_series(1, :n) AS i
+    """,
+    "maintenance_records": """
+        INSERT INTO maintenance_records (maintenance_id, panel_id, farm_id, maintenance_type, scheduled_date, description)
+        SELECT i, i % :panels + 1, i % :farms + 1, 'inspection', date '2024-01-01' + i % 1000, 'Routine inspection ' || i
+        FROM generate_series(1, :n) AS i
+    """,
+    "transactions": """
+        INSERT INTO transactions (transaction_id, customer_id, transaction_type, amount, transaction_date, payment_status)
+        SELECT i, i % :users + 1, 'purchase', i % 1000, timestamptz '2024-01-01' + i * interval '10 minutes', 'completed'
+        FROM generate_series(1, :n) AS i
+    """,
+    "notifications": """
+        INSERT INTO notifications (notification_id, customer_id, notification_type, title, message, is_read)
+        SELECT i, i % :users + 1, 'info', 'Notice ' || i, 'Message ' || i, i % 3 = 0
+        FROM generate_series(1, :n) AS i
+    """,
+}
+
+# Query string variants requested in addition to the plain GET of every route
+EXTRA_REQUESTS = [
+    "/farms/panels/?farm_id=1",
+    "/farms/?include=panels:5,panels.ownerships:2,maintenance_records:5",
+    "/customers/transactions/?count=exact",
+    "/energy/generation/?count=exact",
+    "/farms/panels/search?manufacturer=Acme&warranty_from=2030-01-01&warranty_to=2030-03-31",
+    "/farms/panels/search?panel_status=active&after=10000",
+    "/farms/search?operational_status=active&lease_end_from=2030-01-01",
+    "/farms/maintenance/search?q=routine%20inspection",
+    "/customers/notifications/search?q=message",
+]
+
+# Long-lived event streams never finish under the test client
+SKIPPED_PATHS = {"/customers/notifications/stream"}
+
+
+def seed(scale: float) -> None:
+    """Fill empty tables with synthetic rows and refresh planner statistics."""
+    counts = {table: max(1, int(rows * scale)) for table, rows in SEED_ROWS.items()}
+    sizes = {"users": counts["users"], "farms": counts["solar_farms"], "panels": counts["solar_panels"]}
+    with engine.begin() as conn:
+        for table, sql in SEED_SQL.items():
+            if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {table})")).scalar():
+                print(f"  {table}: not empty, skipped")
+                continue
+            params = {name: value for name, value in sizes.items() if f":{name}" in sql}
+            conn.execute(text(sql), {"n": counts[table], **params})
+            # Keep serial sequences ahead of the explicit ids
+            pk = conn.execute(text(
+                "SELECT a.attname FROM pg_index i JOIN pg_attribute a "
+                "ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0] "
+                "WHERE i.indrelid = to_regclass(:table) AND i.indisprimary"
+            ), {"table": table}).scalar()
+            conn.execute(text(f"SELECT setval(pg_get_serial_sequence(:table, :pk), (SELECT max({pk}) FROM {table}))"),
+                         {"table": table, "pk": pk})
+            print(f"  {table}: {counts[table]} rows")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def workload() -> List[str]:
+    """Paths of every documented GET route, with path parameters set to 1, plus the extra variants."""
+    paths = [
+        re.sub(r"\{[^}]+\}", "1", path)
+        for path, operations in app.openapi()["paths"].items()
+        if "get" in operations and path not in SKIPPED_PATHS
+    ]
+    return sorted(paths) + EXTRA_REQUESTS
+
+
+def capture_queries(paths: List[str]) -> List[Tuple[str, str, Any]]:
+    """Request every path and record the SELECT statements it issued."""
+    captured: List[Tuple[str, str, Any]] = []
+    current = {"label": None}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if current["label"] and not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((current["label"], statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        client = TestClient(app, headers={"X-API-Key": DEV_API_KEY})
+        for path in paths:
+            current["label"] = f"GET {path}"
+            response = client.get(path)
+            if response.status_code >= 400:
+                print(f"  warning: GET {path} returned {response.status_code}")
+    finally:
+        current["label"] = None
+        event.remove(engine, "before_cursor_execute", record)
+
+    unique, seen = [], set()
+    for label, statement, parameters in captured:
+        key = (label, statement, repr(parameters))
+        if key not in seen:
+            seen.add(key)
+            unique.append((label, statement, parameters))
+    return unique
+
+
+def explain(statement: str, parameters: Any) -> Dict[str, Any]:
+    """Run `statement` under EXPLAIN (ANALYZE, BUFFERS) and return the root plan node."""
+    with engine.connect() as conn:
+        result = conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+        plan = result.scalar()
+        conn.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def walk(node: Dict[str, Any], parent: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    yield node, parent
+    for child in node.get("Plans", []):
+        yield from walk(child, node)
+
+
+def plan_shape(node: Dict[str, Any]) -> list:
+    """Node types, relations and indexes of a plan, without costs or timings."""
+    return [
+        node["Node Type"],
+        node.get("Relation Name"),
+        node.get("Index Name"),
+        [plan_shape(child) for child in node.get("Plans", [])],
+    ]
+
+
+def shared_buffers(node: Dict[str, Any]) -> int:
+    # Buffer counts of a node include those of its children
+    return node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0)
+
+
+def rows_scanned(node: Dict[str, Any]) -> int:
+    return int((node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * node.get("Actual Loops", 1))
+
+
+def suggested_columns(node: Dict[str, Any], parent: Optional[Dict[str, Any]]) -> List[str]:
+    """Columns of a scanned relation that its filter or join condition compares."""
+    columns = re.findall(r"\(+(\w+)\)?(?:::[\w ]+)?\s*(?:=|<>|<=|>=|<|>|~~)", node.get("Filter", ""))
+    if not columns and parent is not None:
+        condition = parent.get("Hash Cond") or parent.get("Merge Cond") or parent.get("Join Filter") or ""
+        alias = node.get("Alias", node.get("Relation Name"))
+        columns = [column for table, column in re.findall(r"(\w+)\.(\w+)", condition) if table == alias]
+    return list(dict.fromkeys(columns))
+
+
+def query_key(label: str, statement: str) -> str:
+    return f"{label} | {hashlib.sha1(statement.encode()).hexdigest()[:12]}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="Seed empty tables before checking")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the seeded row counts")
+    parser.add_argument("--seq-scan-rows", type=int, default=10_000, help="Largest sequential scan allowed")
+    parser.add_argument("--buffer-factor", type=float, default=2.0, help="Allowed growth of shared buffers")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the current plans as the baseline")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print("DATABASE_URL must point at a PostgreSQL database")
+        return 2
+
+    if args.seed:
+        print("Seeding:")
+        seed(args.scale)
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif not args.update_baseline:
+        print(f"No baseline at {args.baseline}; record one with --seed --update-baseline and commit it")
+        return 2
+
+    queries = capture_queries(workload())
+
+    failures: List[str] = []
+    current: Dict[str, Any] = {}
+    for label, statement, parameters in queries:
+        key = query_key(label, statement)
+        plan = explain(statement, parameters)
+        entry = {
+            "shape": plan_shape(plan),
+            "buffers": shared_buffers(plan),
+            "ms": round(plan.get("Actual Total Time", 0.0), 3),
+            "sql": " ".join(statement.split()),
+        }
+        current[key] = entry
+        print(f"{key}: {entry['ms']} ms, {entry['buffers']} buffers")
+
+        for node, parent in walk(plan):
+            if node["Node Type"] == "Seq Scan" and rows_scanned(node) > args.seq_scan_rows:
+                relation = node["Relation Name"]
+                columns = suggested_columns(node, parent)
+                advice = (
+                    f"CREATE INDEX CONCURRENTLY ix_{relation}_{'_'.join(columns)} ON {relation} ({', '.join(columns)})"
+                    if columns else "no filter or join column found; paginate or restrict the query"
+                )
+                failures.append(f"{key}: seq scan of {relation} read {rows_scanned(node)} rows. Suggested: {advice}")
+
+        if args.update_baseline:
+            continue
+        previous = baseline.get(key)
+        if previous is None:
+            failures.append(f"{key}: not in the baseline; rerun with --update-baseline to record it")
+            continue
+        if previous["shape"] != entry["shape"]:
+            failures.append(f"{key}: plan changed from {previous['shape']} to {entry['shape']}")
+        elif entry["buffers"] > max(previous["buffers"] * args.buffer_factor, previous["buffers"] + 8):
+            failures.append(f"{key}: shared buffers grew from {previous['buffers']} to {entry['buffers']}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline} ({len(current)} queries)")
+
+    if failures:
+        print(f"\n{len(failures)} problem(s):")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\nNo sequential scans above the threshold and no plan regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Benchmark the fast list serialization path against the default one.
+
+The default path mirrors what FastAPI does for `response_model=List[...]`:
+validate each ORM object into the response schema, dump it in JSON mode and
+render it with the standard library encoder. The fast path encodes column
+tuples directly with orjson.
+
+Usage:
+    python benchmarks/serialization.py [--rows 1000] [--repeat 50]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import List
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+
+from app.core.serialization import encode_rows, response_fields
+from app.schemas.schemas import EnergyGenerationResponse
+
+
+def build_rows(count: int) -> List[tuple]:
+    """Build synthetic energy generation rows in response field order."""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        timestamp = start + timedelta(minutes=15 * i)
+        rows.append((
+            i % 500 + 1,                                   # panel_id
+            timestamp,                                     # timestamp
+            Decimal(f"{(i % 97) / 10:.4f}"),               # energy_generated_kwh
+            Decimal(f"{230 + i % 7}.{i % 100:02d}"),       # voltage
+            Decimal(f"{i % 13}.{i % 100:02d}"),            # current
+            None if i % 10 == 0 else Decimal("18.75"),     # efficiency_percentage
+            i + 1,                                         # generation_id
+            timestamp + timedelta(seconds=3, microseconds=i),  # created_at
+        ))
+    return rows
+
+
+def default_encode(adapter: TypeAdapter, objects: list) -> bytes:
+    items = adapter.validate_python(objects, from_attributes=True)
+    content = adapter.dump_python(items, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    names = response_fields(EnergyGenerationResponse)
+    rows = build_rows(args.rows)
+    objects = [SimpleNamespace(**dict(zip(names, row))) for row in rows]
+    adapter = TypeAdapter(List[EnergyGenerationResponse])
+
+    default_bytes = default_encode(adapter, objects)
+    fast_bytes = encode_rows(names, rows)
+    assert fast_bytes == default_bytes, "fast path output differs from the default path"
+
+    default_time = min(timeit.repeat(lambda: default_encode(adapter, objects), number=1, repeat=args.repeat))
+    fast_time = min(timeit.repeat(lambda: encode_rows(names, rows), number=1, repeat=args.repeat))
+
+    print(f"rows: {args.rows}, payload: {len(fast_bytes)} bytes (outputs identical)")
+    print(f"default (pydantic + json): {default_time * 1000:8.3f} ms")
+    print(f"fast (tuples + orjson):    {fast_time * 1000:8.3f} ms")
+    print(f"speedup:                   {default_time / fast_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Script to generate monthly customer statements as files.
+
+Writes one CSV or JSON statement per customer with activity in the month,
+as statements/<YYYY-MM>/customer_<id>.<format> by default (see
+app/core/statements.py). Every customer's entries are read through one
+server-side cursor, and several files are written in parallel.
+"""
+import argparse
+import os
+from datetime import date, timedelta
+
+from app.core.statements import STATEMENT_FORMATS, STATEMENT_WORKERS, month_period, write_statements
+from app.db.base import SessionLocal
+
+
+def generate_statements(month, fmt, output_dir, customer_id, workers):
+    """Write the statements of `month` to `output_dir`."""
+    db = SessionLocal()
+    start, end = month_period(month)
+
+    try:
+        print("=" * 60)
+        print(f"Statements for {month} ({fmt}) into {output_dir}")
+        print("=" * 60)
+
+        def progress(statement_customer, entries):
+            print(f"  - customer {statement_customer}: {entries} entries")
+
+        statements, entries = write_statements(
+            db, start, end, fmt, output_dir, customer_id=customer_id, workers=workers, progress=progress,
+        )
+        print(f"\nWrote {statements} statements with {entries} entries")
+
+    except Exception as e:
+        print(f"\nError occurred: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    last_month = (date.today().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--month", default=last_month, help=f"statement month as YYYY-MM (default: {last_month})")
+    parser.add_argument("--format", choices=STATEMENT_FORMATS, default="csv", help="statement file format")
+    parser.add_argument("--output-dir", help="directory for the files (default: statements/<month>)")
+    parser.add_argument("--customer-id", type=int, help="only this customer's statement")
+    parser.add_argument("--workers", type=int, default=STATEMENT_WORKERS, help="files written in parallel")
+    args = parser.parse_args()
+
+    generate_statements(
+        args.month, args.format, args.output_dir or os.path.join("statements", args.month),
+        args.customer_id, args.workers,
+    )
@@ -0,0 +1,50 @@
+"""
+Script to pack energy generation readings into one row per panel-day.
+
+Every UTC day older than ENERGY_PACK_AFTER_DAYS is moved from
+energy_generation into energy_generation_days (see app/db/packed.py).
+Requires ENERGY_PACKED_STORAGE=true, so that the API returns packed readings.
+"""
+import argparse
+from datetime import date
+
+from app.db.base import SessionLocal
+from app.db.packed import ENERGY_PACKED_STORAGE, pack_cutoff, pack_energy_generation
+
+
+def pack_old_readings(cutoff):
+    """Pack every panel-day of readings before `cutoff`."""
+    db = SessionLocal()
+
+    try:
+        print("=" * 60)
+        print("Packing energy generation readings")
+        print("=" * 60)
+        print(f"\nBefore: {cutoff.isoformat()}\n")
+
+        def progress(panel_id, day, rows):
+            print(f"  ... panel {panel_id}, {day.isoformat()}: {rows} readings")
+
+        panel_days, rows = pack_energy_generation(db, cutoff, progress)
+
+        print("\n" + "=" * 60)
+        print(f"Packed {rows} readings into {panel_days} panel-days")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\nError occurred: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--before", type=date.fromisoformat,
+                        help="pack days before this date, e.g. 2024-01-01 (default: from ENERGY_PACK_AFTER_DAYS)")
+    args = parser.parse_args()
+
+    if not ENERGY_PACKED_STORAGE:
+        print("[X] Packed storage is disabled. Set ENERGY_PACKED_STORAGE=true first.")
+    else:
+        pack_old_readings(args.before or pack_cutoff())
@@ -0,0 +1,81 @@
+"""
+Script to purge expired notifications and energy generation readings.
+
+Retention periods are configured per table (see app/db/retention.py).
+Rows are deleted in small batches with a pause in between, so the purge
+can run next to live traffic. Run with --dry-run first to see its impact.
+"""
+import argparse
+
+from app.db.base import SessionLocal
+from app.db.retention import (
+    RETENTION_BATCH_SIZE,
+    RETENTION_PAUSE_SECONDS,
+    RETENTION_POLICIES,
+    estimate_purge,
+    purge,
+)
+
+
+def format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def purge_expired_data(tables, batch_size, pause_seconds, dry_run):
+    """Apply the retention policy of every table in `tables`."""
+    db = SessionLocal()
+
+    try:
+        print("=" * 60)
+        print("Retention purge (dry run)" if dry_run else "Retention purge")
+        print("=" * 60)
+
+        for name in tables:
+            policy = RETENTION_POLICIES[name]
+            print(f"\n{name}: older than {policy.retain_days} days")
+            if policy.expired(policy.cutoff()) is None:
+                print("  - Skipped: no completed archive run yet (see ARCHIVE_BEFORE_PURGE)")
+                continue
+
+            if dry_run:
+                report = estimate_purge(db, policy, batch_size)
+                pause = max(report.batches - 1, 0) * pause_seconds
+                print(f"  - Cutoff: {report.cutoff.isoformat()}")
+                print(f"  - Rows to delete (estimate): {report.rows}")
+                print(f"  - Space to reclaim (estimate): {format_bytes(report.bytes_estimate)}")
+                print(f"  - Batches: {report.batches} ({pause:.0f}s of pauses)")
+                continue
+
+            def progress(batch_rows, total_rows):
+                print(f"  ... deleted {batch_rows} rows ({total_rows} total)")
+
+            report = purge(db, policy, batch_size, pause_seconds, progress)
+            print(f"  - Rows deleted: {report.rows} in {report.batches} batches, {report.seconds:.1f}s")
+            if report.skipped_rows:
+                print(f"  - Rows skipped (locked by other transactions): {report.skipped_rows}")
+            print(f"  - Space reclaimed (estimate): {format_bytes(report.bytes_estimate)}")
+
+        if not dry_run:
+            print("\nFreed space is reused by new rows once autovacuum has processed the tables.")
+
+    except Exception as e:
+        print(f"\nError occurred: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", action="append", choices=sorted(RETENTION_POLICIES),
+                        help="table to purge; repeat for several (default: all)")
+    parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE, help="rows deleted per batch")
+    parser.add_argument("--pause", type=float, default=RETENTION_PAUSE_SECONDS, help="seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="only estimate the rows and space affected")
+    args = parser.parse_args()
+
+    purge_expired_data(args.table or list(RETENTION_POLICIES), args.batch_size, args.pause, args.dry_run)
@@ -0,0 +1,43 @@
+"""
+Script to notify customers and admins of upcoming expiries.
+
+Covers panel warranties, panel leases and farm land leases ending within
+EXPIRY_NOTICE_DAYS (see app/core/expiry.py). Run it daily; each run only
+notifies the expiries in the notice window that were not notified before.
+"""
+import argparse
+
+from app.core.expiry import EXPIRY_NOTICE_DAYS, EXPIRY_SCANS, scan_expiries
+from app.db.base import SessionLocal
+
+
+def run_expiry_scans(scans, dry_run):
+    """Run every expiry scan in `scans`."""
+    db = SessionLocal()
+
+    try:
+        print("=" * 60)
+        print(f"Expiry scan, {EXPIRY_NOTICE_DAYS} days ahead" + (" (dry run)" if dry_run else ""))
+        print("=" * 60)
+
+        for name in scans:
+            result = scan_expiries(db, EXPIRY_SCANS[name], dry_run=dry_run)
+            action = "would notify" if dry_run else "notified"
+            print(f"\n{name}: expiries from {result.start.isoformat()} through {result.through.isoformat()}")
+            print(f"  - {action}: {result.notified}")
+
+    except Exception as e:
+        print(f"\nError occurred: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scan", action="append", choices=sorted(EXPIRY_SCANS),
+                        help="scan to run; repeat for several (default: all)")
+    parser.add_argument("--dry-run", action="store_true", help="only count the notifications, without sending them")
+    args = parser.parse_args()
+
+    run_expiry_scans(args.scan or list(EXPIRY_SCANS), args.dry_run)
@@ -0,0 +1,38 @@
+"""
+Script to advance the customer ledger snapshots.
+
+Balances are read as each customer's snapshot plus their transactions and
+energy credits since it (see app/core/ledger.py). Run this periodically,
+e.g. hourly, so that the rows summed on every read stay few.
+"""
+import argparse
+
+from app.core.ledger import LEDGER_SNAPSHOT_LAG_SECONDS, take_ledger_snapshots
+from app.db.base import SessionLocal
+
+
+def snapshot_ledgers():
+    """Create missing ledger snapshots and advance the others."""
+    db = SessionLocal()
+
+    try:
+        print("=" * 60)
+        print(f"Ledger snapshots, covering rows older than {LEDGER_SNAPSHOT_LAG_SECONDS}s")
+        print("=" * 60)
+
+        created, advanced = take_ledger_snapshots(db)
+        print(f"\n  - snapshots created: {created}")
+        print(f"  - snapshots advanced: {advanced}")
+
+    except Exception as e:
+        print(f"\nError occurred: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    snapshot_ledgers()
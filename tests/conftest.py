@@ -0,0 +1,135 @@
+"""
+Fixtures for tests of the generic CRUD layer.
+
+The tests run against a SQLite file instead of PostgreSQL: the engine is
+configured from DATABASE_URL when app.db.base is imported, so the
+environment is set up before any app module is.
+"""
+import os
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="crud-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.sqlite')}"
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["REPLICA_DATABASE_URL"] = ""
+
+from typing import Any, List, Optional
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+
+from app.core import cache, idempotency
+from app.core.auth_dependencies import get_current_admin_user, get_current_user
+from app.db.base import Base, SessionLocal, engine
+from app.models.models import SolarFarm, SolarPanel, Transaction, User
+from app.routers.crud import add_crud_routes
+from app.schemas.schemas import (
+    SolarPanelCreate, SolarPanelResponse, SolarPanelUpdate,
+    TransactionCreate, TransactionResponse, TransactionUpdate,
+)
+
+
+@compiles(TSVECTOR, "sqlite")
+def _compile_tsvector(type_, compiler, **kw):
+    return "TEXT"
+
+
+# Generated tsvector columns are PostgreSQL only
+for _table in Base.metadata.tables.values():
+    if "search_vector" in _table.c:
+        _table.c.search_vector.computed = None
+        _table.c.search_vector.server_default = None
+
+
+class ModifyRecorder:
+    """`on_modify` hook remembering the primary keys it was called with."""
+
+    def __init__(self):
+        self.calls: List[List[Any]] = []
+
+    def __call__(self, db, pk_values: List[Any]) -> None:
+        self.calls.append(list(pk_values))
+
+
+def panel_filters(farm_id: Optional[int] = None) -> list:
+    return [SolarPanel.farm_id == farm_id] if farm_id else []
+
+
+@pytest.fixture
+def db_setup():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.add_all([
+        User(id=1, username="admin", email="admin@example.com", hashed_password="x", is_admin=True, is_active=True),
+        User(id=2, username="customer", email="customer@example.com", hashed_password="x", is_active=True),
+        SolarFarm(farm_id=1, farm_name="North"),
+        SolarFarm(farm_id=2, farm_name="South"),
+    ])
+    db.commit()
+    db.close()
+    yield
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def current_user():
+    """The caller of every request; tests switch it by assigning `current_user["id"]`."""
+    return {"id": 1}
+
+
+@pytest.fixture
+def recorder():
+    return ModifyRecorder()
+
+
+@pytest.fixture
+def client(db_setup, current_user, recorder, monkeypatch):
+    monkeypatch.setattr(cache, "response_cache", cache.LRUCacheBackend(max_entries=100))
+    monkeypatch.setattr(idempotency, "_hot_cache", cache.LRUCacheBackend(max_entries=100))
+
+    router = APIRouter()
+    add_crud_routes(
+        router,
+        path="/panels",
+        model=SolarPanel,
+        create_schema=SolarPanelCreate,
+        update_schema=SolarPanelUpdate,
+        response_schema=SolarPanelResponse,
+        name="solar_panel",
+        plural="solar_panels",
+        label="Solar Panel",
+        list_filters=panel_filters,
+        cache_ttl=60,
+        cache_partition="farm_id",
+    )
+    add_crud_routes(
+        router,
+        path="/transactions",
+        model=Transaction,
+        create_schema=TransactionCreate,
+        update_schema=TransactionUpdate,
+        response_schema=TransactionResponse,
+        name="transaction",
+        plural="transactions",
+        label="Transaction",
+        owner_column=Transaction.customer_id,
+        on_modify=recorder,
+        idempotent=True,
+    )
+    app = FastAPI()
+    app.include_router(router)
+
+    def caller():
+        db = SessionLocal()
+        try:
+            return db.get(User, current_user["id"])
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_current_user] = caller
+    app.dependency_overrides[get_current_admin_user] = caller
+    return TestClient(app)
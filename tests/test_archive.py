@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.db import archive
+from app.db.archive import (
+    archive_energy_generation, count_archived, find_archived, iter_archived, merge_page, panel_month_path,
+    parse_reading_cursor, read_panel_month, reading_cursor, write_panel_month,
+)
+from app.db.base import SessionLocal
+from app.db.packed import GenerationReading
+from app.db.retention import RETENTION_POLICIES, purge
+from app.models.models import EnergyGeneration, SolarPanel
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def reading(generation_id, minutes, panel_id=1, kwh=Decimal("0.5000")):
+    timestamp = START + timedelta(minutes=minutes, microseconds=7)
+    return GenerationReading(generation_id, panel_id, timestamp, kwh, None, Decimal("4.20"), None, timestamp)
+
+
+def test_cursor_round_trip():
+    row = reading(42, 15)
+    assert parse_reading_cursor(reading_cursor(row)) == (row.timestamp, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "123", "a.b", "1.2.3"])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        parse_reading_cursor(cursor)
+
+
+def test_merge_page_interleaves_tiers_in_reading_order():
+    archived = [reading(1, 0), reading(4, 30)]
+    packed = [reading(2, 10), reading(5, 40)]
+    live = [reading(3, 20), reading(6, 50)]
+    page = merge_page([archived, packed, live], skip=1, limit=3)
+    assert [row.generation_id for row in page] == [2, 3, 4]
+
+
+def test_merge_page_continues_after_the_cursor():
+    rows = [reading(generation_id, generation_id * 10) for generation_id in range(1, 7)]
+    first = merge_page([rows[::2], rows[1::2]], skip=0, limit=2)
+    after = parse_reading_cursor(reading_cursor(first[-1]))
+    second = merge_page([rows[::2], rows[1::2]], skip=0, limit=2, after=after)
+    assert [row.generation_id for row in first + second] == [1, 2, 3, 4]
+
+
+def test_merge_page_breaks_timestamp_ties_by_id():
+    tied = [reading(9, 0), reading(3, 0)]
+    page = merge_page([[tied[1]], [tied[0]]], skip=0, limit=2, after=(tied[1].timestamp, 2))
+    assert [row.generation_id for row in page] == [3, 9]
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ENERGY_ARCHIVE_DIR", tmp_path)
+    return tmp_path
+
+
+def test_panel_month_round_trip(archive_dir):
+    readings = [reading(10, 0), reading(12, 15, kwh=None), reading(11, 30)]
+    path = panel_month_path(1, START)
+    write_panel_month(path, readings)
+    assert read_panel_month(path, 1) == readings
+    header = archive.read_header(path)
+    assert (header["rows"], header["first_id"], header["last_id"]) == (3, 10, 12)
+
+
+def test_find_and_count_archived(archive_dir):
+    write_panel_month(panel_month_path(1, START), [reading(10, 0), reading(11, 60 * 24 * 20)])
+    write_panel_month(panel_month_path(2, START), [reading(20, 5, panel_id=2)])
+    months = archive.archived_months([1, 2])
+
+    assert find_archived([1, 2], 20).panel_id == 2
+    assert find_archived([1], 20) is None
+    assert find_archived([1, 2], 15) is None
+    assert count_archived(months) == 3
+    assert count_archived(months, START + timedelta(days=1)) == 1
+    assert [row.generation_id for row in iter_archived(months, end=START + timedelta(days=1))] == [10, 20]
+
+
+def test_purge_keeps_readings_inserted_after_the_archive_run(archive_dir, db_setup):
+    db = SessionLocal()
+    db.add(SolarPanel(panel_id=1, farm_id=1))
+    db.add(EnergyGeneration(generation_id=1, panel_id=1, timestamp=START))
+    db.commit()
+    archive_energy_generation(db, cutoff=START + timedelta(days=31))
+    # Uploaded late for the month that was just archived
+    db.add(EnergyGeneration(generation_id=2, panel_id=1, timestamp=START + timedelta(days=1)))
+    db.commit()
+
+    report = purge(db, RETENTION_POLICIES["energy_generation"], pause_seconds=0)
+    assert report.rows == 0
+    assert db.query(EnergyGeneration.generation_id).all() == [(2,)]
+    assert find_archived([1], 1).generation_id == 1
+    db.close()
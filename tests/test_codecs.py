@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+
+from app.core.codecs import (
+    datetimes_to_micros, decode_deltas, decode_scaled, encode_deltas, encode_scaled, micros_to_datetimes,
+)
+
+
+def test_deltas_round_trip_in_the_narrowest_type():
+    values = [1000, 1001, 1003, 1003, 900]
+    encoded = encode_deltas(values)
+    # Base value, type code, then one byte per difference
+    assert len(encoded) == 8 + 1 + 4
+    decoded, offset = decode_deltas(memoryview(encoded), 0, len(values))
+    assert decoded.tolist() == values
+    assert offset == len(encoded)
+
+
+def test_deltas_widen_for_large_gaps():
+    values = [0, 2 ** 40, -(2 ** 40), 7]
+    decoded, _ = decode_deltas(memoryview(encode_deltas(values)), 0, len(values))
+    assert decoded.tolist() == values
+
+
+def test_deltas_of_one_and_no_values():
+    assert decode_deltas(memoryview(encode_deltas([42])), 0, 1)[0].tolist() == [42]
+    assert decode_deltas(memoryview(encode_deltas([])), 0, 0)[0].tolist() == []
+
+
+def test_scaled_keeps_the_decimal_scale():
+    values = [Decimal("1.5"), Decimal("-0.01"), Decimal("123456.7891")]
+    decoded, _ = decode_scaled(memoryview(encode_scaled(values, 4)), 0, len(values), 4)
+    assert decoded == values
+    assert [value.as_tuple().exponent for value in decoded] == [-4, -4, -4]
+
+
+def test_scaled_round_trips_nulls():
+    values = [None, Decimal("99.99"), None, *[Decimal("1.00")] * 8, None]
+    encoded = encode_scaled(values, 2)
+    decoded, offset = decode_scaled(memoryview(encoded), 0, len(values), 2)
+    assert decoded == values
+    assert offset == len(encoded)
+
+
+def test_scaled_all_nulls():
+    decoded, _ = decode_scaled(memoryview(encode_scaled([None, None], 2)), 0, 2, 2)
+    assert decoded == [None, None]
+
+
+def test_columns_decode_back_to_back():
+    ids, amounts = [5, 6, 9], [Decimal("0.10"), None, Decimal("7.25")]
+    data = memoryview(encode_deltas(ids) + encode_scaled(amounts, 2))
+    decoded_ids, offset = decode_deltas(data, 0, 3)
+    decoded_amounts, end = decode_scaled(data, offset, 3, 2)
+    assert decoded_ids.tolist() == ids
+    assert decoded_amounts == amounts
+    assert end == len(data)
+
+
+def test_datetimes_keep_microseconds_and_come_back_as_utc():
+    moment = datetime(2024, 3, 31, 23, 59, 59, 999999, tzinfo=timezone.utc)
+    values = [
+        moment,
+        moment.astimezone(timezone(timedelta(hours=-5))),
+        moment.replace(tzinfo=None) + timedelta(microseconds=1),
+    ]
+    decoded = micros_to_datetimes(datetimes_to_micros(values))
+    assert decoded == [moment, moment, moment + timedelta(microseconds=1)]
+    assert all(value.tzinfo == timezone.utc for value in decoded)
+
+
+def test_datetimes_survive_delta_encoding():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    values = [start + timedelta(minutes=15 * index, microseconds=index) for index in range(100)]
+    micros = datetimes_to_micros(values)
+    decoded, _ = decode_deltas(memoryview(encode_deltas(micros)), 0, len(values))
+    assert np.array_equal(decoded, micros)
+    assert micros_to_datetimes(decoded) == values
@@ -0,0 +1,115 @@
+import zlib
+
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import PREFERRED_ENCODINGS, create_compressor, is_compressible, negotiate_encoding
+from app.core.conditional import is_not_modified
+from app.core.middleware import CompressionMiddleware
+
+BODY = b'{"rows": [' + b",".join(b'{"id": %d}' % index for index in range(200)) + b"]}"
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=bogus", None),
+    ("*", PREFERRED_ENCODINGS[0]),
+    ("*;q=0, gzip", "gzip"),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_negotiation_follows_client_weights():
+    assert negotiate_encoding("gzip;q=1.0, zstd;q=0.5, br;q=0.1") == "gzip"
+
+
+def test_server_preference_breaks_ties():
+    assert negotiate_encoding(", ".join(PREFERRED_ENCODINGS)) == PREFERRED_ENCODINGS[0]
+
+
+def test_gzip_chunks_decode_as_they_arrive():
+    compressor = create_compressor("gzip")
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Every flushed chunk is decodable without the rest of the stream
+    assert decoder.decompress(compressor.compress(b"first ")) == b"first "
+    assert decoder.decompress(compressor.finish(b"last")) == b"last"
+
+
+def test_compressible_types():
+    assert is_compressible("application/json; charset=utf-8")
+    assert not is_compressible("text/event-stream")
+    assert not is_compressible("image/png")
+
+
+def app_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, min_size=100)
+
+    @app.get("/large")
+    def large():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    def small():
+        return Response(b"{}", media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([BODY[:50], BODY[50:]]), media_type="application/json")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter([BODY]), media_type="text/event-stream")
+
+    @app.get("/conditional")
+    def conditional(request: Request):
+        return Response(status_code=304 if is_not_modified(request, '"v1"', None) else 200)
+
+    return TestClient(app)
+
+
+def test_large_body_is_compressed_with_a_weak_etag():
+    response = app_client().get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == 'W/"v1"'
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert int(response.headers["Content-Length"]) < len(BODY)
+    assert response.content == BODY
+
+
+def test_small_body_keeps_its_strong_etag():
+    response = app_client().get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"v1"'
+
+
+def test_uncompressed_without_accept_encoding():
+    response = app_client().get("/large", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"v1"'
+
+
+def test_streaming_body_is_compressed_chunk_by_chunk():
+    response = app_client().get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert response.content == BODY
+
+
+def test_event_streams_are_not_compressed():
+    response = app_client().get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_weakened_etag_still_matches():
+    response = app_client().get("/conditional", headers={"If-None-Match": 'W/"v1"'})
+    assert response.status_code == 304
+
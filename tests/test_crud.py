@@ -0,0 +1,339 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.core import cache, idempotency
+from app.db.base import SessionLocal
+from app.db.versions import table_version
+from app.models.models import SolarPanel, Transaction
+from app.routers.crud.caching import CrudCache
+
+
+def create_panel(client, **fields):
+    response = client.post("/panels/", json=fields)
+    assert response.status_code == 201
+    return response.json()
+
+
+def transaction(**fields):
+    # An explicit null would override the column's server default
+    return {"transaction_date": "2024-01-01T00:00:00Z", **fields}
+
+
+# --- Single row endpoints ---
+
+def test_create_read_update_delete(client):
+    panel = create_panel(client, farm_id=1, panel_serial_number="SN-1", panel_status="active")
+    panel_id = panel["panel_id"]
+
+    response = client.get(f"/panels/{panel_id}")
+    assert response.status_code == 200
+    assert response.json()["panel_serial_number"] == "SN-1"
+
+    response = client.put(f"/panels/{panel_id}", json={"panel_status": "retired"})
+    assert response.status_code == 200
+    assert response.json()["panel_status"] == "retired"
+    # Fields missing from the update are left alone
+    assert response.json()["panel_serial_number"] == "SN-1"
+
+    assert client.delete(f"/panels/{panel_id}").status_code == 204
+    assert client.get(f"/panels/{panel_id}").status_code == 404
+
+
+def test_missing_row_is_404(client):
+    assert client.get("/panels/999").json() == {"detail": "Solar Panel not found"}
+    assert client.put("/panels/999", json={"panel_status": "x"}).status_code == 404
+    assert client.delete("/panels/999").status_code == 404
+
+
+def test_list_filters_and_pagination(client):
+    for index in range(5):
+        create_panel(client, farm_id=1 + index % 2, panel_serial_number=f"SN-{index}")
+
+    assert len(client.get("/panels/").json()) == 5
+    assert {panel["farm_id"] for panel in client.get("/panels/?farm_id=2").json()} == {2}
+    page = client.get("/panels/?skip=1&limit=2").json()
+    assert [panel["panel_serial_number"] for panel in page] == ["SN-1", "SN-2"]
+
+
+def test_list_is_restricted_to_the_owner(client, current_user):
+    client.post("/transactions/", json=transaction(customer_id=1, amount="10.00"))
+    client.post("/transactions/", json=transaction(customer_id=2, amount="20.00"))
+
+    current_user["id"] = 2
+    assert [row["amount"] for row in client.get("/transactions/").json()] == ["20.00"]
+
+
+def test_list_fields_and_fast(client):
+    create_panel(client, farm_id=1, panel_serial_number="SN-1")
+
+    assert client.get("/panels/?fields=panel_id,panel_serial_number").json() == [
+        {"panel_id": 1, "panel_serial_number": "SN-1"}
+    ]
+    fast = client.get("/panels/?fast=true").json()
+    assert fast[0]["panel_serial_number"] == "SN-1"
+    assert set(fast[0]) == set(client.get("/panels/").json()[0])
+
+
+def test_total_count(client):
+    for index in range(3):
+        create_panel(client, farm_id=1, panel_serial_number=f"SN-{index}")
+
+    response = client.get("/panels/?count=exact&limit=1")
+    assert response.headers["X-Total-Count"] == "3"
+    assert len(response.json()) == 1
+
+
+# --- Bulk endpoints ---
+
+def test_bulk_create_update_delete(client):
+    response = client.post("/panels/bulk", json=[{"farm_id": 1}, {"farm_id": 1}, {"farm_id": 2}])
+    assert response.status_code == 201
+    ids = [panel["panel_id"] for panel in response.json()]
+    assert len(ids) == 3
+
+    response = client.patch("/panels/bulk", json={"ids": ids[:2], "changes": {"panel_status": "offline"}})
+    assert response.status_code == 200
+    assert {panel["panel_status"] for panel in response.json()} == {"offline"}
+
+    response = client.request("DELETE", "/panels/bulk", json={"ids": ids[:2]})
+    assert response.json() == {"deleted": 2}
+    assert [panel["panel_id"] for panel in client.get("/panels/").json()] == ids[2:]
+
+
+def test_bulk_create_rejects_empty_list(client):
+    assert client.post("/panels/bulk", json=[]).status_code == 422
+
+
+# --- Response cache ---
+
+def test_list_cache_hit_and_invalidation(client):
+    create_panel(client, farm_id=1, panel_serial_number="SN-1")
+
+    assert "X-Cache" not in client.get("/panels/").headers
+    response = client.get("/panels/")
+    assert response.headers["X-Cache"] == "HIT"
+
+    create_panel(client, farm_id=1, panel_serial_number="SN-2")
+    response = client.get("/panels/")
+    assert "X-Cache" not in response.headers
+    assert len(response.json()) == 2
+
+
+def test_detail_cache_invalidated_by_update(client):
+    panel_id = create_panel(client, farm_id=1, panel_status="active")["panel_id"]
+    client.get(f"/panels/{panel_id}")
+    assert client.get(f"/panels/{panel_id}").headers["X-Cache"] == "HIT"
+
+    client.put(f"/panels/{panel_id}", json={"panel_status": "retired"})
+    response = client.get(f"/panels/{panel_id}")
+    assert "X-Cache" not in response.headers
+    assert response.json()["panel_status"] == "retired"
+
+
+def test_write_only_invalidates_its_partition(client):
+    create_panel(client, farm_id=1)
+    create_panel(client, farm_id=2)
+    for params in ("", "?farm_id=1", "?farm_id=2"):
+        client.get(f"/panels/{params}")
+
+    create_panel(client, farm_id=1)
+    assert "X-Cache" not in client.get("/panels/").headers
+    assert "X-Cache" not in client.get("/panels/?farm_id=1").headers
+    assert client.get("/panels/?farm_id=2").headers["X-Cache"] == "HIT"
+
+
+def test_moving_a_row_invalidates_the_partition_it_left(client):
+    panel_id = create_panel(client, farm_id=1)["panel_id"]
+    client.get("/panels/?farm_id=1")
+
+    client.put(f"/panels/{panel_id}", json={"farm_id": 2})
+    response = client.get("/panels/?farm_id=1")
+    assert "X-Cache" not in response.headers
+    assert response.json() == []
+
+
+def test_store_racing_a_write_is_dropped(client, monkeypatch):
+    create_panel(client, farm_id=1)
+    # The list rows are read, then a write commits and invalidates before the store
+    db = SessionLocal()
+    version_before = table_version(db, "solar_panels")[0]
+    db.close()
+    real_store = CrudCache.store
+
+    def store_after_write(self, db, key, entry, tags, version):
+        create_panel(client, farm_id=1)
+        real_store(self, db, key, entry, tags, version_before)
+
+    monkeypatch.setattr(CrudCache, "store", store_after_write)
+    assert len(client.get("/panels/").json()) == 1
+    monkeypatch.setattr(CrudCache, "store", real_store)
+
+    response = client.get("/panels/")
+    assert "X-Cache" not in response.headers
+    assert len(response.json()) == 2
+
+
+def test_uncached_model_is_never_served_from_cache(client):
+    client.post("/transactions/", json=transaction(customer_id=1))
+    client.get("/transactions/")
+    assert "X-Cache" not in client.get("/transactions/").headers
+
+
+# --- Conditional GETs ---
+
+def test_list_etag_and_not_modified(client, monkeypatch):
+    # Exercise the validators themselves, not the cached copy of them
+    monkeypatch.setattr(cache, "response_cache", cache.NullCacheBackend())
+    create_panel(client, farm_id=1)
+
+    etag = client.get("/panels/").headers["ETag"]
+    response = client.get("/panels/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    # Other query parameters select other rows
+    assert client.get("/panels/?farm_id=2", headers={"If-None-Match": etag}).status_code == 200
+
+    create_panel(client, farm_id=2)
+    response = client.get("/panels/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_every_write_changes_the_list_etag(client, monkeypatch):
+    monkeypatch.setattr(cache, "response_cache", cache.NullCacheBackend())
+    panel_id = create_panel(client, farm_id=1)["panel_id"]
+    etags = {client.get("/panels/").headers["ETag"]}
+
+    client.put(f"/panels/{panel_id}", json={"panel_status": "offline"})
+    etags.add(client.get("/panels/").headers["ETag"])
+    client.patch("/panels/bulk", json={"ids": [panel_id], "changes": {"panel_status": "active"}})
+    etags.add(client.get("/panels/").headers["ETag"])
+    client.delete(f"/panels/{panel_id}")
+    etags.add(client.get("/panels/").headers["ETag"])
+    assert len(etags) == 4
+
+
+def test_cached_list_answers_conditional_requests(client):
+    create_panel(client, farm_id=1)
+    etag = client.get("/panels/").headers["ETag"]
+    assert client.get("/panels/", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_detail_etag_and_not_modified(client, monkeypatch):
+    monkeypatch.setattr(cache, "response_cache", cache.NullCacheBackend())
+    panel_id = create_panel(client, farm_id=1)["panel_id"]
+
+    response = client.get(f"/panels/{panel_id}")
+    etag = response.headers["ETag"]
+    assert "Last-Modified" in response.headers
+    assert client.get(f"/panels/{panel_id}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/panels/999", headers={"If-None-Match": etag}).status_code == 404
+
+
+def test_model_without_updated_at_has_no_validators(client):
+    client.post("/transactions/", json=transaction(customer_id=1))
+    assert "ETag" not in client.get("/transactions/").headers
+
+
+# --- Idempotency keys ---
+
+def count_transactions() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(Transaction).count()
+    finally:
+        db.close()
+
+
+def test_idempotent_create_replays_the_first_response(client):
+    headers = {"Idempotency-Key": "payment-1"}
+    first = client.post("/transactions/", json=transaction(customer_id=1, amount="5.00"), headers=headers)
+    assert first.status_code == 201
+
+    retry = client.post("/transactions/", json=transaction(customer_id=1, amount="5.00"), headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert count_transactions() == 1
+
+
+def test_idempotent_create_replays_from_the_database(client, monkeypatch):
+    headers = {"Idempotency-Key": "payment-1"}
+    first = client.post("/transactions/", json=transaction(customer_id=1, amount="5.00"), headers=headers)
+    # As seen by another worker, or after the hot cache evicted the key
+    monkeypatch.setattr(idempotency, "_hot_cache", cache.LRUCacheBackend(max_entries=100))
+
+    retry = client.post("/transactions/", json=transaction(customer_id=1, amount="5.00"), headers=headers)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert count_transactions() == 1
+
+
+def test_idempotency_key_reused_for_another_payload(client, monkeypatch):
+    headers = {"Idempotency-Key": "payment-1"}
+    client.post("/transactions/", json=transaction(customer_id=1, amount="5.00"), headers=headers)
+    response = client.post("/transactions/", json=transaction(customer_id=1, amount="6.00"), headers=headers)
+    assert response.status_code == 422
+
+    monkeypatch.setattr(idempotency, "_hot_cache", cache.LRUCacheBackend(max_entries=100))
+    response = client.post("/transactions/", json=transaction(customer_id=1, amount="6.00"), headers=headers)
+    assert response.status_code == 422
+    assert count_transactions() == 1
+
+
+def test_idempotency_keys_are_scoped_per_user(client, current_user):
+    headers = {"Idempotency-Key": "payment-1"}
+    client.post("/transactions/", json=transaction(customer_id=1), headers=headers)
+    current_user["id"] = 2
+    response = client.post("/transactions/", json=transaction(customer_id=2), headers=headers)
+    assert "Idempotent-Replayed" not in response.headers
+    assert count_transactions() == 2
+
+
+def test_create_without_key_is_not_idempotent(client):
+    client.post("/transactions/", json=transaction(customer_id=1))
+    client.post("/transactions/", json=transaction(customer_id=1))
+    assert count_transactions() == 2
+
+
+# --- Write hooks and transactions ---
+
+def test_on_modify_sees_updates_before_and_after(client, recorder):
+    transaction_id = client.post("/transactions/", json=transaction(customer_id=1)).json()["transaction_id"]
+    assert recorder.calls == []
+
+    client.put(f"/transactions/{transaction_id}", json={"amount": "1.00"})
+    assert recorder.calls == [[transaction_id], [transaction_id]]
+
+
+def test_on_modify_runs_before_deletes(client, recorder):
+    transaction_id = client.post("/transactions/", json=transaction(customer_id=1)).json()["transaction_id"]
+    client.delete(f"/transactions/{transaction_id}")
+    assert recorder.calls == [[transaction_id]]
+
+
+def test_on_modify_runs_for_bulk_writes(client, recorder):
+    created = client.post("/transactions/bulk", json=[transaction(), transaction()])
+    ids = [row["transaction_id"] for row in created.json()]
+
+    client.patch("/transactions/bulk", json={"ids": ids, "changes": {"payment_status": "paid"}})
+    assert recorder.calls == [ids, ids]
+    client.request("DELETE", "/transactions/bulk", json={"ids": ids})
+    assert recorder.calls == [ids, ids, ids]
+
+
+def test_failed_write_commits_nothing(client):
+    create_panel(client, farm_id=1, panel_serial_number="SN-1")
+    second_id = create_panel(client, farm_id=1, panel_serial_number="SN-2")["panel_id"]
+    etag = client.get("/panels/").headers["ETag"]
+
+    # Violates the unique serial number
+    with pytest.raises(IntegrityError):
+        client.put(f"/panels/{second_id}", json={"panel_serial_number": "SN-1"})
+    db = SessionLocal()
+    try:
+        assert db.get(SolarPanel, second_id).panel_serial_number == "SN-2"
+    finally:
+        db.close()
+    # Neither the row nor the table version changed
+    assert client.get("/panels/", headers={"If-None-Match": etag}).status_code == 304
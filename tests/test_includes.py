@@ -0,0 +1,81 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app.core.includes import DEFAULT_INCLUDE_LIMIT, load_includes, parse_include, serialize_tree
+from app.db.base import SessionLocal, engine
+from app.models.models import PanelOwnership, SolarFarm, SolarPanel
+from app.routers.farms import SOLAR_FARM_INCLUDES
+from app.schemas.schemas import SolarFarmResponse
+
+
+def test_parse_nested_paths_and_limits():
+    tree = parse_include("panels:2, panels.ownerships:1,maintenance_records", SOLAR_FARM_INCLUDES)
+    assert set(tree) == {"panels", "maintenance_records"}
+    assert tree["panels"].limit == 2
+    assert tree["panels"].children["ownerships"].limit == 1
+    assert tree["maintenance_records"].limit == DEFAULT_INCLUDE_LIMIT
+
+
+def test_parse_nested_path_alone_includes_its_parents():
+    tree = parse_include("panels.ownerships", SOLAR_FARM_INCLUDES)
+    assert tree["panels"].limit == DEFAULT_INCLUDE_LIMIT
+    assert set(tree["panels"].children) == {"ownerships"}
+
+
+@pytest.mark.parametrize("raw", ["owners", "panels.farm", "panels:0", "panels:x", "panels:100000"])
+def test_parse_rejects_unknown_paths_and_bad_limits(raw):
+    with pytest.raises(HTTPException) as error:
+        parse_include(raw, SOLAR_FARM_INCLUDES)
+    assert error.value.status_code == 400
+
+
+def test_parse_nothing():
+    assert parse_include(None, SOLAR_FARM_INCLUDES) is None
+    assert parse_include(" , ", SOLAR_FARM_INCLUDES) is None
+
+
+@pytest.fixture
+def farms(db_setup):
+    db = SessionLocal()
+    db.add_all([SolarPanel(panel_id=panel_id, farm_id=1) for panel_id in (1, 2, 3)] + [SolarPanel(panel_id=4, farm_id=2)])
+    db.add_all([PanelOwnership(ownership_id=index, panel_id=1, customer_id=2) for index in (1, 2, 3)])
+    db.commit()
+    yield db, db.query(SolarFarm).order_by(SolarFarm.farm_id).all()
+    db.close()
+
+
+@pytest.fixture
+def statements():
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_one_query_per_level_with_limits_per_parent(farms, statements):
+    db, parents = farms
+    tree = parse_include("panels:2,panels.ownerships:2", SOLAR_FARM_INCLUDES)
+    load_includes(db, parents, tree)
+    assert len(statements) == 2
+
+    north, south = parents
+    assert [panel.panel_id for panel in north.panels] == [1, 2]
+    assert [panel.panel_id for panel in south.panels] == [4]
+    assert [ownership.ownership_id for ownership in north.panels[0].ownerships] == [1, 2]
+    assert north.panels[1].ownerships == []
+
+
+def test_serialize_tree_embeds_only_the_requested_relationships(farms):
+    db, parents = farms
+    tree = parse_include("panels:1", SOLAR_FARM_INCLUDES)
+    load_includes(db, parents, tree)
+    data = serialize_tree(parents[0], SolarFarmResponse, tree)
+    assert data["farm_id"] == 1
+    assert [panel["panel_id"] for panel in data["panels"]] == [1]
+    assert "maintenance_records" not in data
+    assert "ownerships" not in data["panels"][0]
@@ -0,0 +1,106 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.core.ledger import LEDGER_SNAPSHOT_LAG_SECONDS, ledger_balance, snapshot_invalidator, take_ledger_snapshots
+from app.db.base import SessionLocal
+from app.models.models import EnergyCredits, LedgerSnapshot, Transaction
+
+NOW = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+SETTLED = NOW - timedelta(seconds=LEDGER_SNAPSHOT_LAG_SECONDS + 60)
+RECENT = NOW - timedelta(seconds=LEDGER_SNAPSHOT_LAG_SECONDS // 2)
+
+
+@pytest.fixture
+def db(db_setup):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def add_transaction(db, customer_id, amount, created_at=SETTLED):
+    row = Transaction(customer_id=customer_id, amount=Decimal(amount), created_at=created_at)
+    db.add(row)
+    db.commit()
+    return row.transaction_id
+
+
+def add_credit(db, customer_id, net_amount, created_at=SETTLED):
+    row = EnergyCredits(
+        customer_id=customer_id, billing_period_start=date(2024, 5, 1), billing_period_end=date(2024, 5, 31),
+        net_amount=Decimal(net_amount), created_at=created_at,
+    )
+    db.add(row)
+    db.commit()
+    return row.credit_id
+
+
+def test_balance_without_snapshot_sums_the_history(db):
+    add_transaction(db, 2, "-40.00")
+    add_transaction(db, 2, "15.50")
+    add_credit(db, 2, "12.25")
+    add_transaction(db, 1, "99.00")
+
+    totals = ledger_balance(db, 2)
+    assert totals.transactions_total == Decimal("-24.50")
+    assert totals.credits_total == Decimal("12.25")
+    assert totals.balance == Decimal("-12.25")
+    assert totals.snapshot_at is None
+
+
+def test_snapshots_cover_settled_rows_only(db):
+    add_transaction(db, 2, "-40.00")
+    add_credit(db, 2, "12.25")
+    recent = add_transaction(db, 2, "5.00", created_at=RECENT)
+
+    assert take_ledger_snapshots(db, now=NOW) == (2, 0)
+    snapshot = db.get(LedgerSnapshot, 2)
+    assert snapshot.last_transaction_id == recent - 1
+    assert snapshot.transactions_total == Decimal("-40.00")
+    assert snapshot.credits_total == Decimal("12.25")
+    assert db.get(LedgerSnapshot, 1).transactions_total == Decimal("0")
+
+    totals = ledger_balance(db, 2)
+    assert totals.transactions_total == Decimal("-35.00")
+    assert totals.balance == Decimal("-22.75")
+    assert totals.snapshot_at is not None
+
+
+def test_later_runs_only_advance_active_customers(db):
+    add_transaction(db, 2, "-40.00")
+    take_ledger_snapshots(db, now=NOW)
+    untouched = db.get(LedgerSnapshot, 1).taken_at
+
+    add_transaction(db, 2, "10.00")
+    add_credit(db, 2, "3.00")
+    later = NOW + timedelta(hours=1)
+    assert take_ledger_snapshots(db, now=later) == (0, 1)
+
+    db.expire_all()
+    snapshot = db.get(LedgerSnapshot, 2)
+    assert snapshot.transactions_total == Decimal("-30.00")
+    assert snapshot.credits_total == Decimal("3.00")
+    assert db.get(LedgerSnapshot, 1).taken_at == untouched
+    assert ledger_balance(db, 2).balance == Decimal("-27.00")
+
+
+def test_editing_a_covered_row_drops_the_snapshot(db):
+    covered = add_transaction(db, 2, "-40.00")
+    take_ledger_snapshots(db, now=NOW)
+    uncovered = add_transaction(db, 2, "7.00")
+    invalidate = snapshot_invalidator(Transaction)
+
+    invalidate(db, [uncovered])
+    db.commit()
+    assert db.get(LedgerSnapshot, 2) is not None
+
+    invalidate(db, [covered])
+    db.get(Transaction, covered).amount = Decimal("-45.00")
+    db.commit()
+    assert db.get(LedgerSnapshot, 2) is None
+    assert db.get(LedgerSnapshot, 1) is not None
+    assert ledger_balance(db, 2).balance == Decimal("-38.00")
+
+    assert take_ledger_snapshots(db, now=NOW + timedelta(hours=1)) == (1, 0)
+    assert db.get(LedgerSnapshot, 2).transactions_total == Decimal("-38.00")
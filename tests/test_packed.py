@@ -0,0 +1,103 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.auth_dependencies import get_current_user
+from app.db.base import SessionLocal
+from app.db.packed import (
+    GenerationReading, find_packed, pack_energy_generation, pack_readings, reading_order, unpack_readings,
+)
+from app.models.models import EnergyGeneration, EnergyGenerationDay, SolarPanel, User
+from app.routers import energy
+
+DAY_START = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def reading(generation_id, minutes, efficiency=Decimal("18.50"), panel_id=1):
+    timestamp = DAY_START + timedelta(minutes=minutes, microseconds=generation_id)
+    return GenerationReading(
+        generation_id, panel_id, timestamp, Decimal("0.1234"), Decimal("230.10"), Decimal("4.20"),
+        efficiency, timestamp + timedelta(seconds=1),
+    )
+
+
+def packed_day(readings, panel_id=1):
+    readings = sorted(readings, key=reading_order)
+    return EnergyGenerationDay(
+        panel_id=panel_id, day=DAY_START.date(), reading_count=len(readings), readings=pack_readings(readings)
+    )
+
+
+def test_pack_round_trip():
+    readings = [reading(10, 0), reading(11, 15, efficiency=None), reading(15, 30)]
+    assert unpack_readings(packed_day(readings)) == readings
+
+
+def test_unpacked_numerics_keep_their_column_scale():
+    (unpacked,) = unpack_readings(packed_day([reading(1, 0)._replace(voltage=Decimal("230"))]))
+    assert unpacked.voltage == Decimal("230.00")
+    assert unpacked.voltage.as_tuple().exponent == -2
+    assert unpacked.energy_generated_kwh.as_tuple().exponent == -4
+
+
+def test_unpacked_timestamps_are_utc_to_the_microsecond():
+    naive = reading(3, 5)._replace(timestamp=datetime(2024, 6, 1, 0, 5, 0, 123457))
+    (unpacked,) = unpack_readings(packed_day([naive]))
+    assert unpacked.timestamp == datetime(2024, 6, 1, 0, 5, 0, 123457, tzinfo=timezone.utc)
+
+
+def test_ids_out_of_timestamp_order_round_trip():
+    # Late uploads get higher ids for earlier timestamps
+    readings = [reading(20, 0), reading(7, 15), reading(21, 30, efficiency=None)]
+    assert unpack_readings(packed_day(readings)) == readings
+
+
+@pytest.fixture
+def packed_panel(db_setup):
+    db = SessionLocal()
+    db.add(SolarPanel(panel_id=1, farm_id=1))
+    db.add_all([
+        EnergyGeneration(
+            generation_id=generation_id, panel_id=1, timestamp=DAY_START + timedelta(hours=generation_id),
+            energy_generated_kwh=Decimal("1.5000"), efficiency_percentage=None,
+        )
+        for generation_id in (1, 2, 3)
+    ])
+    db.commit()
+    pack_energy_generation(db, cutoff=date(2024, 6, 2))
+    yield db
+    db.close()
+
+
+def test_pack_records_the_id_range(packed_panel):
+    (day,) = packed_panel.query(EnergyGenerationDay).all()
+    assert (day.first_generation_id, day.last_generation_id) == (1, 3)
+    assert packed_panel.query(EnergyGeneration).count() == 0
+
+
+def test_find_packed(packed_panel):
+    found = find_packed(packed_panel, 2, [1])
+    assert found.generation_id == 2
+    assert found.timestamp == DAY_START + timedelta(hours=2)
+    assert found.efficiency_percentage is None
+    assert find_packed(packed_panel, 4, [1]) is None
+    assert find_packed(packed_panel, 2, [2]) is None
+
+
+def test_packed_reading_detail_is_read_only(packed_panel):
+    app = FastAPI()
+    app.include_router(energy.router)
+    app.dependency_overrides[get_current_user] = lambda: packed_panel.get(User, 1)
+    client = TestClient(app)
+
+    response = client.get("/energy/generation/3")
+    assert response.status_code == 200
+    assert response.json()["energy_generated_kwh"] == "1.5000"
+    update = {"panel_id": 1, "timestamp": response.json()["timestamp"], "voltage": "1.00"}
+    assert client.put("/energy/generation/3", json=update).status_code == 409
+    assert client.delete("/energy/generation/3").status_code == 409
+    assert client.get("/energy/generation/4").status_code == 404
+    assert client.delete("/energy/generation/4").status_code == 404
@@ -0,0 +1,55 @@
+import asyncio
+
+from app.core.notifications import id_runs
+from app.core.push import (
+    NOTIFICATION_STREAM_QUEUE_SIZE, NOTIFY_PAYLOAD_BYTES, RESYNC_EVENT, Subscriber, decode_announcement,
+    encode_announcements, resync_event,
+)
+
+
+def test_id_runs_collapse_consecutive_ids():
+    assert id_runs([7, 3, 4, 5, 10, 11, 1]) == [(1, 1), (3, 5), (7, 7), (10, 11)]
+    assert id_runs([]) == []
+
+
+def test_announcements_round_trip():
+    runs = [(10, 42), (45, 45), (50, 51)]
+    assert encode_announcements(runs) == ["10-42,45,50-51"]
+    assert decode_announcement("10-42,45,50-51") == runs
+
+
+def test_announcements_split_under_the_notify_limit():
+    runs = [(index * 1_000_000, index * 1_000_000 + 1) for index in range(2000)]
+    payloads = encode_announcements(runs)
+    assert len(payloads) > 1
+    assert all(len(payload) < NOTIFY_PAYLOAD_BYTES for payload in payloads)
+    assert [run for payload in payloads for run in decode_announcement(payload)] == runs
+
+
+def test_resync_event_carries_the_newest_id():
+    assert resync_event(42) == b"id: 42\n" + RESYNC_EVENT
+
+
+def test_subscriber_skips_repeats_and_resynced_ids():
+    loop = asyncio.new_event_loop()
+    try:
+        subscriber = Subscriber(1, loop)
+        subscriber.resynced_through = 10
+        assert not subscriber.mark_sent(10)
+        assert subscriber.mark_sent(11)
+        assert not subscriber.mark_sent(11)
+    finally:
+        loop.close()
+
+
+def test_full_queue_is_replaced_by_a_resync():
+    loop = asyncio.new_event_loop()
+    try:
+        subscriber = Subscriber(1, loop)
+        for notification_id in range(NOTIFICATION_STREAM_QUEUE_SIZE + 5):
+            subscriber.deliver(notification_id, b"event")
+        assert subscriber.queue.qsize() == 1
+        assert loop.run_until_complete(subscriber.next_event(0.1)) is RESYNC_EVENT
+        assert not subscriber.overflowed
+    finally:
+        loop.close()
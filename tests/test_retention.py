@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import Delete
+
+from app.db import retention
+from app.db.base import SessionLocal
+from app.db.retention import RetentionPolicy, estimate_purge, purge
+from app.models.models import Notification
+
+NOW = datetime.now(timezone.utc)
+POLICY = RetentionPolicy("notifications", Notification, Notification.created_at, 30)
+
+
+@pytest.fixture
+def db(db_setup):
+    db = SessionLocal()
+    db.add_all(
+        [Notification(notification_id=index, created_at=NOW - timedelta(days=60)) for index in range(1, 8)]
+        + [Notification(notification_id=index, created_at=NOW) for index in range(8, 10)]
+    )
+    db.commit()
+    yield db
+    db.close()
+
+
+def remaining(db):
+    return [row.notification_id for row in db.query(Notification).order_by(Notification.notification_id)]
+
+
+def test_purge_deletes_expired_rows_in_batches(db):
+    progress = []
+    report = purge(db, POLICY, batch_size=3, pause_seconds=0, progress=lambda rows, total: progress.append((rows, total)))
+    assert (report.rows, report.batches, report.skipped_rows) == (7, 3, 0)
+    assert progress == [(3, 3), (3, 6), (1, 7)]
+    assert remaining(db) == [8, 9]
+
+
+def test_estimate_matches_the_purge(db):
+    report = estimate_purge(db, POLICY, batch_size=3)
+    assert (report.rows, report.batches, report.dry_run) == (7, 3, True)
+    assert remaining(db) == list(range(1, 10))
+
+
+def test_bound_limits_the_cutoff():
+    bound = NOW - timedelta(days=90)
+    policy = RetentionPolicy("bounded", Notification, Notification.created_at, 30, lambda: bound)
+    assert policy.cutoff(NOW) == bound
+    assert RetentionPolicy("open", Notification, Notification.created_at, 30, lambda: NOW).cutoff(NOW) == NOW - timedelta(days=30)
+
+
+def test_policy_without_a_bound_yet_purges_nothing(db):
+    policy = RetentionPolicy("unarchived", Notification, Notification.created_at, 30, lambda: None)
+    report = purge(db, policy, batch_size=3, pause_seconds=0)
+    assert (report.cutoff, report.rows) == (None, 0)
+    assert len(remaining(db)) == 9
+
+
+class ContendedSession:
+    """Session whose first `failures` deletes time out waiting for row locks."""
+
+    def __init__(self, db, failures, pgcode=retention.LOCK_NOT_AVAILABLE):
+        self.db = db
+        self.failures = failures
+        self.pgcode = pgcode
+        self.attempts = 0
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def execute(self, statement, *args, **kwargs):
+        if isinstance(statement, Delete) and self.attempts < self.failures:
+            self.attempts += 1
+            raise OperationalError("DELETE", {}, SimpleNamespace(pgcode=self.pgcode))
+        return self.db.execute(statement, *args, **kwargs)
+
+
+def test_batch_timing_out_on_locks_is_retried_then_skipped(db, monkeypatch):
+    monkeypatch.setattr(retention, "RETENTION_LOCK_RETRIES", 2)
+    # The first batch fails on every attempt, the later ones succeed
+    session = ContendedSession(db, failures=3)
+    report = purge(session, POLICY, batch_size=3, pause_seconds=0)
+    assert session.attempts == 3
+    assert (report.rows, report.skipped_rows) == (4, 3)
+    assert remaining(db) == [1, 2, 3, 8, 9]
+
+
+def test_other_errors_are_raised(db):
+    # 57014: query_canceled
+    with pytest.raises(OperationalError):
+        purge(ContendedSession(db, failures=1, pgcode="57014"), POLICY, batch_size=3, pause_seconds=0)
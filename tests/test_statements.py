@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from app.core import statements
+from app.core.statements import ENTRY_COLUMNS, iter_statement_rows, month_period, render_statement, write_statements
+from app.db.base import SessionLocal
+from app.models.models import CustomerConsumption, EnergyCredits, Transaction
+
+Entry = namedtuple("Entry", ("customer_id",) + ENTRY_COLUMNS)
+
+START, END = date(2024, 5, 1), date(2024, 6, 1)
+ENTRIES = [
+    Entry(2, datetime(2024, 5, 1, tzinfo=timezone.utc), "credit", 7, None, Decimal("120.5000"), Decimal("18.40")),
+    Entry(2, datetime(2024, 5, 3, 9, 30, tzinfo=timezone.utc), "transaction", 11, "Top-up, May", None,
+          Decimal("-25.00")),
+    Entry(2, datetime(2024, 5, 9, tzinfo=timezone.utc), "transaction", 12, None, None, Decimal("4.50")),
+]
+
+
+@pytest.mark.parametrize("month, period", [
+    ("2024-05", (date(2024, 5, 1), date(2024, 6, 1))),
+    ("2024-12", (date(2024, 12, 1), date(2025, 1, 1))),
+])
+def test_month_period(month, period):
+    assert month_period(month) == period
+
+
+@pytest.mark.parametrize("month", ["2024-13", "May 2024", "2024-5-1"])
+def test_month_period_rejects_malformed_months(month):
+    with pytest.raises(ValueError):
+        month_period(month)
+
+
+def test_csv_statement_ends_with_totals():
+    body = b"".join(render_statement(2, START, END, iter(ENTRIES), "csv")).decode()
+    rows = list(csv.reader(io.StringIO(body)))
+    assert rows[0] == list(ENTRY_COLUMNS)
+    assert rows[2] == ["2024-05-03T09:30:00+00:00", "transaction", "11", "Top-up, May", "", "-25.00"]
+    assert rows[4:] == [
+        ["", "total", "", "transaction", "", "-20.50"],
+        ["", "total", "", "credit", "", "18.40"],
+        ["", "total", "", "consumption", "", "0"],
+    ]
+
+
+def test_json_statement_is_one_document():
+    body = json.loads(b"".join(render_statement(2, START, END, iter(ENTRIES), "json")))
+    assert body["customer_id"] == 2
+    assert body["period_start"] == "2024-05-01"
+    assert [entry["entry_id"] for entry in body["entries"]] == [7, 11, 12]
+    assert body["entries"][0]["description"] is None
+    assert Decimal(str(body["totals"]["transaction"])) == Decimal("-20.50")
+    assert Decimal(str(body["totals"]["consumption"])) == 0
+
+
+def test_empty_statement_has_zero_totals():
+    body = json.loads(b"".join(render_statement(2, START, END, iter([]), "json")))
+    assert body["entries"] == []
+    assert set(body["totals"]) == {"transaction", "credit", "consumption"}
+
+
+def test_statement_is_emitted_in_chunks(monkeypatch):
+    monkeypatch.setattr(statements, "STATEMENT_CHUNK_BYTES", 64)
+    chunks = list(render_statement(2, START, END, iter(ENTRIES * 4), "csv"))
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 64 for chunk in chunks[:-1])
+
+
+@pytest.fixture
+def ledger(db_setup):
+    db = SessionLocal()
+    db.add_all([
+        Transaction(customer_id=2, amount=Decimal("-25.00"), transaction_date=datetime(2024, 5, 3, tzinfo=timezone.utc)),
+        Transaction(customer_id=2, amount=Decimal("9.00"), transaction_date=datetime(2024, 6, 1, tzinfo=timezone.utc)),
+        Transaction(customer_id=1, amount=Decimal("3.00"), transaction_date=datetime(2024, 5, 20, tzinfo=timezone.utc)),
+        EnergyCredits(customer_id=2, billing_period_start=date(2024, 5, 1), billing_period_end=date(2024, 5, 31),
+                      net_amount=Decimal("18.40")),
+        CustomerConsumption(customer_id=2, month=date(2024, 5, 1), total_cost=Decimal("31.10")),
+        CustomerConsumption(customer_id=2, month=date(2024, 4, 1), total_cost=Decimal("29.00")),
+    ])
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_statement_rows_cover_the_period_in_customer_order(ledger):
+    rows = list(iter_statement_rows(ledger, START, END))
+    assert [(row.customer_id, row.entry_type) for row in rows] == [
+        (1, "transaction"), (2, "consumption"), (2, "credit"), (2, "transaction"),
+    ]
+    assert [row.entry_type for row in iter_statement_rows(ledger, START, END, customer_id=1)] == ["transaction"]
+
+
+def test_write_statements_writes_one_file_per_customer(ledger, tmp_path):
+    assert write_statements(ledger, START, END, "json", str(tmp_path), workers=2) == (2, 4)
+    body = json.loads((tmp_path / "customer_2.json").read_bytes())
+    assert [entry["entry_type"] for entry in body["entries"]] == ["consumption", "credit", "transaction"]
+    assert Decimal(str(body["totals"]["consumption"])) == Decimal("31.10")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["customer_1.json", "customer_2.json"]
@@ -0,0 +1,81 @@
+import re
+import time
+from typing import List
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, field_serializer
+
+from app.core import timing
+from app.core.middleware import ServerTimingMiddleware
+from app.core.timing import TimedRoute
+
+
+class Item(BaseModel):
+    name: str
+
+    @field_serializer("name")
+    def slow_name(self, name: str) -> str:
+        time.sleep(0.002)
+        return name
+
+
+def timings(response) -> dict:
+    return {
+        name: float(duration)
+        for name, duration in re.findall(r"(\w+);dur=([\d.]+)", response.headers["Server-Timing"])
+    }
+
+
+@pytest.fixture
+def timed_app(monkeypatch):
+    monkeypatch.setattr(timing, "SERVER_TIMING", True)
+    router = APIRouter(route_class=TimedRoute)
+
+    @router.get("/items", response_model=List[Item])
+    async def list_items():
+        return [{"name": f"item {index}"} for index in range(10)]
+
+    @router.get("/sync-items", response_model=List[Item])
+    def list_items_sync():
+        return [{"name": "only"}]
+
+    @router.get("/bare")
+    async def bare():
+        return {"status": "ok"}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/v1")
+    app.add_middleware(ServerTimingMiddleware)
+    return TestClient(app)
+
+
+def test_response_model_serialization_is_timed(timed_app):
+    response = timed_app.get("/v1/items")
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+    assert timings(response)["serialize"] >= 20
+
+
+def test_sync_endpoints_are_timed(timed_app):
+    response = timed_app.get("/v1/sync-items")
+    assert response.json() == [{"name": "only"}]
+    assert timings(response)["serialize"] >= 2
+
+
+def test_wrapped_endpoint_keeps_its_signature(timed_app):
+    assert timed_app.get("/v1/bare").json() == {"status": "ok"}
+    operation = timed_app.app.openapi()["paths"]["/v1/items"]["get"]
+    assert operation["operationId"] == "list_items_v1_items_get"
+    assert operation["summary"] == "List Items"
+
+
+def test_routes_are_plain_without_server_timing():
+    router = APIRouter(route_class=TimedRoute)
+
+    @router.get("/items")
+    async def list_items():
+        return []
+
+    assert not hasattr(router.routes[0].endpoint, "__wrapped__")
@@ -0,0 +1,56 @@
+from sqlalchemy import update
+
+from app.db.base import SessionLocal
+from app.db.versions import table_version
+from app.models.models import SolarPanel
+
+
+def version(table="solar_panels"):
+    db = SessionLocal()
+    try:
+        return table_version(db, table)[0]
+    finally:
+        db.close()
+
+
+def test_flushed_orm_writes_bump_at_commit(db_setup):
+    db = SessionLocal()
+    db.add(SolarPanel(panel_id=1, farm_id=1))
+    assert version() == 0
+    db.commit()
+    assert version() == 1
+    # Farms were written by the fixture; other tables keep their own count
+    assert version("solar_farms") == 1
+    db.close()
+
+
+def test_statements_bump_once_per_transaction(db_setup):
+    db = SessionLocal()
+    db.add(SolarPanel(panel_id=1, farm_id=1))
+    db.commit()
+    db.execute(update(SolarPanel).values(panel_status="active"))
+    db.execute(update(SolarPanel).values(panel_status="retired"))
+    db.commit()
+    db.close()
+    assert version() == 2
+
+
+def test_rolled_back_writes_do_not_bump(db_setup):
+    db = SessionLocal()
+    db.add(SolarPanel(panel_id=1, farm_id=1))
+    db.flush()
+    db.rollback()
+    # Nothing was written in the transaction that follows
+    db.commit()
+    db.close()
+    assert version() == 0
+
+
+def test_savepoints_bump_with_the_outer_transaction(db_setup):
+    db = SessionLocal()
+    with db.begin_nested():
+        db.add(SolarPanel(panel_id=1, farm_id=1))
+    assert version() == 0
+    db.commit()
+    db.close()
+    assert version() == 1